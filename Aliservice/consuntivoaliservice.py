@@ -21,6 +21,7 @@ Cosa fa:
 
 Requisiti:
   pip install pandas openpyxl python-dateutil
+  (opzionale) pip install numba  # notturno compilato su input molto grandi
 
 Esempi:
   python consuntivoaliservice.py -i "Piano lavoro DICEMBRE 25.xlsx" -o "OUT_ALISERVICE.xlsx"
@@ -31,13 +32,21 @@ from __future__ import annotations
 
 import argparse
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime, date, time
 from typing import Dict, List, Optional, Tuple, Iterable
 
 import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba opzionale: senza, il notturno resta sulla versione numpy
+    njit = None
+
 try:
     from dateutil.easter import easter
 except ImportError:
@@ -65,32 +74,52 @@ except ImportError:
 # Config
 # -----------------------------
 
-@dataclass
+@dataclass(slots=True)
 class RoundingPolicy:
     mode: str  # NONE | FLOOR | CEIL | NEAREST
     step_min: int
+    _mode: str = field(init=False, repr=False, compare=False, default="")
+
+    def __post_init__(self):
+        self._mode = self.mode.upper()
 
     def apply(self, minutes: int) -> int:
         if minutes is None:
             return None
-        if self.mode.upper() == "NONE":
-            return int(minutes)
         step = int(self.step_min)
-        if step <= 0:
+        if self._mode == "NONE" or step <= 0:
             return int(minutes)
 
-        x = float(minutes) / step
-        m = self.mode.upper()
+        # Aritmetica intera sui minuti (niente ufunc numpy su scalari)
+        q, r = divmod(int(minutes), step)
+        m = self._mode
         if m == "FLOOR":
-            return int(np.floor(x) * step)
+            return q * step
         if m == "CEIL":
-            return int(np.ceil(x) * step)
+            return (q + (r > 0)) * step
         if m == "NEAREST":
-            return int(np.round(x) * step)
+            # Come np.round: a metà passo arrotonda al multiplo pari
+            if 2 * r > step or (2 * r == step and q % 2 == 1):
+                q += 1
+            return q * step
         return int(minutes)
 
+    def apply_array(self, minutes: np.ndarray) -> np.ndarray:
+        """Versione vettoriale di apply su un array di minuti interi"""
+        minutes = np.asarray(minutes, dtype=np.int64)
+        step = int(self.step_min)
+        if self._mode == "NONE" or step <= 0 or self._mode not in ("FLOOR", "CEIL", "NEAREST"):
+            return minutes.copy()
+
+        q, r = np.divmod(minutes, step)
+        if self._mode == "CEIL":
+            q = q + (r > 0)
+        elif self._mode == "NEAREST":
+            q = q + ((2 * r > step) | ((2 * r == step) & (q % 2 == 1)))
+        return q * step
+
 
-@dataclass
+@dataclass(slots=True)
 class CalcConfig:
     apt_filter: Optional[List[str]]  # e.g. ["BGY"]
     to_keyword: str = "aliservice"
@@ -119,14 +148,72 @@ TARIFFE_SERVIZI_ALISERVICE = {
     "Meet & Greet": {"base": 65.0, "extra_per_h": 15.0},
 }
 
+# Chiavi tariffa già in minuscolo (stesso ordine del dict) e pattern M&G
+_TARIFFE_BASE_LOWER = [(k.lower(), t["base"]) for k, t in TARIFFE_SERVIZI_ALISERVICE.items()]
+_MEET_GREET_RE = re.compile(r"M&G|M G|MEET")
+
+# Fascia notturna Aliservice BGY: 23:00-03:30 (minuti dalla mezzanotte del giorno di inizio)
+NIGHT_START_MIN = 23 * 60
+NIGHT_END_MIN = 27 * 60 + 30
+MIN_PER_DAY = 24 * 60
+NS_PER_MIN = 60_000_000_000
+NS_PER_DAY = MIN_PER_DAY * NS_PER_MIN
+
+# Ordine aeroporti nel riepilogo TotaleAPT (gli altri in coda)
+_APT_ORDER = {'VRN': 0, 'BGY': 1, 'NAP': 2, 'VCE': 3}
+
+# Ordine colonne del foglio DettaglioBlocchi (solo quelle presenti vengono scritte)
+DETAIL_COLS_ORDER = pd.Index([
+    "DATA", "APT", "AGENZIA", "TOUR OPERATOR", "SERVIZI", "ARRIVI/TRF", "ASSISTENTE", "VOLO", "DEST.NE", "TURNO_FFILL", "TURNO_NORMALIZZATO",
+    "INIZIO_DT", "FINE_DT", "DURATA_TURNO_MIN", "NO_DEC",
+    "ATD", "ATD_SCELTO", "STD_SCELTO",
+    "TURNO_EUR",
+    "EXTRA_MIN", "EXTRA_EUR",
+    "NOTTE_MIN", "NOTTE_EUR",
+    "FESTIVO", "TOTALE_BLOCCO_EUR",
+    "ERRORE",
+    "SRC_FILE", "SRC_SHEET", "SRC_ROW0",
+])
+
 
 # -----------------------------
 # Parsing utilities
 # -----------------------------
 
+# Regex precompilate (usate per ogni riga/cella)
+_WS_RE = re.compile(r"\s+")
+_NODEC_RE = re.compile(r"(?i)no\s*dec")
+_SC_PREFIX_RE = re.compile(r"^(SC\d+|SC\s*\d+)\s*", re.IGNORECASE)
+_TIME_HHMM_RE = re.compile(r"^(\d{1,2})[.:](\d{2})$")
+_TIME_NUM_RE = re.compile(r"^(\d{3,4})$")
+_TIME_VALUE_RE = re.compile(r"^(?:(\d{1,2})[.:](\d{2})|(\d{3,4}))$")
+# Pattern TURNO: HH:MM-HH:MM, HH-HH, HH.MM-HH.MM, ecc.
+_TURNO_PATTERNS = [
+    re.compile(r"(\d{1,2})[.:](\d{2})\s*[-–—]\s*(\d{1,2})[.:](\d{2})"),  # 08:30-11:30
+    re.compile(r"(\d{1,2})\s*[-–—]\s*(\d{1,2})[.:](\d{2})"),  # 8-11:30
+    re.compile(r"(\d{1,2})[.:](\d{2})\s*[-–—]\s*(\d{1,2})"),  # 08:30-11
+    re.compile(r"(\d{1,2})\s*[-–—]\s*(\d{1,2})"),  # 8-11
+]
+
+
 def normalize_spaces(s: str) -> str:
     """Normalizza spazi multipli"""
-    return re.sub(r"\s+", " ", str(s).strip())
+    return _WS_RE.sub(" ", str(s).strip())
+
+
+def clean_str_series(s: pd.Series) -> pd.Series:
+    """Versione vettoriale di str(x).strip(), con "" per le celle vuote (NaN/None)"""
+    return s.astype(str).str.strip().where(s.notna(), "")
+
+
+def str_contains_mask(s: pd.Series, pat: str, regex: bool) -> np.ndarray:
+    """
+    str(x) contiene pat (case-insensitive) -> array bool.
+    Il test gira solo sui valori distinti della colonna (AGENZIA/APT ne hanno pochi).
+    """
+    codes, uniques = pd.factorize(s.astype(str))
+    hits = pd.Series(uniques, dtype=object).str.contains(pat, case=False, regex=regex, na=False)
+    return hits.to_numpy(dtype=bool)[codes]
 
 
 def parse_excel_date(x) -> Optional[pd.Timestamp]:
@@ -145,7 +232,7 @@ def parse_excel_date(x) -> Optional[pd.Timestamp]:
         return None
     
     # Prova vari formati
-    for fmt in ["%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y", "%d/%m/%y"]:
+    for fmt in DATE_FORMATS:
         try:
             return pd.Timestamp(datetime.strptime(s, fmt))
         except:
@@ -156,10 +243,48 @@ def parse_excel_date(x) -> Optional[pd.Timestamp]:
         return pd.to_datetime(s, dayfirst=True)
     except:
         pass
-    
+
     return None
 
 
+DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y", "%d/%m/%y"]
+
+
+def parse_excel_date_series(s: pd.Series) -> pd.Series:
+    """
+    Versione vettoriale di parse_excel_date su una colonna DATA.
+    Un pd.to_datetime per formato; parse_excel_date resta solo per le celle residue.
+    """
+    # Colonna già datetime64 (caso comune con read_excel): nessun passaggio per oggetti Python
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.astype("datetime64[ns]")
+
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    if s.empty:
+        return out
+
+    # Celle già data/datetime
+    is_dt = s.notna() & s.map(lambda x: isinstance(x, (datetime, date)))
+    if is_dt.any():
+        out[is_dt] = pd.to_datetime(s[is_dt])
+
+    txt = s.astype(str).str.strip()
+    todo = s.notna() & ~is_dt & ~txt.str.lower().isin(["", "nan", "none"])
+    for fmt in DATE_FORMATS:
+        if not todo.any():
+            break
+        parsed = pd.to_datetime(txt[todo], format=fmt, errors="coerce").dropna()
+        out[parsed.index] = parsed
+        todo[parsed.index] = False
+
+    # Formati non previsti: fallback cella per cella
+    for idx in todo[todo].index:
+        ts = parse_excel_date(s.at[idx])
+        if ts is not None:
+            out.at[idx] = ts
+    return out
+
+
 def parse_time_value(x) -> Optional[Tuple[int, int]]:
     """Parse orario da cella Excel -> (ore, minuti)"""
     if pd.isna(x):
@@ -179,14 +304,14 @@ def parse_time_value(x) -> Optional[Tuple[int, int]]:
     s = s.replace(" ", "")
     
     # HH:MM o HH.MM
-    m = re.match(r"^(\d{1,2})[.:](\d{2})$", s)
+    m = _TIME_HHMM_RE.match(s)
     if m:
         h, mm = int(m.group(1)), int(m.group(2))
         if 0 <= h <= 23 and 0 <= mm <= 59:
             return (h, mm)
     
     # HHMM
-    m = re.match(r"^(\d{3,4})$", s)
+    m = _TIME_NUM_RE.match(s)
     if m:
         num = int(m.group(1))
         h = num // 100
@@ -197,6 +322,25 @@ def parse_time_value(x) -> Optional[Tuple[int, int]]:
     return None
 
 
+def parse_time_series(s: pd.Series) -> pd.Series:
+    """Versione vettoriale di parse_time_value -> minuti dalla mezzanotte (NaN se non valido)"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return (s.dt.hour * 60 + s.dt.minute).astype(float)
+
+    # HH:MM, HH.MM o HHMM (spazi rimossi)
+    txt = s.astype(str).str.strip().str.replace(" ", "", regex=False)
+    parts = txt.str.extract(_TIME_VALUE_RE).astype(float)
+    h = parts[0].fillna(parts[2] // 100)
+    mm = parts[1].fillna(parts[2] % 100)
+    mins = (h * 60 + mm).where(h.between(0, 23) & mm.between(0, 59))
+
+    # Celle Excel già in formato orario (time / datetime)
+    is_time = s.notna() & s.map(lambda x: isinstance(x, (time, datetime)))
+    if is_time.any():
+        mins[is_time] = [x.hour * 60 + x.minute for x in s[is_time]]
+    return mins
+
+
 def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str]:
     """
     Parse stringa TURNO -> (inizio_str, fine_str, no_dec, turno_norm)
@@ -211,21 +355,14 @@ def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str
     
     # Flag "NO DEC"
     no_dec = "NO DEC" in s.upper() or "NODEC" in s.upper()
-    s = re.sub(r"(?i)no\s*dec", "", s).strip()
+    s = _NODEC_RE.sub("", s).strip()
     
     # Rimuovi prefissi tipo "SC1", "SC2", ecc.
-    s = re.sub(r"^(SC\d+|SC\s*\d+)\s*", "", s, flags=re.IGNORECASE).strip()
+    s = _SC_PREFIX_RE.sub("", s).strip()
     
     # Cerca pattern: HH:MM-HH:MM, HH-HH, HH.MM-HH.MM, ecc.
-    patterns = [
-        r"(\d{1,2})[.:](\d{2})\s*[-–—]\s*(\d{1,2})[.:](\d{2})",  # 08:30-11:30
-        r"(\d{1,2})\s*[-–—]\s*(\d{1,2})[.:](\d{2})",  # 8-11:30
-        r"(\d{1,2})[.:](\d{2})\s*[-–—]\s*(\d{1,2})",  # 08:30-11
-        r"(\d{1,2})\s*[-–—]\s*(\d{1,2})",  # 8-11
-    ]
-    
-    for pat in patterns:
-        m = re.match(pat, s)
+    for pat in _TURNO_PATTERNS:
+        m = pat.match(s)
         if m:
             groups = m.groups()
             if len(groups) == 4:
@@ -254,6 +391,26 @@ def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str
     return (None, None, no_dec, s)
 
 
+def parse_turno_series(s: pd.Series) -> pd.DataFrame:
+    """
+    Applica parse_turno a una colonna, parsando una sola volta ogni valore distinto.
+    Ritorna un DataFrame con colonne start_str, end_str, no_dec, turno_norm.
+    """
+    codes, uniques = pd.factorize(s)
+    # codice -1 = cella vuota (NaN) -> ultimo elemento
+    parsed = [parse_turno(v) for v in uniques] + [parse_turno(None)]
+    start_str, end_str, no_dec, turno_norm = zip(*parsed)
+    return pd.DataFrame(
+        {
+            "start_str": np.array(start_str, dtype=object)[codes],
+            "end_str": np.array(end_str, dtype=object)[codes],
+            "no_dec": np.array(no_dec, dtype=bool)[codes],
+            "turno_norm": np.array(turno_norm, dtype=object)[codes],
+        },
+        index=s.index,
+    )
+
+
 def to_dt(date_val: pd.Timestamp, time_str: str) -> pd.Timestamp:
     """Combina data e orario stringa -> Timestamp"""
     h, m = map(int, time_str.split(":"))
@@ -261,6 +418,12 @@ def to_dt(date_val: pd.Timestamp, time_str: str) -> pd.Timestamp:
     return dt
 
 
+def to_dt_series(dates: pd.Series, time_strs: pd.Series) -> pd.Series:
+    """Versione vettoriale di to_dt: data + orario "HH:MM" (None/vuoto -> NaT)"""
+    offsets = pd.to_timedelta(time_strs.astype("string") + ":00", errors="coerce")
+    return dates.dt.normalize() + offsets
+
+
 def night_minutes(start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> int:
     """
     Calcola minuti notturni nella fascia 23:00-03:30 (Aliservice BGY)
@@ -268,37 +431,79 @@ def night_minutes(start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> int:
     """
     if pd.isna(start_dt) or pd.isna(end_dt) or start_dt >= end_dt:
         return 0
-    
+
+    # Minuti dall'epoch: l'intersezione con la fascia si calcola in forma chiusa
+    s = start_dt.value // NS_PER_MIN
+    e = end_dt.value // NS_PER_MIN
+
     total_minutes = 0
-    current = start_dt
-    
-    while current < end_dt:
-        # Calcola fine del minuto corrente
-        next_min = current + pd.Timedelta(minutes=1)
-        if next_min > end_dt:
-            next_min = end_dt
-        
-        # Verifica se il minuto corrente è nella fascia notturna
-        hour = current.hour
-        minute = current.minute
-        
-        # Fascia: 23:00-03:30
-        is_night = False
-        if hour == 23:
-            is_night = True
-        elif hour >= 0 and hour < 3:
-            is_night = True
-        elif hour == 3 and minute < 30:
-            is_night = True
-        
-        if is_night:
-            total_minutes += 1
-        
-        current = next_min
-    
+    # La fascia del giorno precedente copre 00:00-03:30 del giorno di inizio
+    for day in range(s // MIN_PER_DAY - 1, e // MIN_PER_DAY + 1):
+        win_start = day * MIN_PER_DAY + NIGHT_START_MIN
+        win_end = day * MIN_PER_DAY + NIGHT_END_MIN
+        total_minutes += max(0, min(e, win_end) - max(s, win_start))
+
     return total_minutes
 
 
+def night_minutes_vec(starts_ns: np.ndarray, ends_ns: np.ndarray) -> np.ndarray:
+    """
+    Versione vettoriale di night_minutes su istanti int64 in ns (NaT -> 0 minuti).
+    Stessa intersezione in forma chiusa, un passo numpy per ogni giorno coperto.
+    """
+    starts_ns = np.asarray(starts_ns, dtype=np.int64)
+    ends_ns = np.asarray(ends_ns, dtype=np.int64)
+    if _night_minutes_kernel is not None and len(starts_ns) >= NUMBA_MIN_ROWS:
+        total = np.zeros(len(starts_ns), dtype=np.int64)
+        _night_minutes_kernel(np.ascontiguousarray(starts_ns), np.ascontiguousarray(ends_ns), total)
+        return total
+
+    nat = np.iinfo(np.int64).min
+    valid = (starts_ns != nat) & (ends_ns != nat) & (starts_ns < ends_ns)
+    total = np.zeros(len(starts_ns), dtype=np.int64)
+    if not valid.any():
+        return total
+
+    s = starts_ns[valid] // NS_PER_MIN
+    e = ends_ns[valid] // NS_PER_MIN
+    # La fascia del giorno precedente copre 00:00-03:30 del giorno di inizio
+    first_day = s // MIN_PER_DAY - 1
+    n_days = e // MIN_PER_DAY - first_day + 1
+    acc = np.zeros(len(s), dtype=np.int64)
+    for k in range(int(n_days.max())):
+        day_min = (first_day + k) * MIN_PER_DAY
+        overlap = np.minimum(e, day_min + NIGHT_END_MIN) - np.maximum(s, day_min + NIGHT_START_MIN)
+        acc += np.where(k < n_days, np.maximum(overlap, 0), 0)
+    total[valid] = acc
+    return total
+
+
+# Sopra questa soglia (e con numba installato) il notturno passa al kernel compilato:
+# su pochi blocchi il costo di compilazione/avvio non si ripaga
+NUMBA_MIN_ROWS = 100_000
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _night_minutes_kernel(starts_ns, ends_ns, out):
+        """Stessa intersezione di night_minutes_vec, un solo ciclo per blocco su int64 puri"""
+        nat = -9223372036854775808
+        for i in prange(len(starts_ns)):
+            if starts_ns[i] == nat or ends_ns[i] == nat or starts_ns[i] >= ends_ns[i]:
+                out[i] = 0
+                continue
+            s = starts_ns[i] // NS_PER_MIN
+            e = ends_ns[i] // NS_PER_MIN
+            acc = 0
+            # La fascia del giorno precedente copre 00:00-03:30 del giorno di inizio
+            for day in range(s // MIN_PER_DAY - 1, e // MIN_PER_DAY + 1):
+                overlap = min(e, day * MIN_PER_DAY + NIGHT_END_MIN) - max(s, day * MIN_PER_DAY + NIGHT_START_MIN)
+                if overlap > 0:
+                    acc += overlap
+            out[i] = acc
+else:
+    _night_minutes_kernel = None
+
+
 
 def _build_errore(errore, nota):
     """Compone il campo ERRORE unendo errore di calcolo e nota dal file sorgente."""
@@ -310,6 +515,15 @@ def _build_errore(errore, nota):
     return " | ".join(parts)
 
 
+@lru_cache(maxsize=None)
+def _tariffa_base_servizio(servizio_lower: str) -> Optional[float]:
+    """Tariffa base per tipo servizio (minuscolo), None se nessuna corrispondenza"""
+    for key_lower, base in _TARIFFE_BASE_LOWER:
+        if key_lower in servizio_lower or servizio_lower in key_lower:
+            return base
+    return None
+
+
 def compute_turno_eur(servizio_tipo: str, arrivi_trf: Optional[str], cfg: CalcConfig) -> float:
     """
     Calcola importo turno base secondo tipo servizio
@@ -318,18 +532,14 @@ def compute_turno_eur(servizio_tipo: str, arrivi_trf: Optional[str], cfg: CalcCo
     """
     # Prima verifica arrivi/trf per M&G (Meet & Greet)
     if arrivi_trf and pd.notna(arrivi_trf):
-        arrivi_str = str(arrivi_trf).strip().upper()
-        if "M&G" in arrivi_str or "M G" in arrivi_str or "MEET" in arrivi_str:
+        if _MEET_GREET_RE.search(str(arrivi_trf).strip().upper()):
             return TARIFFE_SERVIZI_ALISERVICE["Meet & Greet"]["base"]
     
-    # Poi verifica tipo servizio dalla colonna "Servizi"
+    # Poi verifica tipo servizio dalla colonna "Servizi" (case-insensitive)
     if servizio_tipo:
-        servizio_norm = str(servizio_tipo).strip()
-        
-        # Cerca corrispondenza (case-insensitive)
-        for key, tariffa in TARIFFE_SERVIZI_ALISERVICE.items():
-            if key.lower() in servizio_norm.lower() or servizio_norm.lower() in key.lower():
-                return tariffa["base"]
+        base = _tariffa_base_servizio(str(servizio_tipo).strip().lower())
+        if base is not None:
+            return base
     
     # Default: Tour Operator (€55)
     return TARIFFE_SERVIZI_ALISERVICE["Tour Operator"]["base"]
@@ -409,46 +619,63 @@ def find_col(df: pd.DataFrame, patterns: Iterable[str]) -> Optional[str]:
     return None
 
 
+# Pattern colonne per detect_columns, precompilati. Ordine della lista = ordine di
+# valutazione: per le chiavi ripetute vince l'ultima voce (come nel dict letterale).
+_COL_PATTERNS: List[Tuple[str, List[str]]] = [
+    ("data", [r"^DATA$", r"\bDATE\b", r"^data$"]),
+    ("agenzia", [r"^AGENZIA$", r"\bAGENCY\b"]),  # Aliservice è un'AGENZIA
+    ("tour_operator", [r"TOUR\s*OPERATOR", r"^TO$", r"\bOPERATORE\b"]),  # Tour operator gestito dall'agenzia
+    ("servizi", [r"^SERVIZI$", r"^SERVIZIO$", r"^Servizi$", r"\bSERVIZIO\b"]),  # Tipo servizio (Tour Operator, MICE, VIP, ecc.) - supporta sia SERVIZI che SERVIZIO
+    ("arrivi_trf", [r"^ARRIVI/TRF$", r"^arrivi/trf$", r"^ARRIVI\s*TRF$", r"^arrivi\s*trf$", r"^ARRIVI$", r"^TRF$", r"\bARRIVI\b", r"\bTRF\b"]),  # Campo arrivi/trf (colonna I) - M&G = Meet & Greet
+    ("giorno", [r"^GIORNO$", r"^giorno$", r"\bDAY\b"]),  # Per verificare festivo
+    ("convocazione", [r"^CONVOCAZIONE$", r"^conv\.ne$", r"^conv\.?ne$", r"\bCONV\b"]),  # Convocazione
+    ("apt", [r"^APT$", r"\bAEROPORTO\b", r"\bSCALO\b", r"^apt$"]),
+    ("turno", [r"^TURNO$", r"^TURNO\s*ASSISTENTE$", r"\bTURNI\b", r"^turni$", r"^turno$"]),
+    # Nuovo modello 2026: colonne Inizio Turno / Fine turno / Agenzia / Servizio
+    ("inizio_turno", [r"inizio\s*turno", r"^inizio$"]),
+    ("fine_turno", [r"fine\s*turno"]),
+    ("convocazione", [r"^convocazione", r"^conv"]),
+    ("agenzia", [r"^agenzia$"]),
+    ("servizio", [r"^servizio$", r"^servizi$"]),
+    ("fine_turno", [r"^FINE\s*TURNO$", r"^fine\s*turno$"]),  # Fine turno esplicita
+    ("atd", [r"^ATD$", r"\bORARIO\s*ATD\b", r"^atd$"]),
+    ("std", [r"^STD$", r"\bORARIO\s*STD\b", r"^std$"]),
+    ("importo", [r"^IMPORTO$", r"\bTOTALE\b", r"^COSTO\s*$", r"^importo$"]),
+    ("ore_extra", [r"\bORE\s*EXTRA\b", r"^EXTRA$", r"\bEXTRA\s*(MIN|ORE)\b", r"^ore\s*extra$"]),
+    ("notturno", [r"^NOTTURNO$", r"\bNIGHT\b", r"^Notturno$"]),
+    ("festivo", [r"^FESTIVO$", r"\bHOLIDAY\b"]),
+    ("assistente", [r"^ASSISTENTE$", r"\bASSISTENTE\b"]),
+    ("volo", [r"^VOLO$", r"NUMERO\s*VOLO", r"N\.?\s*VOLO", r"FLIGHT"]),
+    ("note", [r"^NOTE$", r"^NOTA$", r"\bNOTE\b", r"\bNOTA\b"]),
+    ("destinazione", [r"^DEST\.?NE$", r"^DEST$", r"DESTINAZIONE", r"DESTINATION"]),
+]
+_COL_PATTERNS_RX: List[Tuple[str, List[re.Pattern]]] = [
+    (key, [re.compile(p, re.IGNORECASE) for p in pats]) for key, pats in _COL_PATTERNS
+]
+
+
+@lru_cache(maxsize=64)
+def _detect_columns_cached(columns: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    found: Dict[str, Optional[str]] = {}
+    for key, rxs in _COL_PATTERNS_RX:
+        found[key] = next((c for rx in rxs for c in columns if rx.search(c)), None)
+    return found
+
+
 def detect_columns(df: pd.DataFrame) -> Dict[str, Optional[str]]:
     """
     Rileva colonne nel file Piano Lavoro
     Per Aliservice: cerca AGENZIA (non TOUR OPERATOR) per il filtro
+    Memoizzato sull'intestazione: i fogli di un workbook hanno di solito le stesse colonne.
     """
-    return {
-        "data": find_col(df, [r"^DATA$", r"\bDATE\b", r"^data$"]),
-        "agenzia": find_col(df, [r"^AGENZIA$", r"\bAGENCY\b"]),  # Aliservice è un'AGENZIA
-        "tour_operator": find_col(df, [r"TOUR\s*OPERATOR", r"^TO$", r"\bOPERATORE\b"]),  # Tour operator gestito dall'agenzia
-        "servizi": find_col(df, [r"^SERVIZI$", r"^SERVIZIO$", r"^Servizi$", r"\bSERVIZIO\b"]),  # Tipo servizio (Tour Operator, MICE, VIP, ecc.) - supporta sia SERVIZI che SERVIZIO
-        "arrivi_trf": find_col(df, [r"^ARRIVI/TRF$", r"^arrivi/trf$", r"^ARRIVI\s*TRF$", r"^arrivi\s*trf$", r"^ARRIVI$", r"^TRF$", r"\bARRIVI\b", r"\bTRF\b"]),  # Campo arrivi/trf (colonna I) - M&G = Meet & Greet
-        "giorno": find_col(df, [r"^GIORNO$", r"^giorno$", r"\bDAY\b"]),  # Per verificare festivo
-        "convocazione": find_col(df, [r"^CONVOCAZIONE$", r"^conv\.ne$", r"^conv\.?ne$", r"\bCONV\b"]),  # Convocazione
-        "apt": find_col(df, [r"^APT$", r"\bAEROPORTO\b", r"\bSCALO\b", r"^apt$"]),
-        "turno": find_col(df, [r"^TURNO$", r"^TURNO\s*ASSISTENTE$", r"\bTURNI\b", r"^turni$", r"^turno$"]),
-        # Nuovo modello 2026: colonne Inizio Turno / Fine turno / Agenzia / Servizio
-        "inizio_turno":  find_col(df, [r"inizio\s*turno", r"^inizio$"]),
-        "fine_turno":    find_col(df, [r"fine\s*turno"]),
-        "convocazione":  find_col(df, [r"^convocazione", r"^conv"]),
-        "agenzia":       find_col(df, [r"^agenzia$"]),
-        "servizio":      find_col(df, [r"^servizio$", r"^servizi$"]),
-        "fine_turno": find_col(df, [r"^FINE\s*TURNO$", r"^fine\s*turno$"]),  # Fine turno esplicita
-        "atd": find_col(df, [r"^ATD$", r"\bORARIO\s*ATD\b", r"^atd$"]),
-        "std": find_col(df, [r"^STD$", r"\bORARIO\s*STD\b", r"^std$"]),
-        "importo": find_col(df, [r"^IMPORTO$", r"\bTOTALE\b", r"^COSTO\s*$", r"^importo$"]),
-        "ore_extra": find_col(df, [r"\bORE\s*EXTRA\b", r"^EXTRA$", r"\bEXTRA\s*(MIN|ORE)\b", r"^ore\s*extra$"]),
-        "notturno": find_col(df, [r"^NOTTURNO$", r"\bNIGHT\b", r"^Notturno$"]),
-        "festivo": find_col(df, [r"^FESTIVO$", r"\bHOLIDAY\b"]),
-        "assistente": find_col(df, [r"^ASSISTENTE$", r"\bASSISTENTE\b"]),
-        "volo": find_col(df, [r"^VOLO$", r"NUMERO\s*VOLO", r"N\.?\s*VOLO", r"FLIGHT"]),
-        "note": find_col(df, [r"^NOTE$", r"^NOTA$", r"\bNOTE\b", r"\bNOTA\b"]),
-        "destinazione": find_col(df, [r"^DEST\.?NE$", r"^DEST$", r"DESTINAZIONE", r"DESTINATION"]),
-    }
+    return dict(_detect_columns_cached(tuple(df.columns)))
 
 
 # -----------------------------
 # Core computation
 # -----------------------------
 
-@dataclass
+@dataclass(slots=True)
 class SourceRowRef:
     file: str
     sheet: str
@@ -456,7 +683,7 @@ class SourceRowRef:
     original_order: int
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockAgg:
     date: pd.Timestamp
     apt: str
@@ -484,6 +711,7 @@ class BlockAgg:
 
 def iter_excel_sheets(file_path: str) -> Iterable[Tuple[str, pd.DataFrame]]:
     """Itera sui fogli del file Excel. Legge solo 'PIANO VOLI' se presente, altrimenti tutti i fogli (retrocompatibilità)"""
+    # Un solo ExcelFile: i fogli vengono letti dal workbook già aperto
     xls = pd.ExcelFile(file_path)
     # Cerca il foglio "PIANO VOLI" (nuovo formato)
     target_sheet = None
@@ -496,10 +724,149 @@ def iter_excel_sheets(file_path: str) -> Iterable[Tuple[str, pd.DataFrame]]:
     sheets_to_process = [target_sheet] if target_sheet else xls.sheet_names
     
     for sheet in sheets_to_process:
-        df = pd.read_excel(file_path, sheet_name=sheet)
+        df = pd.read_excel(xls, sheet_name=sheet)
         yield sheet, df
 
 
+def category_keys(df: pd.DataFrame, cols: List[str]) -> List[pd.Series]:
+    """Chiavi di groupby come Categorical (codici interi): poche modalità su molte righe"""
+    return [df[c].astype("category") for c in cols]
+
+
+def round2_array(x) -> np.ndarray:
+    """round(v, 2) elemento per elemento (stesso arrotondamento del round Python, non np.round)"""
+    return np.array([round(v, 2) for v in np.asarray(x, dtype=float).tolist()], dtype=float)
+
+
+def blocks_to_detail_df(blocks: List[BlockAgg], cfg: CalcConfig) -> pd.DataFrame:
+    """
+    DettaglioBlocchi: turno, extra e notturno calcolati a colonne su tutti i blocchi
+    (già in ordine di output). I blocchi con errore hanno tutti i valori a zero.
+    """
+    if not blocks:
+        return pd.DataFrame()
+
+    # Colonne preallocate, riempite in un solo passaggio sui blocchi (niente dict per riga)
+    n = len(blocks)
+    date_o, start_o, end_o = (np.empty(n, dtype=object) for _ in range(3))
+    atd_sel_o, atd_first_o, std_first_o = (np.empty(n, dtype=object) for _ in range(3))
+    apt_o, agenzia_o, to_o, servizio_o, arrivi_o = (np.empty(n, dtype=object) for _ in range(5))
+    assistente_o, volo_o, dest_o, ffill_o, norm_o = (np.empty(n, dtype=object) for _ in range(5))
+    festivo_o, errore_o, src_file_o, src_sheet_o = (np.empty(n, dtype=object) for _ in range(4))
+    durata = np.empty(n, dtype=np.int64)
+    src_row = np.empty(n, dtype=np.int64)
+    no_dec = np.empty(n, dtype=bool)
+    festivo = np.empty(n, dtype=bool)
+    ok = np.empty(n, dtype=bool)
+
+    for i, b in enumerate(blocks):
+        date_o[i] = b.date
+        start_o[i] = b.start_dt
+        end_o[i] = b.end_dt
+        # ATD scelto (ultimo disponibile), altrimenti ultimo STD
+        atd_sel_o[i] = b.atd_list[-1] if b.atd_list else (b.std_list[-1] if b.std_list else None)
+        atd_first_o[i] = b.atd_list[0] if b.atd_list else None
+        std_first_o[i] = b.std_list[0] if b.std_list else None
+        apt_o[i] = b.apt
+        agenzia_o[i] = b.agenzia if b.agenzia else ""
+        to_o[i] = b.tour_operator if b.tour_operator else ""
+        servizio_o[i] = b.servizio_tipo if b.servizio_tipo else None
+        arrivi_o[i] = b.arrivi_trf if b.arrivi_trf else None
+        assistente_o[i] = b.assistente if b.assistente else ""
+        volo_o[i] = b.volo if b.volo else ""
+        dest_o[i] = b.destinazione if b.destinazione else ""
+        ffill_o[i] = b.turno_raw_ffill
+        norm_o[i] = b.turno_norm
+        festivo_o[i] = b.festivo_flag
+        errore_o[i] = _build_errore(b.errore, b.nota)
+        src_file_o[i] = b.first_source.file if b.first_source else ""
+        src_sheet_o[i] = b.first_source.sheet if b.first_source else ""
+        src_row[i] = b.first_source.row_index + 2 if b.first_source else 0
+        durata[i] = b.durata_min
+        no_dec[i] = bool(b.no_dec)
+        festivo[i] = bool(b.festivo_flag)
+        ok[i] = not b.errore
+
+    # Turno base secondo tipo servizio (M&G da arrivi/trf): un calcolo per coppia distinta
+    pairs = list(zip(servizio_o.tolist(), arrivi_o.tolist()))
+    turno_by_pair = {p: compute_turno_eur(p[0], p[1], cfg) for p in set(pairs)}
+    turno_eur = np.array([turno_by_pair[p] for p in pairs], dtype=float)
+
+    # Fine turno base = start_dt + 3h
+    start = pd.Series(pd.to_datetime(start_o))
+    end = pd.Series(pd.to_datetime(end_o))
+    fine_base = start + pd.Timedelta(hours=cfg.durata_base_ore)
+
+    # Extra: ATD - fine_turno_base (solo se DEC), arrotondato secondo policy
+    delta_s = (pd.Series(pd.to_datetime(atd_sel_o)) - fine_base).dt.total_seconds().to_numpy()
+    has_extra = ~no_dec & (np.nan_to_num(delta_s, nan=0.0) > 0)
+    extra_min_raw = np.where(has_extra, np.trunc(np.nan_to_num(delta_s, nan=0.0) / 60), 0).astype(np.int64)
+    extra_min = np.where(has_extra, cfg.rounding_extra.apply_array(extra_min_raw), 0)
+    extra_eur = np.where(extra_min > 0, round2_array((extra_min / 60.0) * 15.0), 0.0)
+
+    # Notturno: minuti nella fascia 23:00-03:30 del turno base + delle ore extra
+    has_times = (start.notna() & end.notna()).to_numpy()
+    extra_in_night = has_times & (extra_min_raw > 0) & ~no_dec & (extra_min > 0)
+    start_ns = start.to_numpy("datetime64[ns]").view("int64")
+    # Fine base su int64 ns (start + durata); le righe senza orari sono escluse da has_times
+    fine_ns = start_ns + int(cfg.durata_base_ore * 3600 * 1_000_000_000)
+    extra_end_ns = np.where(extra_in_night, fine_ns + extra_min * NS_PER_MIN, fine_ns)
+    night_min = np.where(has_times, night_minutes_vec(start_ns, fine_ns), 0)
+    night_min = night_min + np.where(extra_in_night, night_minutes_vec(fine_ns, extra_end_ns), 0)
+    night_eur = np.where(night_min > 0, round2_array(night_min * 0.031), 0.0)  # €0,031/min
+
+    # Festivo: +20% su tutto (turno + extra + notturno)
+    subtotal = turno_eur + extra_eur + night_eur
+    subtotal = np.where(festivo, subtotal * cfg.festivo_multiplier, subtotal)
+
+    # Blocchi con errore: tutti i valori a zero. Gli importi escono già arrotondati a 2 decimali
+    # (extra e notturno sopra, turno e totale qui): a valle non vanno ri-arrotondati
+    date_ts = pd.Series(pd.to_datetime(date_o))
+    zero_f = np.zeros(n, dtype=float)
+    detail = {
+        "DATA": date_ts.dt.strftime("%d/%m/%Y").fillna("").to_numpy(dtype=object),
+        "APT": apt_o,
+        "AGENZIA": agenzia_o,
+        "TOUR OPERATOR": to_o,
+        "SERVIZI": np.where(ok, np.where(pd.isna(servizio_o), "", servizio_o), np.nan),
+        "ARRIVI/TRF": np.where(ok, np.where(pd.isna(arrivi_o), "", arrivi_o), np.nan),
+        "ASSISTENTE": assistente_o,
+        "VOLO": volo_o,
+        "DEST.NE": dest_o,
+        "TURNO_FFILL": ffill_o,
+        "TURNO_NORMALIZZATO": norm_o,
+        "INIZIO_DT": start_o,
+        "FINE_DT": end_o,
+        "DURATA_TURNO_MIN": np.where(ok, durata, 0),
+        "NO_DEC": np.where(no_dec, "Sì", "No").astype(object),
+        "ATD_SCELTO": np.where(ok, atd_sel_o, atd_first_o),
+        "STD_SCELTO": std_first_o,
+        "TURNO_EUR": np.where(ok, round2_array(turno_eur), zero_f),
+        "EXTRA_MIN": np.where(ok, extra_min, 0).astype(np.int64),
+        "EXTRA_EUR": np.where(ok, extra_eur, zero_f),
+        "NOTTE_MIN": np.where(ok, night_min, 0).astype(np.int64),
+        "NOTTE_EUR": np.where(ok, night_eur, zero_f),
+        "FESTIVO": festivo_o.tolist(),  # lista: dtype inferito (bool) come prima
+        "TOTALE_BLOCCO_EUR": np.where(ok, round2_array(subtotal), zero_f),
+        "ERRORE": errore_o,
+        "SRC_FILE": src_file_o,
+        "SRC_SHEET": src_sheet_o,
+        "SRC_ROW0": src_row,
+        # Data come datetime64 per PERIODO (niente reparse della stringa DATA); rimossa da process_files
+        "__DATE_TS": date_ts.to_numpy(),
+    }
+    detail_df = pd.DataFrame(detail)
+    # Importi/minuti da array 1-D per colonna (mai una matrice 2-D per riga): ogni colonna
+    # resta contigua e sum/groupby la scorrono senza salti
+    assert detail_df["TURNO_EUR"].to_numpy().flags.c_contiguous
+
+    # Colonna ATD grezzo: presente solo se ci sono blocchi con errore
+    if not ok.all():
+        atd_raw = [", ".join(filter(None, b.atd_raw_list)) if b.errore else np.nan for b in blocks]
+        detail_df.insert(detail_df.columns.get_loc("NO_DEC") + 1, "ATD", atd_raw)
+    return detail_df
+
+
 def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Legge e processa i file Piano Lavoro per Aliservice
@@ -512,6 +879,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
     """
     blocks: Dict[Tuple[pd.Timestamp, str, str], BlockAgg] = {}
     global_order = 0
+    base_td = pd.Timedelta(hours=cfg.durata_base_ore)  # durata turno base, costruita una volta
 
     for file_path in input_files:
         for sheet_name, sdf0 in iter_excel_sheets(file_path):
@@ -527,30 +895,29 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             if not cols["data"] or not cols["apt"] or not has_orario:
                 continue
 
+            # Filtri AGENZIA / APT / DATA fusi in un'unica maschera: una sola copia del foglio
+            mask = pd.Series(True, index=sdf.index)
+
             # Filter per AGENZIA (Aliservice è un'AGENZIA, non un tour operator)
             if cols["agenzia"]:
-                mask_agenzia = sdf[cols["agenzia"]].astype(str).str.contains(cfg.to_keyword, case=False, na=False)
-                sdf = sdf[mask_agenzia].copy()
-                if sdf.empty:
-                    continue
+                mask &= str_contains_mask(sdf[cols["agenzia"]], cfg.to_keyword, regex=False)
 
             # Filter APT if requested
             if cfg.apt_filter and cols["apt"]:
                 apt_pat = "|".join([re.escape(a) for a in cfg.apt_filter])
-                mask_apt = sdf[cols["apt"]].astype(str).str.contains(rf"\b({apt_pat})\b", case=False, na=False)
-                sdf = sdf[mask_apt].copy()
-                if sdf.empty:
-                    continue
-
-            # Parse date
-            sdf["__date"] = sdf[cols["data"]].apply(parse_excel_date)
-            sdf = sdf[sdf["__date"].notna()].copy()
+                mask &= str_contains_mask(sdf[cols["apt"]], rf"\b({apt_pat})\b", regex=True)
+
+            # Parse date (solo sulle righe che hanno passato i filtri)
+            dates = parse_excel_date_series(sdf.loc[mask, cols["data"]])
+            mask.loc[dates.index] = dates.notna()
+            sdf = sdf.loc[mask].copy()
             if sdf.empty:
                 continue
+            sdf["__date"] = dates.loc[sdf.index]
 
             # Preserve order within this sheet chunk
-            sdf["__sheet_row_order"] = np.arange(len(sdf), dtype=int)
-            sdf["__global_order"] = np.arange(global_order, global_order + len(sdf), dtype=int)
+            sdf["__sheet_row_order"] = np.arange(len(sdf), dtype=np.int32)
+            sdf["__global_order"] = np.arange(global_order, global_order + len(sdf), dtype=np.int32)
             global_order += len(sdf)
             # ── NUOVO FORMATO 2026 (Inizio Turno + Fine turno) ──────────────
             # Se rilevato il nuovo formato, processa il blocco e fa continue.
@@ -593,8 +960,9 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                     sdf = sdf[sdf["__shm"].notna() & sdf["__ehm"].notna()].copy()
 
                     if not sdf.empty:
-                        sdf["__start_dt"] = sdf.apply(lambda r: to_dt(r["__date"],f"{r['__shm'][0]:02d}:{r['__shm'][1]:02d}"),axis=1)
-                        sdf["__end_dt"]   = sdf.apply(lambda r: to_dt(r["__date"],f"{r['__ehm'][0]:02d}:{r['__ehm'][1]:02d}"),axis=1)
+                        _day0 = sdf["__date"].dt.normalize()
+                        sdf["__start_dt"] = _day0 + pd.to_timedelta(sdf["__shm"].str[0]*60 + sdf["__shm"].str[1], unit="m")
+                        sdf["__end_dt"]   = _day0 + pd.to_timedelta(sdf["__ehm"].str[0]*60 + sdf["__ehm"].str[1], unit="m")
                         ov = sdf["__end_dt"] < sdf["__start_dt"]
                         sdf.loc[ov,"__end_dt"] += pd.Timedelta(days=1)
 
@@ -602,51 +970,68 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                         sdf["__festivo"] = sdf[_fv_c].apply(is_truthy_festivo) if _fv_c else False
                         _pi_c = cols.get("importo"); _pe_c = cols.get("ore_extra"); _pn_c = cols.get("notturno")
 
-                        for _i, _r in sdf.iterrows():
-                            _d   = _r["__date"]
-                            _apt = _ss(_r[cols["apt"]])
-                            _to  = _ss(_r[_to_c]) if _to_c else ""
-                            _as  = _ss(_r[_ass_c]) if _ass_c else ""
-                            _sh,_sm = _r["__shm"]; _eh,_em = _r["__ehm"]
-                            _tn  = f"{_sh:02d}:{_sm:02d}-{_eh:02d}:{_em:02d}"
+                        # Valori per riga precalcolati a colonne (niente pd.notna/_ss per cella nel ciclo)
+                        _n = len(sdf)
+                        _apt_v = sdf[cols["apt"]].apply(_ss).to_numpy()
+                        _to_v  = sdf["__to_s"].to_numpy() if _to_c else np.full(_n, "", dtype=object)
+                        _as_v  = sdf["__as_s"].to_numpy() if _ass_c else np.full(_n, "", dtype=object)
+                        _vc = cols.get("volo"); _dc = cols.get("destinazione")
+                        _vo_v  = sdf[_vc].apply(_ss).to_numpy() if _vc else np.full(_n, None, dtype=object)
+                        _de_v  = sdf[_dc].apply(_ss).to_numpy() if _dc else np.full(_n, None, dtype=object)
+                        _hm = lambda t: f"{t[0]:02d}:{t[1]:02d}"
+                        _tn_v  = (sdf["__shm"].map(_hm) + "-" + sdf["__ehm"].map(_hm)).to_numpy()
+                        _dur_v = ((sdf["__end_dt"] - sdf["__start_dt"]) // pd.Timedelta(minutes=1)).to_numpy()
+                        _fe_v  = sdf["__festivo"].astype(bool).to_numpy() if _fv_c else np.zeros(_n, dtype=bool)
+
+                        def _anchor(col):
+                            # orario -> data + HH:MM (+1 giorno se prima dell'inizio turno); NaT se non valido
+                            if not col:
+                                return np.full(_n, pd.NaT, dtype=object), np.zeros(_n, dtype=bool)
+                            tmin = parse_time_series(sdf[col])
+                            tdt = sdf["__date"] + pd.to_timedelta(tmin, unit="m")
+                            tdt = tdt.mask(tdt < sdf["__start_dt"], tdt + pd.Timedelta(days=1))
+                            return tdt.to_numpy(dtype=object), tmin.notna().to_numpy()
+
+                        _atd_v, _atd_ok = _anchor(cols.get("atd"))
+                        _std_v, _std_ok = _anchor(_std_c)
+                        if cols.get("atd"):
+                            _atd_raw = clean_str_series(sdf[cols["atd"]])
+                            _atd_raw_v = _atd_raw.mask(_atd_raw.str.lower().isin(["nan", "none"]), "").to_numpy()
+                        else:
+                            _atd_raw_v = np.full(_n, "", dtype=object)
+
+                        _d_v  = sdf["__date"].to_numpy(dtype=object)
+                        _st_v = sdf["__start_dt"].to_numpy(dtype=object)
+                        _en_v = sdf["__end_dt"].to_numpy(dtype=object)
+                        _ro_v = sdf["__sheet_row_order"].to_numpy()
+                        _go_v = sdf["__global_order"].to_numpy()
+
+                        for _i in range(_n):
+                            _d   = _d_v[_i]
+                            _apt = _apt_v[_i]
+                            _to  = _to_v[_i]
+                            _as  = _as_v[_i]
+                            _tn  = _tn_v[_i]
                             _key = (_d, _to, _apt, _as)
 
-                            atd_raw_val = ""
-                            if cols.get("atd") and pd.notna(_r[cols["atd"]]):
-                                _s = str(_r[cols["atd"]]).strip()
-                                if _s.lower() not in ("nan", "none"):
-                                    atd_raw_val = _s
-
-                            _atdt = []
-                            _stdt = []  # STD separato
-                            if cols.get("atd"):
-                                _ap = parse_time_value(_r[cols["atd"]])
-                                if _ap:
-                                    _tdt = _d + pd.Timedelta(hours=_ap[0], minutes=_ap[1])
-                                    if _tdt < _r["__start_dt"]: _tdt += pd.Timedelta(days=1)
-                                    _atdt.append(_tdt)
-                            if _std_c and _std_c in _r.index:
-                                _sp = parse_time_value(_r[_std_c])
-                                if _sp:
-                                    _tdt = _d + pd.Timedelta(hours=_sp[0], minutes=_sp[1])
-                                    if _tdt < _r["__start_dt"]: _tdt += pd.Timedelta(days=1)
-                                    _stdt.append(_tdt)  # STD in lista separata
+                            atd_raw_val = _atd_raw_v[_i]
+                            _atdt = [_atd_v[_i]] if _atd_ok[_i] else []
+                            _stdt = [_std_v[_i]] if _std_ok[_i] else []  # STD separato
 
                             _src = SourceRowRef(file=file_path, sheet=sheet_name,
-                                                row_index=int(_r["__sheet_row_order"]),
-                                                original_order=int(_r["__global_order"]))
+                                                row_index=int(_ro_v[_i]),
+                                                original_order=int(_go_v[_i]))
 
                             if _key not in blocks:
-                                _vc = cols.get("volo"); _vv = _ss(_r[_vc]) if _vc and _vc in _r.index else None
-                                _dc = cols.get("destinazione"); _dv = _ss(_r[_dc]) if _dc and _dc in _r.index else None
+                                _vv = _vo_v[_i]; _dv = _de_v[_i]
                                 blocks[_key] = BlockAgg(
                                     date=_d, apt=_apt,
                                     turno_raw_ffill=_tn, turno_norm=_tn,
-                                    start_dt=_r["__start_dt"], end_dt=_r["__end_dt"],
-                                    durata_min=int((_r["__end_dt"]-_r["__start_dt"]).total_seconds()/60),
+                                    start_dt=_st_v[_i], end_dt=_en_v[_i],
+                                    durata_min=int(_dur_v[_i]),
                                     no_dec=False, atd_list=_atdt.copy(), std_list=_stdt.copy(),
                                     atd_raw_list=[atd_raw_val] if atd_raw_val else [],
-                                    festivo_flag=bool(_r["__festivo"]),
+                                    festivo_flag=bool(_fe_v[_i]),
                                     first_source=_src,
                                     assistente=_as or None,
                                     tour_operator=_to or None,
@@ -657,7 +1042,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                                 if atd_raw_val and atd_raw_val not in _b.atd_raw_list:
                                     _b.atd_raw_list.append(atd_raw_val)
                                 _b.atd_list.extend(_atdt)
-                                _b.festivo_flag = _b.festivo_flag or bool(_r["__festivo"])
+                                _b.festivo_flag = _b.festivo_flag or bool(_fe_v[_i])
                                 if _src.original_order < _b.first_source.original_order:
                                     _b.first_source = _src
                 continue  # nuovo formato processato — salta il vecchio codice sotto
@@ -668,7 +1053,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             # Forward-fill TURNO per DATA within the sheet chunk order
             turno_col = cols["turno"]
             sdf["__turno_raw"] = sdf[turno_col].astype(str)
-            ffill_src = sdf[turno_col].replace("", np.nan)
+            ffill_src = sdf[turno_col].where(sdf[turno_col] != "")  # "" -> NaN
 
             # ──────────────────────────────────────────────────────────────────
             # FIX: salva PRIMA del ffill quali righe NON hanno turno originale.
@@ -680,28 +1065,25 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             sdf["__turno_ffill"] = ffill_src.ffill()
 
             # Parse turno
-            sdf["__turno_parsed"] = sdf["__turno_ffill"].apply(parse_turno)
-            sdf["__start_str"] = sdf["__turno_parsed"].apply(lambda x: x[0] if x else None)
-            sdf["__end_str"] = sdf["__turno_parsed"].apply(lambda x: x[1] if x else None)
-            sdf["__no_dec"] = sdf["__turno_parsed"].apply(lambda x: x[2] if x else False)
-            sdf["__turno_norm"] = sdf["__turno_parsed"].apply(lambda x: x[3] if x else "")
+            turno_parsed = parse_turno_series(sdf["__turno_ffill"])
+            sdf["__start_str"] = turno_parsed["start_str"]
+            sdf["__end_str"] = turno_parsed["end_str"]
+            sdf["__no_dec"] = turno_parsed["no_dec"]
+            sdf["__turno_norm"] = turno_parsed["turno_norm"]
 
             # Calcola start_dt e end_dt
-            sdf["__start_dt"] = sdf.apply(
-                lambda r: to_dt(r["__date"], r["__start_str"]) if r["__start_str"] else pd.NaT, axis=1
-            )
-            sdf["__end_dt"] = sdf.apply(
-                lambda r: to_dt(r["__date"], r["__end_str"]) if r["__end_str"] else pd.NaT, axis=1
-            )
-
-            # Gestisci mezzanotte (fine < inizio => +1 giorno)
-            mask_overnight = (sdf["__end_dt"] < sdf["__start_dt"]) & sdf["__end_dt"].notna()
-            sdf.loc[mask_overnight, "__end_dt"] = sdf.loc[mask_overnight, "__end_dt"] + pd.Timedelta(days=1)
-
-            # Calcola durata
-            sdf["__durata_min"] = (
-                (sdf["__end_dt"] - sdf["__start_dt"]).dt.total_seconds() / 60.0
-            ).astype(int)
+            sdf["__start_dt"] = to_dt_series(sdf["__date"], sdf["__start_str"])
+            sdf["__end_dt"] = to_dt_series(sdf["__date"], sdf["__end_str"])
+
+            # Gestisci mezzanotte (fine < inizio => +1 giorno), in int64 ns
+            sv = sdf["__start_dt"].to_numpy("datetime64[ns]").view("int64")
+            ev = sdf["__end_dt"].to_numpy("datetime64[ns]").copy().view("int64")
+            valid = sdf["__start_dt"].notna().to_numpy() & sdf["__end_dt"].notna().to_numpy()
+            ev[valid & (ev < sv)] += NS_PER_DAY
+            sdf["__end_dt"] = ev.view("datetime64[ns]")
+
+            # Calcola durata (minuti interi; 0 se il turno non è leggibile)
+            sdf["__durata_min"] = np.where(valid, (ev - sv) // NS_PER_MIN, 0).astype(np.int32)
 
             # Extract colonne aggiuntive
             assistente_col = cols["assistente"]
@@ -726,63 +1108,101 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             #   che questa riga finisca aggregata col blocco del ffill.
             # ──────────────────────────────────────────────────────────────────
             if convocazione_col:
-                sdf["__convocazione"] = sdf[convocazione_col].apply(parse_time_value)
-                # Righe originalmente senza turno
-                mask_no_turno_orig = sdf["__turno_originale_mancante"]
-                if mask_no_turno_orig.any():
-                    for idx in sdf[mask_no_turno_orig].index:
-                        conv = sdf.loc[idx, "__convocazione"]
-                        if conv:
-                            hh, mm = conv
-                            # Inizio = CONV.NE (già l'orario esatto di convocazione)
-                            start_dt = to_dt(sdf.loc[idx, "__date"], f"{hh:02d}:{mm:02d}")
-                            # Fine base = inizio + 3h (verrà poi aggiornata con ATD)
-                            end_dt = start_dt + pd.Timedelta(hours=cfg.durata_base_ore)
-                            sdf.loc[idx, "__start_dt"] = start_dt
-                            sdf.loc[idx, "__end_dt"] = end_dt
-                            sdf.loc[idx, "__start_str"] = start_dt.strftime("%H:%M")
-                            sdf.loc[idx, "__end_str"] = end_dt.strftime("%H:%M")
-                            # Chiave univoca basata su CONV.NE, non sul turno forward-fillato
-                            sdf.loc[idx, "__turno_norm"] = f"{start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')}"
-                            sdf.loc[idx, "__turno_ffill"] = sdf.loc[idx, "__turno_norm"]
-                            sdf.loc[idx, "__durata_min"] = int(
-                                (end_dt - start_dt).total_seconds() / 60
-                            )
-
-            # Iterate rows and aggregate by block
-            for idx, r in sdf.iterrows():
+                conv_min = parse_time_series(sdf[convocazione_col])
+                # Righe originalmente senza turno (e con CONV.NE valida)
+                mask_conv = sdf["__turno_originale_mancante"] & conv_min.notna()
+                if mask_conv.any():
+                    # Inizio = CONV.NE (già l'orario esatto di convocazione)
+                    start_conv = sdf.loc[mask_conv, "__date"].dt.normalize() + pd.to_timedelta(
+                        conv_min[mask_conv], unit="m"
+                    )
+                    # Fine base = inizio + 3h (verrà poi aggiornata con ATD)
+                    end_conv = start_conv + base_td
+                    start_conv_str = start_conv.dt.strftime("%H:%M")
+                    end_conv_str = end_conv.dt.strftime("%H:%M")
+                    sdf.loc[mask_conv, "__start_dt"] = start_conv
+                    sdf.loc[mask_conv, "__end_dt"] = end_conv
+                    sdf.loc[mask_conv, "__start_str"] = start_conv_str
+                    sdf.loc[mask_conv, "__end_str"] = end_conv_str
+                    # Chiave univoca basata su CONV.NE, non sul turno forward-fillato
+                    sdf.loc[mask_conv, "__turno_norm"] = start_conv_str + "-" + end_conv_str
+                    sdf.loc[mask_conv, "__turno_ffill"] = sdf.loc[mask_conv, "__turno_norm"]
+                    sdf.loc[mask_conv, "__durata_min"] = (
+                        (end_conv - start_conv) // pd.Timedelta(minutes=1)
+                    ).astype(np.int32)
+
+            # ──────────────────────────────────────────────────────────────────
+            # Aggregazione per blocco (DATA, APT, TURNO_NORM, TOUR OPERATOR):
+            # i campi per riga sono calcolati a colonne, poi un groupby nell'ordine
+            # del foglio; i BlockAgg si creano una volta per gruppo, non per riga.
+            # ──────────────────────────────────────────────────────────────────
+            def _str_col(col):
+                if not col or col not in sdf.columns:
+                    return pd.Series("", index=sdf.index, dtype=object)
+                return clean_str_series(sdf[col])
+
+            sdf["__apt"] = sdf[cols["apt"]].astype(str).str.strip() if cols["apt"] else ""
+            sdf["__to"] = _str_col(tour_operator_col)
+            turno_norm_s = _str_col("__turno_norm")
+            # Se turno_norm è vuoto, usa un placeholder per la chiave
+            sdf["__turno_key"] = turno_norm_s.where(turno_norm_s != "", "ERRORE_" + sdf.index.astype(str))
+
+            # Anchor ATD/STD to date; if < start_dt => +1 day
+            def _anchor_times(col):
+                if not col:
+                    return pd.Series(pd.NaT, index=sdf.index, dtype="datetime64[ns]")
+                tdt = sdf["__date"] + pd.to_timedelta(parse_time_series(sdf[col]), unit="m")
+                return tdt.mask(tdt < sdf["__start_dt"], tdt + pd.Timedelta(days=1))
+
+            sdf["__atd_dt"] = _anchor_times(cols["atd"])
+            sdf["__std_dt"] = _anchor_times(cols["std"])
+            if cols["atd"]:
+                atd_raw = clean_str_series(sdf[cols["atd"]])
+                sdf["__atd_raw"] = atd_raw.where(~atd_raw.str.lower().isin(["nan", "none"]), "")
+            else:
+                sdf["__atd_raw"] = ""
+
+            # Fine turno = ATD (se manca → STD, se manca anche STD → end_dt del turno)
+            # Per Aliservice: fine turno effettivo è ATD, non end_dt del turno
+            fine_turno = sdf["__atd_dt"].fillna(sdf["__std_dt"]).fillna(sdf["__end_dt"])
+            # Se fine_turno_dt < start_dt (oltre mezzanotte) => +1 giorno
+            sdf["__fine_turno_dt"] = fine_turno.mask(fine_turno < sdf["__start_dt"], fine_turno + pd.Timedelta(days=1))
+
+            # Un gruppo per blocco, numerato in ordine di prima apparizione.
+            # Chiave intera: codici di DATA, APT, TURNO, TO combinati in un int64
+            # (niente tuple per riga da hashare).
+            blk_key = np.zeros(len(sdf), dtype=np.int64)
+            for c in ("__date", "__apt", "__turno_key", "__to"):
+                codes, uniques = pd.factorize(sdf[c])
+                blk_key = blk_key * len(uniques) + codes
+            sdf["__blk"] = pd.factorize(blk_key)[0]
+            grouped = sdf.groupby("__blk")
+            firsts = sdf.drop_duplicates("__blk")
+            fine_max = grouped["__fine_turno_dt"].max().to_numpy()
+            atd_by_blk = sdf[sdf["__atd_dt"].notna()].groupby("__blk")["__atd_dt"].agg(list).to_dict()
+            std_by_blk = sdf[sdf["__std_dt"].notna()].groupby("__blk")["__std_dt"].agg(list).to_dict()
+            atd_raw_by_blk = grouped["__atd_raw"].agg(list).to_numpy()
+
+            first_vals = {
+                "agenzia": _str_col(agenzia_col).loc[firsts.index],
+                "servizio": _str_col(servizi_col).loc[firsts.index],
+                "arrivi_trf": _str_col(arrivi_trf_col).loc[firsts.index],
+                "giorno": _str_col(giorno_col).loc[firsts.index],
+                "turno_ffill": _str_col("__turno_ffill").loc[firsts.index],
+                "assistente": _str_col(assistente_col).loc[firsts.index],
+                "volo": _str_col(cols.get("volo")).loc[firsts.index].replace("nan", ""),
+                "destinazione": _str_col(cols.get("destinazione")).loc[firsts.index].replace("nan", ""),
+            }
+            festivo_first = first_vals["giorno"].str.lower().str.contains("festivo", regex=False)
+            no_dec_first = firsts["__no_dec"].where(firsts["__no_dec"].notna(), False)
+            durata_first = firsts["__durata_min"].fillna(0)
+
+            for i, (idx, r) in enumerate(firsts.iterrows()):
                 d = r["__date"]
-                apt = str(r[cols["apt"]]).strip() if cols["apt"] else ""
-                agenzia_val = str(r[agenzia_col]).strip() if agenzia_col and agenzia_col in r.index and pd.notna(r[agenzia_col]) else ""
-                tour_operator_val = str(r[tour_operator_col]).strip() if tour_operator_col and tour_operator_col in r.index and pd.notna(r[tour_operator_col]) else ""
-                servizio_tipo = str(r[servizi_col]).strip() if servizi_col and servizi_col in r.index and pd.notna(r[servizi_col]) else ""
-                arrivi_trf_val = str(r[arrivi_trf_col]).strip() if arrivi_trf_col and arrivi_trf_col in r.index and pd.notna(r[arrivi_trf_col]) else ""
-                giorno_val = str(r[giorno_col]).strip() if giorno_col and giorno_col in r.index and pd.notna(r[giorno_col]) else ""
-                turno_norm = str(r["__turno_norm"]).strip() if pd.notna(r.get("__turno_norm")) else ""
-                turno_ffill_raw = str(r["__turno_ffill"]).strip() if pd.notna(r.get("__turno_ffill")) else ""
-                assistente_val = str(r[assistente_col]).strip() if assistente_col and assistente_col in r.index and pd.notna(r[assistente_col]) else ""
-                no_dec = r["__no_dec"] if pd.notna(r.get("__no_dec")) else False
-                festivo_flag = is_festivo_from_giorno(giorno_val)
-
-                # Extract volo from row
-                volo_col = cols.get("volo")
-                volo_val = None
-                if volo_col and volo_col in r.index:
-                    volo_val = str(r[volo_col]).strip() if pd.notna(r[volo_col]) else None
-                    if volo_val == "" or volo_val == "nan":
-                        volo_val = None
-
-                # Extract destinazione from row
-                dest_col = cols.get("destinazione")
-                dest_val = None
-                if dest_col and dest_col in r.index:
-                    dest_val = str(r[dest_col]).strip() if pd.notna(r[dest_col]) else None
-                    if dest_val == "" or dest_val == "nan":
-                        dest_val = None
-
-                # Se turno_norm è vuoto, usa un placeholder per la chiave
-                if not turno_norm:
-                    turno_norm = f"ERRORE_{idx}"
+                apt = r["__apt"]
+                tour_operator_val = r["__to"]
+                turno_norm = r["__turno_key"]
+                start_dt_val = r["__start_dt"]
 
                 # Chiave include anche tour_operator se presente (per distinguere blocchi di tour operator diversi)
                 if tour_operator_val:
@@ -790,219 +1210,76 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                 else:
                     key = (d, apt, turno_norm)
 
-                # Extract ATD candidates from row
-                atd_raw_val = ""
-                atd_times: List[Tuple[int, int]] = []
-                if cols["atd"]:
-                    atd_val = r[cols["atd"]]
-                    atd_raw_str = str(atd_val).strip() if pd.notna(atd_val) else ""
-                    if atd_raw_str and atd_raw_str.lower() not in ("nan", "none"):
-                        atd_raw_val = atd_raw_str
-                    parsed = parse_time_value(atd_val)
-                    if parsed:
-                        atd_times.append(parsed)
-
-                # Extract STD candidates from row
-                std_times: List[Tuple[int, int]] = []
-                if cols["std"]:
-                    std_val = r[cols["std"]]
-                    parsed = parse_time_value(std_val)
-                    if parsed:
-                        std_times.append(parsed)
-
-                # Anchor ATDs to date; if ATD < start_dt => +1 day
-                atd_dt_list: List[pd.Timestamp] = []
-                for hh, mm in atd_times:
-                    tdt = d + pd.Timedelta(hours=hh, minutes=mm)
-                    if tdt < r["__start_dt"]:
-                        tdt = tdt + pd.Timedelta(days=1)
-                    atd_dt_list.append(tdt)
-
-                # Anchor STDs to date; if STD < start_dt => +1 day
-                std_dt_list: List[pd.Timestamp] = []
-                for hh, mm in std_times:
-                    tdt = d + pd.Timedelta(hours=hh, minutes=mm)
-                    start_dt_val = r["__start_dt"]
-                    if pd.notna(start_dt_val) and tdt < start_dt_val:
-                        tdt = tdt + pd.Timedelta(days=1)
-                    std_dt_list.append(tdt)
-
-                # Fine turno = ATD (se manca → STD)
-                # Per Aliservice: fine turno effettivo è ATD, non end_dt del turno
-                fine_turno_dt = None
-                if atd_dt_list:
-                    fine_turno_dt = max(atd_dt_list)  # Prendi l'ultimo ATD
-                elif std_dt_list:
-                    fine_turno_dt = max(std_dt_list)  # Se manca ATD, usa STD
-                else:
-                    # Se manca anche STD, usa end_dt del turno
-                    fine_turno_dt = r["__end_dt"] if pd.notna(r.get("__end_dt")) else None
-
-                # Se fine_turno_dt < start_dt (oltre mezzanotte) => +1 giorno
-                start_dt_val = r["__start_dt"]
-                if pd.notna(start_dt_val) and pd.notna(fine_turno_dt) and fine_turno_dt < start_dt_val:
-                    fine_turno_dt = fine_turno_dt + pd.Timedelta(days=1)
+                atd_dt_list = atd_by_blk.get(i, [])
+                std_dt_list = std_by_blk.get(i, [])
+                atd_raw_vals = atd_raw_by_blk[i]
 
                 # Aggrega o crea nuovo blocco
                 if key in blocks:
                     b = blocks[key]
-                    if atd_raw_val and atd_raw_val not in b.atd_raw_list:
-                        b.atd_raw_list.append(atd_raw_val)
-                    b.atd_list.extend(atd_dt_list)
-                    b.std_list.extend(std_dt_list)
-                    # Aggiorna fine_turno se ATD è più tardi
-                    if fine_turno_dt and (b.end_dt is None or fine_turno_dt > b.end_dt):
-                        b.end_dt = fine_turno_dt
                 else:
                     # Fine turno base = start_dt + 3h
-                    end_dt_base = r["__end_dt"] if pd.notna(r.get("__end_dt")) else None
+                    end_dt_base = r["__end_dt"] if pd.notna(r["__end_dt"]) else None
                     if pd.notna(start_dt_val):
                         if end_dt_base is None:
-                            end_dt_base = start_dt_val + pd.Timedelta(hours=cfg.durata_base_ore)
-                    
-                    blocks[key] = BlockAgg(
+                            end_dt_base = start_dt_val + base_td
+                    fine_first = r["__fine_turno_dt"]
+
+                    agenzia_val = first_vals["agenzia"].iat[i]
+                    servizio_tipo = first_vals["servizio"].iat[i]
+                    arrivi_trf_val = first_vals["arrivi_trf"].iat[i]
+                    assistente_val = first_vals["assistente"].iat[i]
+                    volo_val = first_vals["volo"].iat[i]
+                    dest_val = first_vals["destinazione"].iat[i]
+                    b = blocks[key] = BlockAgg(
                         date=d,
                         apt=apt,
                         agenzia=agenzia_val if agenzia_val else None,
                         tour_operator=tour_operator_val if tour_operator_val else None,
                         servizio_tipo=servizio_tipo if servizio_tipo else None,
                         arrivi_trf=arrivi_trf_val if arrivi_trf_val else None,  # Campo arrivi/trf (M&G = Meet & Greet)
-                        turno_raw_ffill=turno_ffill_raw,
+                        turno_raw_ffill=first_vals["turno_ffill"].iat[i],
                         turno_norm=turno_norm,
                         start_dt=start_dt_val,
-                        end_dt=fine_turno_dt if fine_turno_dt else end_dt_base,  # Fine turno = ATD (o STD o end_dt)
-                        durata_min=int(r["__durata_min"]) if pd.notna(r["__durata_min"]) else 0,
-                        no_dec=no_dec,
-                        festivo_flag=festivo_flag,
+                        end_dt=fine_first if pd.notna(fine_first) else end_dt_base,  # Fine turno = ATD (o STD o end_dt)
+                        durata_min=int(durata_first.iat[i]),
+                        no_dec=bool(no_dec_first.iat[i]),
+                        festivo_flag=bool(festivo_first.iat[i]),
                         first_source=SourceRowRef(
                             file=file_path,
                             sheet=sheet_name,
                             row_index=int(r["__sheet_row_order"]),
                             original_order=int(r["__global_order"]),
                         ),
-                        atd_list=atd_dt_list,
-                        std_list=std_dt_list,
+                        atd_list=[],
+                        std_list=[],
                         assistente=assistente_val if assistente_val else None,
                         volo=volo_val if volo_val else None,
                         destinazione=dest_val if dest_val else None,
                     )
+                    # La riga che crea il blocco non registra il proprio ATD grezzo
+                    atd_raw_vals = atd_raw_vals[1:]
 
-    # Converti blocchi in DataFrame per output
-    rows_detail = []
-
-    for key, b in sorted(blocks.items(), key=lambda kv: kv[1].first_source.original_order if kv[1].first_source else 0):
-        # Se c'è un errore, metti tutti i valori a zero
-        if b.errore:
-            rows_detail.append({
-                "DATA": b.date.strftime("%d/%m/%Y") if pd.notna(b.date) else "",
-                "APT": b.apt,
-                "AGENZIA": b.agenzia if b.agenzia else "",
-                "TOUR OPERATOR": b.tour_operator if b.tour_operator else "",
-                "ASSISTENTE": b.assistente if b.assistente else "",
-                "VOLO": b.volo if b.volo else "",
-                "DEST.NE": b.destinazione if b.destinazione else "",
-                "TURNO_FFILL": b.turno_raw_ffill,
-                "TURNO_NORMALIZZATO": b.turno_norm,
-                "INIZIO_DT": b.start_dt,
-                "FINE_DT": b.end_dt,
-                "DURATA_TURNO_MIN": 0,
-                "NO_DEC": "Sì" if b.no_dec else "No",
-                "ATD": ", ".join(filter(None, b.atd_raw_list)),
-            "ATD_SCELTO": b.atd_list[0] if b.atd_list else None,
-                "STD_SCELTO": b.std_list[0] if b.std_list else None,
-                "TURNO_EUR": 0.0,
-                "EXTRA_MIN": 0,
-                "EXTRA_EUR": 0.0,
-                "NOTTE_MIN": 0,
-                "NOTTE_EUR": 0.0,
-                "FESTIVO": b.festivo_flag,
-                "TOTALE_BLOCCO_EUR": 0.0,
-                "ERRORE": _build_errore(b.errore, b.nota),
-                "SRC_FILE": b.first_source.file if b.first_source else "",
-                "SRC_SHEET": b.first_source.sheet if b.first_source else "",
-                "SRC_ROW0": b.first_source.row_index + 2 if b.first_source else 0,
-            })
-            continue
+                for atd_raw_val in atd_raw_vals:
+                    if atd_raw_val and atd_raw_val not in b.atd_raw_list:
+                        b.atd_raw_list.append(atd_raw_val)
+                b.atd_list.extend(atd_dt_list)
+                b.std_list.extend(std_dt_list)
+                # Aggiorna fine_turno se ATD è più tardi
+                if pd.notna(fine_max[i]) and (b.end_dt is None or fine_max[i] > b.end_dt):
+                    b.end_dt = pd.Timestamp(fine_max[i])
 
-        # Calcolo turno base secondo tipo servizio
-        # Se arrivi_trf contiene "M&G" → Meet & Greet (€65)
-        # Altrimenti usa servizio_tipo dalla colonna "Servizi"
-        servizio_tipo = b.servizio_tipo if b.servizio_tipo else None
-        arrivi_trf = b.arrivi_trf if b.arrivi_trf else None
-        turno_eur = compute_turno_eur(servizio_tipo, arrivi_trf, cfg)
-
-        # Fine turno base = start_dt + 3h
-        fine_turno_base = None
-        if pd.notna(b.start_dt):
-            fine_turno_base = b.start_dt + pd.Timedelta(hours=cfg.durata_base_ore)
-
-        # ATD scelto (ultimo disponibile)
-        atd_sel = b.atd_list[-1] if b.atd_list else None
-        if not atd_sel and b.std_list:
-            atd_sel = b.std_list[-1]
-
-        # Calcolo extra: ATD - fine_turno_base (solo se DEC)
-        extra_min_raw, extra_min = compute_extra_min(fine_turno_base, atd_sel, b.no_dec, cfg)
-        extra_eur = compute_extra_eur(extra_min, servizio_tipo, cfg)
-
-        # Calcolo notturno: minuti nella fascia 23:00-03:30
-        night_min_raw = 0
-        if pd.notna(b.start_dt) and pd.notna(b.end_dt):
-            # Minuti notturni nel turno base
-            night_turno = night_minutes(b.start_dt, fine_turno_base if fine_turno_base else b.end_dt)
-            # Minuti notturni nelle ore extra
-            night_extra = 0
-            if extra_min_raw > 0 and (not b.no_dec) and extra_min > 0 and fine_turno_base:
-                extra_end = fine_turno_base + pd.Timedelta(minutes=extra_min)
-                night_extra = night_minutes(fine_turno_base, extra_end)
-            night_min_raw = night_turno + night_extra
-
-        night_min = night_min_raw  # Nessun arrotondamento per notturno
-        night_eur = compute_night_eur(night_min, cfg)
-
-        # Festivo: +20% su tutto (turno + extra + notturno)
-        if b.festivo_flag:
-            subtotal = (turno_eur + extra_eur + night_eur) * cfg.festivo_multiplier
-        else:
-            subtotal = turno_eur + extra_eur + night_eur
-        totale = round(subtotal, 2)
-
-        # Format H:MM
-        def hmm(m: int) -> str:
-            return f"{m // 60}:{m % 60:02d}"
-
-        rows_detail.append({
-            "DATA": b.date.strftime("%d/%m/%Y") if pd.notna(b.date) else "",
-            "APT": b.apt,
-            "AGENZIA": b.agenzia if b.agenzia else "",
-            "TOUR OPERATOR": b.tour_operator if b.tour_operator else "",
-            "SERVIZI": b.servizio_tipo if b.servizio_tipo else "",
-            "ARRIVI/TRF": b.arrivi_trf if b.arrivi_trf else "",  # Campo arrivi/trf (M&G = Meet & Greet)
-            "ASSISTENTE": b.assistente if b.assistente else "",
-            "VOLO": b.volo if b.volo else "",
-            "DEST.NE": b.destinazione if b.destinazione else "",
-            "TURNO_FFILL": b.turno_raw_ffill,
-            "TURNO_NORMALIZZATO": b.turno_norm,
-            "INIZIO_DT": b.start_dt,
-            "FINE_DT": b.end_dt,
-            "DURATA_TURNO_MIN": b.durata_min,
-            "NO_DEC": "Sì" if b.no_dec else "No",
-            "ATD_SCELTO": atd_sel,
-            "STD_SCELTO": b.std_list[0] if b.std_list else None,
-            "TURNO_EUR": round(turno_eur, 2),
-            "EXTRA_MIN": int(extra_min),
-            "EXTRA_EUR": round(extra_eur, 2),
-            "NOTTE_MIN": int(night_min),
-            "NOTTE_EUR": round(night_eur, 2),
-            "FESTIVO": b.festivo_flag,
-            "TOTALE_BLOCCO_EUR": totale,
-            "ERRORE": _build_errore(None, b.nota),
-            "SRC_FILE": b.first_source.file if b.first_source else "",
-            "SRC_SHEET": b.first_source.sheet if b.first_source else "",
-            "SRC_ROW0": b.first_source.row_index + 2 if b.first_source else 0,
-        })
-
-    detail_df = pd.DataFrame(rows_detail)
+    # Converti blocchi in DataFrame per output
+    # Ordine di prima apparizione (argsort stabile su int64, come sorted() sulla stessa chiave)
+    block_items = list(blocks.values())
+    first_order = np.fromiter(
+        (b.first_source.original_order if b.first_source else 0 for b in block_items),
+        dtype=np.int64,
+        count=len(block_items),
+    )
+    detail_df = blocks_to_detail_df(
+        [block_items[i] for i in np.argsort(first_order, kind="stable")], cfg
+    )
 
     # Totals by period (come Alpitour/Veratour)
     if detail_df.empty:
@@ -1019,12 +1296,10 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
         ])
         return detail_df, totals_df, discr_df
 
-    detail_df["__DATE_TS"] = pd.to_datetime(detail_df["DATA"], dayfirst=True)
     detail_df["PERIODO"] = np.where(detail_df["__DATE_TS"].dt.day <= 15, "1–15", "16–31")
 
     def sum_hmm(minutes: int) -> str:
-        minutes = int(minutes)
-        return f"{minutes // 60}:{minutes % 60:02d}"
+        return _hmm_cached(int(minutes))
 
     # Raggruppa per AGENZIA, TOUR OPERATOR e PERIODO se presenti
     groupby_cols = ["PERIODO"]
@@ -1033,13 +1308,20 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
     if "TOUR OPERATOR" in detail_df.columns:
         groupby_cols = groupby_cols[:1] + ["TOUR OPERATOR"] + groupby_cols[1:] if "AGENZIA" in detail_df.columns else ["TOUR OPERATOR"] + groupby_cols
     
-    totals = detail_df.groupby(groupby_cols, as_index=False).agg(
-        TOT_TURNO_EUR=("TURNO_EUR", "sum"),
-        TOT_EXTRA_MIN=("EXTRA_MIN", "sum"),
-        TOT_EXTRA_EUR=("EXTRA_EUR", "sum"),
-        TOT_NOTTE_MIN=("NOTTE_MIN", "sum"),
-        TOT_NOTTE_EUR=("NOTTE_EUR", "sum"),
-        TOT_TOTALE_EUR=("TOTALE_BLOCCO_EUR", "sum"),
+    # Un solo groupby-sum su tutte le colonne numeriche (kernel cython multi-colonna)
+    tot_cols = {
+        "TURNO_EUR": "TOT_TURNO_EUR",
+        "EXTRA_MIN": "TOT_EXTRA_MIN",
+        "EXTRA_EUR": "TOT_EXTRA_EUR",
+        "NOTTE_MIN": "TOT_NOTTE_MIN",
+        "NOTTE_EUR": "TOT_NOTTE_EUR",
+        "TOTALE_BLOCCO_EUR": "TOT_TOTALE_EUR",
+    }
+    totals = (
+        detail_df.groupby(category_keys(detail_df, groupby_cols), observed=True)[list(tot_cols)].sum()
+        .reset_index()
+        .astype({c: object for c in groupby_cols})
+        .rename(columns=tot_cols)
     )
 
     totals["TOT_EXTRA_H:MM"] = totals["TOT_EXTRA_MIN"].apply(sum_hmm)
@@ -1064,17 +1346,19 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
     # Riga totale mese
     agenzia_val = detail_df["AGENZIA"].iloc[0] if "AGENZIA" in detail_df.columns else ""
     tour_operator_val = detail_df["TOUR OPERATOR"].iloc[0] if "TOUR OPERATOR" in detail_df.columns else ""
+    # Somme del mese in un solo passaggio sulle colonne numeriche
+    sums = detail_df[list(tot_cols)].sum()
     month_row = pd.DataFrame([{
         "AGENZIA": agenzia_val if "AGENZIA" in detail_df.columns else "",
         "TOUR OPERATOR": tour_operator_val if "TOUR OPERATOR" in detail_df.columns else "",
         "PERIODO": "MESE",
-        "TOT_TURNO_EUR": float(detail_df["TURNO_EUR"].sum()),
-        "TOT_EXTRA_MIN": int(detail_df["EXTRA_MIN"].sum()),
-        "TOT_EXTRA_H:MM": sum_hmm(int(detail_df["EXTRA_MIN"].sum())),
-        "TOT_EXTRA_EUR": float(detail_df["EXTRA_EUR"].sum()),
-        "TOT_NOTTE_MIN": int(detail_df["NOTTE_MIN"].sum()),
-        "TOT_NOTTE_EUR": float(detail_df["NOTTE_EUR"].sum()),
-        "TOT_TOTALE_EUR": float(detail_df["TOTALE_BLOCCO_EUR"].sum()),
+        "TOT_TURNO_EUR": float(sums["TURNO_EUR"]),
+        "TOT_EXTRA_MIN": int(sums["EXTRA_MIN"]),
+        "TOT_EXTRA_H:MM": sum_hmm(int(sums["EXTRA_MIN"])),
+        "TOT_EXTRA_EUR": float(sums["EXTRA_EUR"]),
+        "TOT_NOTTE_MIN": int(sums["NOTTE_MIN"]),
+        "TOT_NOTTE_EUR": float(sums["NOTTE_EUR"]),
+        "TOT_TOTALE_EUR": float(sums["TOTALE_BLOCCO_EUR"]),
     }])
     
     # Se AGENZIA/TOUR OPERATOR non sono nel month_row ma sono nelle colonne, aggiungili
@@ -1105,46 +1389,56 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
 # Helper functions for output sheets
 # -----------------------------
 
+@lru_cache(maxsize=4096)
+def _hmm_cached(minutes: int) -> str:
+    """Minuti interi -> "H:MM" (le durate si ripetono molto: 180, 0, 30, ...)"""
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
 def format_minutes_to_hmm(minutes):
     """Convert minutes to H:MM format"""
     if pd.isna(minutes) or minutes == 0:
         return "0:00"
-    h = int(minutes // 60)
-    m = int(minutes % 60)
-    return f"{h}:{m:02d}"
+    return _hmm_cached(int(minutes))
 
 
-def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
-    """Create detailed sheet for an airport with totals per row"""
+def create_apt_detail_sheet(df_apt: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """
+    Create detailed sheet for an airport with totals per row.
+    Ritorna (righe, riga TOTALE come dict): la riga totale si scrive sotto le righe, senza concat.
+    df_apt deve essere già ordinato per DATA (write_output_excel ordina una volta per APT, DATA):
+    non viene né riordinato né copiato.
+    """
     if df_apt.empty:
-        return pd.DataFrame()
-    
-    # Sort by date
-    df_apt = df_apt.sort_values('DATA').copy()
+        return pd.DataFrame(), {}
     
     # Format columns
-    df_apt['DURATA_H:MM'] = df_apt['DURATA_TURNO_MIN'].apply(format_minutes_to_hmm)
-    df_apt['EXTRA_H:MM'] = df_apt['EXTRA_MIN'].apply(format_minutes_to_hmm)
-    df_apt['NOTTE_H:MM'] = df_apt['NOTTE_MIN'].apply(format_minutes_to_hmm)
+    durata_hmm = df_apt['DURATA_TURNO_MIN'].apply(format_minutes_to_hmm)
+    extra_hmm = df_apt['EXTRA_MIN'].apply(format_minutes_to_hmm)
+    notte_hmm = df_apt['NOTTE_MIN'].apply(format_minutes_to_hmm)
     
+    # Colonne testo: un solo fillna su tutte (le mancanti diventano '' tramite reindex)
+    text = df_apt.reindex(columns=['AGENZIA', 'TOUR OPERATOR', 'SERVIZI', 'ARRIVI/TRF',
+                                   'VOLO', 'DEST.NE', 'ASSISTENTE']).fillna('')
+
     # Create output DataFrame
     output_cols = {
         'Data': df_apt['DATA'],
-        'Agenzia': df_apt['AGENZIA'].fillna('') if 'AGENZIA' in df_apt.columns else pd.Series([''] * len(df_apt)),
-        'Tour Operator': df_apt['TOUR OPERATOR'].fillna('') if 'TOUR OPERATOR' in df_apt.columns else pd.Series([''] * len(df_apt)),
-        'Servizi': df_apt['SERVIZI'].fillna('') if 'SERVIZI' in df_apt.columns else pd.Series([''] * len(df_apt)),
-        'Arrivi/TRF': df_apt['ARRIVI/TRF'].fillna('') if 'ARRIVI/TRF' in df_apt.columns else pd.Series([''] * len(df_apt)),
+        'Agenzia': text['AGENZIA'],
+        'Tour Operator': text['TOUR OPERATOR'],
+        'Servizi': text['SERVIZI'],
+        'Arrivi/TRF': text['ARRIVI/TRF'],
         'Turno': df_apt['TURNO_NORMALIZZATO'],
-        'Volo': df_apt['VOLO'].fillna('') if 'VOLO' in df_apt.columns else pd.Series([''] * len(df_apt)),
+        'Volo': text['VOLO'],
         'ATD': df_apt.get('ATD', pd.Series([''] * len(df_apt))),
-        'Dest.ne': df_apt['DEST.NE'].fillna('') if 'DEST.NE' in df_apt.columns else pd.Series([''] * len(df_apt)),
-        'Durata': df_apt['DURATA_H:MM'],
-        'Turno (€)': df_apt['TURNO_EUR'].round(2),
-        'Extra (h:mm)': df_apt['EXTRA_H:MM'],
-        'Extra (€)': df_apt['EXTRA_EUR'].round(2),
-        'Notturno (h:mm)': df_apt['NOTTE_H:MM'],
-        'Notturno (€)': df_apt['NOTTE_EUR'].round(2),
-        'TOTALE (€)': df_apt['TOTALE_BLOCCO_EUR'].round(2),
+        'Dest.ne': text['DEST.NE'],
+        'Durata': durata_hmm,
+        'Turno (€)': df_apt['TURNO_EUR'],
+        'Extra (h:mm)': extra_hmm,
+        'Extra (€)': df_apt['EXTRA_EUR'],
+        'Notturno (h:mm)': notte_hmm,
+        'Notturno (€)': df_apt['NOTTE_EUR'],
+        'TOTALE (€)': df_apt['TOTALE_BLOCCO_EUR'],
     }
     
     # Add Assistente column if present (insert after Servizi)
@@ -1154,7 +1448,7 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
         new_cols['Tour Operator'] = output_cols['Tour Operator']
         new_cols['Servizi'] = output_cols['Servizi']
         new_cols['Arrivi/TRF'] = output_cols['Arrivi/TRF']
-        new_cols['Assistente'] = df_apt['ASSISTENTE'].fillna('')
+        new_cols['Assistente'] = text['ASSISTENTE']
         for k, v in output_cols.items():
             if k not in ['Data', 'Agenzia', 'Tour Operator', 'Servizi', 'Arrivi/TRF']:
                 new_cols[k] = v
@@ -1162,7 +1456,8 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
     
     result_df = pd.DataFrame(output_cols)
     
-    # Add total row
+    # Add total row (somme in un solo passaggio)
+    sums = df_apt[['TURNO_EUR', 'EXTRA_MIN', 'EXTRA_EUR', 'NOTTE_MIN', 'NOTTE_EUR', 'TOTALE_BLOCCO_EUR']].sum()
     total_row_dict = {
         'Data': 'TOTALE',
         'Agenzia': '',
@@ -1174,12 +1469,12 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
         'ATD': df_apt.get('ATD', pd.Series([''] * len(df_apt))),
         'Dest.ne': '',
         'Durata': '',
-        'Turno (€)': df_apt['TURNO_EUR'].sum(),
-        'Extra (h:mm)': format_minutes_to_hmm(df_apt['EXTRA_MIN'].sum()),
-        'Extra (€)': df_apt['EXTRA_EUR'].sum(),
-        'Notturno (h:mm)': format_minutes_to_hmm(df_apt['NOTTE_MIN'].sum()),
-        'Notturno (€)': df_apt['NOTTE_EUR'].sum(),
-        'TOTALE (€)': df_apt['TOTALE_BLOCCO_EUR'].sum(),
+        'Turno (€)': sums['TURNO_EUR'],
+        'Extra (h:mm)': format_minutes_to_hmm(sums['EXTRA_MIN']),
+        'Extra (€)': sums['EXTRA_EUR'],
+        'Notturno (h:mm)': format_minutes_to_hmm(sums['NOTTE_MIN']),
+        'Notturno (€)': sums['NOTTE_EUR'],
+        'TOTALE (€)': sums['TOTALE_BLOCCO_EUR'],
     }
     
     # Add empty Assistente in total row if column exists
@@ -1195,15 +1490,16 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
                 new_total_dict[k] = v
         total_row_dict = new_total_dict
     
-    total_row = pd.DataFrame([total_row_dict])
-    result_df = pd.concat([result_df, total_row], ignore_index=True)
-    return result_df
+    return result_df, total_row_dict
 
 
-def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
-    """Create total sheet grouped by airport, agenzia and tour operator"""
+def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """
+    Create total sheet grouped by airport, agenzia and tour operator.
+    Ritorna (righe, riga TOTALE come dict), come create_apt_detail_sheet.
+    """
     if detail_df.empty:
-        return pd.DataFrame(columns=['Agenzia', 'Tour Operator', 'Aeroporto', 'Blocchi', 'Assistenze', 'Extra', 'Notturno', 'TOTALE'])
+        return pd.DataFrame(columns=['Agenzia', 'Tour Operator', 'Aeroporto', 'Blocchi', 'Assistenze', 'Extra', 'Notturno', 'TOTALE']), {}
     
     # Group by AGENZIA, TOUR OPERATOR, and APT
     groupby_cols = ['APT']
@@ -1212,16 +1508,16 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
     if 'TOUR OPERATOR' in detail_df.columns:
         groupby_cols = groupby_cols[:1] + ['TOUR OPERATOR'] + groupby_cols[1:] if 'AGENZIA' in detail_df.columns else ['TOUR OPERATOR'] + groupby_cols
     
-    totals_by_apt = detail_df.groupby(groupby_cols).agg({
-        'TURNO_EUR': 'sum',
-        'EXTRA_EUR': 'sum',
-        'EXTRA_MIN': 'sum',
-        'NOTTE_EUR': 'sum',
-        'NOTTE_MIN': 'sum',
-        'TOTALE_BLOCCO_EUR': 'sum'
-    }).round(2)
-    
-    block_counts = detail_df.groupby(groupby_cols).size()
+    # Somme e conteggio blocchi in un solo agg (chiavi fattorizzate una volta)
+    totals_by_apt = detail_df.groupby(category_keys(detail_df, groupby_cols), observed=True).agg(
+        Blocchi=('APT', 'size'),
+        TURNO_EUR=('TURNO_EUR', 'sum'),
+        EXTRA_EUR=('EXTRA_EUR', 'sum'),
+        EXTRA_MIN=('EXTRA_MIN', 'sum'),
+        NOTTE_EUR=('NOTTE_EUR', 'sum'),
+        NOTTE_MIN=('NOTTE_MIN', 'sum'),
+        TOTALE_BLOCCO_EUR=('TOTALE_BLOCCO_EUR', 'sum'),
+    ).round(2)
     
     # Format function
     def format_eur(value):
@@ -1272,7 +1568,7 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         'Agenzia': agenzie,
         'Tour Operator': tour_operators,
         'Aeroporto': aeroporti,
-        'Blocchi': block_counts.values,
+        'Blocchi': totals_by_apt['Blocchi'].values,
         'Assistenze': totals_by_apt['TURNO_EUR'].values,
         'Extra_min': totals_by_apt['EXTRA_MIN'].values,
         'Extra_eur': totals_by_apt['EXTRA_EUR'].values,
@@ -1281,37 +1577,99 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         'TOTALE': totals_by_apt['TOTALE_BLOCCO_EUR'].values,
     })
     
+    def eur_texts(values: pd.Series) -> List[str]:
+        return [format_eur(v) for v in values.tolist()]
+    
+    def eur_min_texts(eur: pd.Series, minutes: pd.Series) -> List[str]:
+        """"<€> (X ore e Y minuti)" per colonna: ore/minuti con un solo divmod numpy"""
+        hours, mins = np.divmod(minutes.to_numpy().astype(np.int64), 60)
+        texts = []
+        for e, h, m in zip(eur_texts(eur), hours.tolist(), mins.tolist()):
+            if h == 0 and m == 0:
+                hm = "0 ore e 0 minuti"
+            elif h == 0:
+                hm = f"{m} minuti"
+            elif m == 0:
+                hm = f"{h} ore"
+            else:
+                hm = f"{h} ore e {m} minuti"
+            texts.append(f"{e} ({hm})")
+        return texts
+    
     # Format columns
     output_df = pd.DataFrame({
         'Agenzia': result['Agenzia'],
         'Tour Operator': result['Tour Operator'],
         'Aeroporto': result['Aeroporto'],
         'Blocchi': result['Blocchi'],
-        'Assistenze': result['Assistenze'].apply(format_eur),
-        'Extra': result.apply(lambda x: f"{format_eur(x['Extra_eur'])} ({min_to_hours_minutes_text(x['Extra_min'])})", axis=1),
-        'Notturno': result.apply(lambda x: f"{format_eur(x['Notturno_eur'])} ({min_to_hours_minutes_text(x['Notturno_min'])})", axis=1),
-        'TOTALE': result['TOTALE'].apply(format_eur),
+        'Assistenze': eur_texts(result['Assistenze']),
+        'Extra': eur_min_texts(result['Extra_eur'], result['Extra_min']),
+        'Notturno': eur_min_texts(result['Notturno_eur'], result['Notturno_min']),
+        'TOTALE': eur_texts(result['TOTALE']),
     })
     
     # Order by agenzia, tour operator, then airport
-    order = ['VRN', 'BGY', 'NAP', 'VCE']
-    output_df['sort_order'] = output_df['Aeroporto'].apply(lambda x: order.index(x) if x in order else 999)
+    output_df['sort_order'] = output_df['Aeroporto'].map(_APT_ORDER).fillna(999).astype('int16')
     output_df = output_df.sort_values(['Agenzia', 'Tour Operator', 'sort_order']).drop('sort_order', axis=1)
     
-    # Add total row
-    total_row = pd.DataFrame([{
+    # Add total row (somme in un solo passaggio)
+    sums = result[['Assistenze', 'Extra_min', 'Extra_eur', 'Notturno_min', 'Notturno_eur', 'TOTALE']].sum()
+    total_row_dict = {
         'Agenzia': '',
         'Tour Operator': '',
         'Aeroporto': 'TOTALE',
         'Blocchi': output_df['Blocchi'].sum(),
-        'Assistenze': format_eur(result['Assistenze'].sum()),
-        'Extra': f"{format_eur(result['Extra_eur'].sum())} ({min_to_hours_minutes_text(result['Extra_min'].sum())})",
-        'Notturno': f"{format_eur(result['Notturno_eur'].sum())} ({min_to_hours_minutes_text(result['Notturno_min'].sum())})",
-        'TOTALE': format_eur(result['TOTALE'].sum()),
-    }])
+        'Assistenze': format_eur(sums['Assistenze']),
+        'Extra': f"{format_eur(sums['Extra_eur'])} ({min_to_hours_minutes_text(sums['Extra_min'])})",
+        'Notturno': f"{format_eur(sums['Notturno_eur'])} ({min_to_hours_minutes_text(sums['Notturno_min'])})",
+        'TOTALE': format_eur(sums['TOTALE']),
+    }
     
-    output_df = pd.concat([output_df, total_row], ignore_index=True)
-    return output_df
+    return output_df.reset_index(drop=True), total_row_dict
+
+
+def write_sheet_with_total(writer: pd.ExcelWriter, sheet_name: str, body_df: pd.DataFrame, total_row: Dict[str, object]) -> None:
+    """Scrive le righe e, subito sotto, la riga TOTALE (stesso risultato di concat + to_excel)"""
+    if body_df.empty and not total_row:
+        return
+    body_df.to_excel(writer, sheet_name=sheet_name, index=False)
+    if total_row:
+        pd.DataFrame([total_row], columns=body_df.columns).to_excel(
+            writer, sheet_name=sheet_name, index=False, header=False, startrow=len(body_df) + 1
+        )
+
+
+def append_df_to_sheet(writer: pd.ExcelWriter, sheet_name: str, df: pd.DataFrame) -> None:
+    """
+    Scrive df su un nuovo foglio con ws.append riga per riga (come to_excel(index=False),
+    ma senza gli oggetti cella/stile intermedi di pandas). Header in grassetto con bordo,
+    celle datetime con il formato del writer; NaN/NaT -> "" come to_excel.
+    """
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    ws = writer.book.create_sheet(sheet_name)
+    ws.append([str(c) for c in df.columns])
+    thin = Side(style="thin")
+    header_font = Font(bold=True)
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_align = Alignment(horizontal="center", vertical="top")
+    for cell in ws[1]:
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_align
+
+    values = df.astype(object).where(df.notna(), "")  # na_rep di to_excel
+    for row in values.itertuples(index=False, name=None):
+        ws.append(row)
+
+    # Formato data/ora solo sulle colonne che contengono datetime
+    for j, col in enumerate(df.columns, start=1):
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or (
+            df[col].dtype == object and df[col].map(lambda v: isinstance(v, datetime)).any()
+        ):
+            for (cell,) in ws.iter_rows(min_row=2, min_col=j, max_col=j):
+                if isinstance(cell.value, datetime):
+                    cell.number_format = writer.datetime_format
 
 
 def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.DataFrame, discr_df: pd.DataFrame) -> None:
@@ -1319,27 +1677,18 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
     with pd.ExcelWriter(output_path, engine="openpyxl", datetime_format="YYYY-MM-DD HH:MM") as writer:
         # Order columns for readability
         if not detail_df.empty:
-            cols = [
-                "DATA", "APT", "AGENZIA", "TOUR OPERATOR", "SERVIZI", "ARRIVI/TRF", "ASSISTENTE", "VOLO", "DEST.NE", "TURNO_FFILL", "TURNO_NORMALIZZATO",
-                "INIZIO_DT", "FINE_DT", "DURATA_TURNO_MIN", "NO_DEC",
-                "ATD", "ATD_SCELTO", "STD_SCELTO",
-                "TURNO_EUR",
-                "EXTRA_MIN", "EXTRA_EUR",
-                "NOTTE_MIN", "NOTTE_EUR",
-                "FESTIVO", "TOTALE_BLOCCO_EUR",
-                "ERRORE",
-                "SRC_FILE", "SRC_SHEET", "SRC_ROW0",
-            ]
-            cols = [c for c in cols if c in detail_df.columns]
+            # intersection sul lato della costante: mantiene l'ordine di DETAIL_COLS_ORDER
+            cols = DETAIL_COLS_ORDER.intersection(detail_df.columns, sort=False)
             # Formatta colonne minuti in HH:MM per DettaglioBlocchi
             def min_to_hmm(m):
                 if pd.isna(m): return ""
-                return f"{int(m)//60}:{int(m)%60:02d}"
+                return _hmm_cached(int(m))
             write_df = detail_df[cols].copy()
             for col in ["DURATA_TURNO_MIN", "EXTRA_MIN_RAW", "EXTRA_MIN", "NOTTE_MIN_RAW", "NOTTE_MIN"]:
                 if col in write_df.columns:
                     write_df[col] = write_df[col].apply(min_to_hmm)
-            write_df.to_excel(writer, sheet_name="DettaglioBlocchi", index=False)
+            # Foglio più grande: righe appese direttamente al worksheet openpyxl
+            append_df_to_sheet(writer, "DettaglioBlocchi", write_df)
         else:
             pd.DataFrame().to_excel(writer, sheet_name="DettaglioBlocchi", index=False)
 
@@ -1360,18 +1709,20 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
         
         # Create sheets for each airport
         if not detail_df.empty:
-            apts = sorted(detail_df['APT'].unique())
-            for apt in apts:
-                df_apt = detail_df[detail_df['APT'] == apt].copy()
-                apt_sheet = create_apt_detail_sheet(df_apt)
-                if not apt_sheet.empty:
-                    apt_sheet.to_excel(writer, sheet_name=apt, index=False)
+            # Una sola partizione per aeroporto (fogli in ordine alfabetico di APT).
+            # Preparazione dei fogli in parallelo; scrittura sequenziale (openpyxl non è thread-safe)
+            # Un solo ordinamento stabile (APT, DATA): ogni gruppo arriva già ordinato per data
+            by_apt_date = detail_df.sort_values(['APT', 'DATA'], kind='stable')
+            groups = list(by_apt_date.groupby('APT', sort=True))
+            with ThreadPoolExecutor(max_workers=max(1, min(len(groups), 8))) as pool:
+                apt_sheets = list(pool.map(lambda g: create_apt_detail_sheet(g[1]), groups))
+            for (apt, _), (apt_body, apt_total) in zip(groups, apt_sheets):
+                write_sheet_with_total(writer, apt, apt_body, apt_total)
         
         # Create TOTALE sheet
         if not detail_df.empty:
-            total_sheet = create_total_by_apt_sheet(detail_df)
-            if not total_sheet.empty:
-                total_sheet.to_excel(writer, sheet_name="TOTALE", index=False)
+            total_body, total_row = create_total_by_apt_sheet(detail_df)
+            write_sheet_with_total(writer, "TOTALE", total_body, total_row)
 
         # Create Collaboratori sheet
         try:
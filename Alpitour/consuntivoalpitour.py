@@ -24,73 +24,106 @@ Cosa fa:
 
 Requisiti:
   pip install pandas openpyxl python-dateutil
+  (opzionale) pip install numba  # minuti notturni/extra compilati
+  (opzionale) pip install xlsxwriter  # scrittura Excel più veloce
 
 Esempi:
   python consuntivoalpitour.py -o "OUT_ALPITOUR.xlsx" --apt VRN
   python consuntivoalpitour.py -o "OUT_ALPITOUR.xlsx" --apt BGY VRN
+  python consuntivoalpitour.py -o "OUT_ALPITOUR.xlsx" --fast  # xlsx scritto direttamente in XML
 """
 
 from __future__ import annotations
 
 import argparse
+import math
 import re
+import zipfile
 from dataclasses import dataclass, field
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
+from functools import lru_cache
+from operator import attrgetter
 from typing import Dict, List, Optional, Tuple, Iterable
+from xml.sax.saxutils import escape
 
 import numpy as np
 import pandas as pd
+from openpyxl.utils import get_column_letter
 
 try:
-    from dateutil.easter import easter
+    from numba import njit, prange
 except ImportError:
-    # Calcolo manuale di Pasqua usando l'algoritmo di Meeus/Jones/Butcher (Gregoriano)
-    def easter(year: int) -> date:
+    # numba opzionale: senza, i calcoli sui minuti restano in Python puro
+    njit = None
+
+try:
+    import xlsxwriter  # noqa: F401
+    _EXCEL_ENGINE = "xlsxwriter"
+except ImportError:
+    # xlsxwriter opzionale: senza, l'output passa da openpyxl
+    _EXCEL_ENGINE = "openpyxl"
+
+try:
+    from dateutil.easter import easter as _easter
+except ImportError:
+    # Calcolo manuale di Pasqua (Gregoriano), forma compatta: 28 marzo + scostamento
+    def _easter(year: int) -> date:
         """Calcola la data di Pasqua per un dato anno (algoritmo Gregoriano)"""
-        a = year % 19
-        b = year // 100
-        c = year % 100
-        d = b // 4
-        e = b % 4
-        f = (b + 8) // 25
-        g = (b - f + 1) // 3
-        h = (19 * a + b - d - g + 15) % 30
-        i = c // 4
-        k = c % 4
-        l = (32 + 2 * e + 2 * i - h - k) % 7
-        m = (a + 11 * h + 22 * l) // 451
-        month = (h + l - 7 * m + 114) // 31
-        day = ((h + l - 7 * m + 114) % 31) + 1
-        return date(year, month, day)
+        century = year // 100
+        n = year % 19
+        h = (century - century // 4 - (8 * century + 13) // 25 + 19 * n + 15) % 30
+        i = h - h // 28 * (1 - h // 28 * (29 // (h + 1)) * ((21 - n) // 11))
+        j = (year + year // 4 + i + 2 - century + century // 4) % 7
+        return date(year, 3, 28) + timedelta(days=i - j)
+
+
+@lru_cache(maxsize=256)
+def easter(year: int) -> date:
+    """Pasqua per anno, calcolata una sola volta per anno"""
+    return _easter(year)
 
 
 # -----------------------------
 # Config
 # -----------------------------
 
+# Tariffe turno Alpitour 2025 per durata intera (ore 3..8); riga 0 = BGY (default), riga 1 = VRN
+TURNO_ORE = np.arange(3, 9)
+_TURNO_RATES = np.array([
+    [75.0, 90.0, 105.0, 120.0, 135.0, 150.0],
+    [80.0, 95.0, 110.0, 125.0, 140.0, 155.0],
+])
+_TURNO_RATES_ROW = {"BGY": 0, "VRN": 1}
+
+
+_ROUNDING_MODES = {"NONE": 0, "FLOOR": 1, "CEIL": 2, "NEAREST": 3}
+
+
 @dataclass
 class RoundingPolicy:
     mode: str  # NONE | FLOOR | CEIL | NEAREST
     step_min: int
+    # Modo e passo normalizzati una volta sola (modo sconosciuto = NONE)
+    _mode_i: int = field(init=False, repr=False, compare=False)
+    _step: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._mode_i = _ROUNDING_MODES.get(self.mode.upper(), 0)
+        self._step = int(self.step_min)
 
     def apply(self, minutes: int) -> int:
         if minutes is None:
             return None
-        if self.mode.upper() == "NONE":
-            return int(minutes)
-        step = int(self.step_min)
-        if step <= 0:
+        step = self._step
+        if self._mode_i == 0 or step <= 0:
             return int(minutes)
 
         x = float(minutes) / step
-        m = self.mode.upper()
-        if m == "FLOOR":
-            return int(np.floor(x) * step)
-        if m == "CEIL":
-            return int(np.ceil(x) * step)
-        if m == "NEAREST":
-            return int(np.round(x) * step)
-        return int(minutes)
+        if self._mode_i == 1:
+            return math.floor(x) * step
+        if self._mode_i == 2:
+            return math.ceil(x) * step
+        return round(x) * step  # NEAREST: half-to-even come np.round
 
 
 @dataclass
@@ -112,14 +145,9 @@ class CalcConfig:
         BGY: 3h=75, 4h=90, 5h=105, 6h=120, 7h=135, 8h=150
         VRN: 3h=80, 4h=95, 5h=110, 6h=125, 7h=140, 8h=155
         """
-        apt_upper = apt.upper()
-        if apt_upper == "BGY":
-            return {3: 75.0, 4: 90.0, 5: 105.0, 6: 120.0, 7: 135.0, 8: 150.0}
-        elif apt_upper == "VRN":
-            return {3: 80.0, 4: 95.0, 5: 110.0, 6: 125.0, 7: 140.0, 8: 155.0}
-        else:
-            # Default a BGY se APT non riconosciuto
-            return {3: 75.0, 4: 90.0, 5: 105.0, 6: 120.0, 7: 135.0, 8: 150.0}
+        # Default a BGY se APT non riconosciuto
+        row = _TURNO_RATES[_TURNO_RATES_ROW.get(apt.upper(), 0)]
+        return dict(zip(TURNO_ORE.tolist(), row.tolist()))
 
 
 # -----------------------------
@@ -131,14 +159,32 @@ TIME_TOKEN = r"(?:(\d{1,2})(?:[:\.](\d{1,2}))?)"
 TIME_RANGE_RE = re.compile(rf"{TIME_TOKEN}\s*{TIME_SEP_PATTERN}\s*{TIME_TOKEN}", re.IGNORECASE)
 
 NO_DEC_RE = re.compile(r"\bno\s*dec\b", re.IGNORECASE)
+# Turno incompleto tipo "20:25-DEC" (solo orario di inizio)
+TIME_START_RE = re.compile(rf"{TIME_TOKEN}\s*{TIME_SEP_PATTERN}", re.IGNORECASE)
+
+# Pattern dei parser per cella, compilati una volta sola
+_WS_RE = re.compile(r"\s+")
+_TIME_HMS_RE = re.compile(r"^\s*(\d{1,2})\s*:\s*(\d{1,2})(?:\s*:\s*(\d{1,2}))?\s*$")
+_SINGLE_HOUR_RE = re.compile(r"^\s*(\d{1,2})\s*$")
+_SPLIT_TIMES_RE = re.compile(r'(\d{1,2}[:;]\d{1,2})[\.;](\d{1,2}[:;]\d{1,2})')
+_TOKEN_RE = re.compile(r"\b(\d{1,2})(?::(\d{1,2}))?\b")
+_HMS_MIN_RE = re.compile(r"^(\d{1,2}):(\d{2})(?::\d{2})?$")
+_INT_RE = re.compile(r"^\d+$")
+_NUM_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+# Sostituzioni di caratteri in un solo passaggio (str.translate)
+_HYPHEN_TABLE = str.maketrans({"–": "-", "—": "-", "−": "-"})
+_TIME_SEP_TABLE = str.maketrans({",": ":", ".": ":", ";": ":"})
+_TURNO_SEP_TABLE = str.maketrans({".": ":", ";": ":"})
+_EUR_NUM_TABLE = str.maketrans({".": None, ",": "."})  # formato italiano 1.234,56 -> 1234.56
 
 
 def normalize_spaces(s: str) -> str:
-    return re.sub(r"\s+", " ", s.strip())
+    return _WS_RE.sub(" ", s.strip())
 
 
 def normalize_hyphens(s: str) -> str:
-    return s.replace("–", "-").replace("—", "-").replace("−", "-")
+    return s.translate(_HYPHEN_TABLE)
 
 
 def parse_excel_date(x) -> Optional[pd.Timestamp]:
@@ -153,6 +199,23 @@ def parse_excel_date(x) -> Optional[pd.Timestamp]:
         return None
 
 
+def parse_excel_date_series(s: pd.Series) -> pd.Series:
+    """
+    Versione vettoriale di parse_excel_date su una colonna DATA (NaT dove non valida).
+    Colonna datetime64: normalize in blocco; altrimenti un parse per valore distinto
+    (le date si ripetono su molte righe), stessa semantica della versione scalare.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.dt.normalize()
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    # Celle già datetime (colonna mista): solo normalize, senza ripassare dal parser
+    parsed = pd.to_datetime([
+        pd.Timestamp(u).normalize() if isinstance(u, datetime) else parse_excel_date(u)
+        for u in uniques
+    ] + [None])  # ultimo = NaT per i mancanti
+    return pd.Series(parsed.values[codes], index=s.index)
+
+
 def parse_time_value(x) -> Optional[Tuple[int, int]]:
     """
     Convert possible Excel time representations into (hh, mm).
@@ -181,15 +244,18 @@ def parse_time_value(x) -> Optional[Tuple[int, int]]:
             mm = total_minutes % 60
             return (hh, mm)
 
-    s = str(x).strip()
+    return _parse_time_text(str(x).strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_time_text(s: str) -> Optional[Tuple[int, int]]:
+    """Ramo testuale di parse_time_value, memorizzato: ATD/STD ripetono pochi testi."""
     if not s:
         return None
 
-    s = s.replace(",", ":")
-    s = s.replace(".", ":")
-    s = s.replace(";", ":")  # Gestisce punto e virgola (es: "20;30" -> "20:30")
+    s = s.translate(_TIME_SEP_TABLE)  # ",", "." e ";" -> ":" (es: "20;30" -> "20:30")
     # hh:mm:ss
-    m = re.match(r"^\s*(\d{1,2})\s*:\s*(\d{1,2})(?:\s*:\s*(\d{1,2}))?\s*$", s)
+    m = _TIME_HMS_RE.match(s)
     if m:
         hh = int(m.group(1))
         mm = int(m.group(2))
@@ -197,7 +263,7 @@ def parse_time_value(x) -> Optional[Tuple[int, int]]:
             return (hh % 24, mm)
 
     # single hour "8" or "08"
-    m = re.match(r"^\s*(\d{1,2})\s*$", s)
+    m = _SINGLE_HOUR_RE.match(s)
     if m:
         hh = int(m.group(1))
         if 0 <= hh <= 47:
@@ -206,10 +272,22 @@ def parse_time_value(x) -> Optional[Tuple[int, int]]:
     return None
 
 
-def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str]:
+# "00".."99": ore/minuti a due cifre senza formattazione per ogni cella
+_DUE_CIFRE = tuple(f"{i:02d}" for i in range(100))
+
+
+def format_hhmm(hh: int, mm: int) -> str:
+    """"HH:MM" a due cifre (come f"{hh:02d}:{mm:02d}")."""
+    if 0 <= hh < 100 and 0 <= mm < 100:
+        return _DUE_CIFRE[hh] + ":" + _DUE_CIFRE[mm]
+    return f"{hh:02d}:{mm:02d}"
+
+
+def parse_turno(turno_raw: str) -> Tuple[Optional[int], Optional[int], bool, str]:
     """
     Returns:
-      start_str "HH:MM", end_str "HH:MM", no_dec flag, normalized turno string for grouping.
+      start_min, end_min (minuti dalla mezzanotte, interi), no_dec flag,
+      normalized turno string "HH:MM-HH:MM" for grouping.
     If no interpretable time range -> (None,None,no_dec,normalized_text)
     """
     s = "" if turno_raw is None else str(turno_raw)
@@ -222,31 +300,27 @@ def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str
     # Gestione punti e punti e virgola: possono essere separatori tra orari o dentro gli orari
     # Pattern tipo "13:30.17:00" o "13;15-16;15" dove punto/punto e virgola separano due orari
     # Convertiamo "HH:MM.HH:MM" o "HH;MM-HH;MM" in "HH:MM-HH:MM"
-    s2 = re.sub(r'(\d{1,2}[:;]\d{1,2})[\.;](\d{1,2}[:;]\d{1,2})', r'\1-\2', s2)
+    s2 = _SPLIT_TIMES_RE.sub(r'\1-\2', s2)
     # Poi convertiamo i punti e punti e virgola rimasti in due punti (per gli orari tipo "8.30" -> "8:30" o "13;15" -> "13:15")
-    s2 = s2.replace(".", ":")
-    s2 = s2.replace(";", ":")
+    s2 = s2.translate(_TURNO_SEP_TABLE)
 
     # Keep original prefixes (A/B/C etc.) for grouping, BUT normalize time range inside
     m = TIME_RANGE_RE.search(s2)
     if not m:
         # Tentativo di gestire turni incompleti tipo "20:25-DEC" (manca orario fine)
         # Assumiamo che finisca a mezzanotte (00:00 del giorno successivo)
-        single_time_pattern = re.compile(rf"{TIME_TOKEN}\s*{TIME_SEP_PATTERN}", re.IGNORECASE)
-        m_single = single_time_pattern.search(s2)
+        m_single = TIME_START_RE.search(s2)
         if m_single:
             h1, m1 = m_single.group(1), m_single.group(2)
             h1 = int(h1)
             m1 = int(m1) if m1 is not None else 0
-            start = f"{h1:02d}:{m1:02d}"
-            end = "00:00"  # Mezzanotte del giorno successivo
-            # Normalizza il turno
-            norm_range = f"{start}-{end}"
+            # Fine a mezzanotte del giorno successivo; normalizza il turno
+            norm_range = format_hhmm(h1, m1) + "-00:00"
             s_norm = s2[:m_single.start()] + norm_range + s2[m_single.end():]
             s_norm = normalize_spaces(s_norm)
             if no_dec:
                 s_norm = NO_DEC_RE.sub("NO DEC", s_norm)
-            return (start, end, no_dec, s_norm)
+            return (h1 * 60 + m1, 0, no_dec, s_norm)
         return (None, None, no_dec, s2)
 
     h1, m1, h2, m2 = m.group(1), m.group(2), m.group(3), m.group(4)
@@ -255,11 +329,8 @@ def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str
     h2 = int(h2)
     m2 = int(m2) if m2 is not None else 0
 
-    start = f"{h1:02d}:{m1:02d}"
-    end = f"{h2:02d}:{m2:02d}"
-
     # Replace the found range with normalized "HH:MM-HH:MM" (single hyphen)
-    norm_range = f"{start}-{end}"
+    norm_range = format_hhmm(h1, m1) + "-" + format_hhmm(h2, m2)
     s_norm = s2[:m.start()] + norm_range + s2[m.end():]
     s_norm = normalize_spaces(s_norm)
 
@@ -267,12 +338,48 @@ def parse_turno(turno_raw: str) -> Tuple[Optional[str], Optional[str], bool, str
     if no_dec:
         s_norm = NO_DEC_RE.sub("NO DEC", s_norm)
 
-    return (start, end, no_dec, s_norm)
+    return (h1 * 60 + m1, h2 * 60 + m2, no_dec, s_norm)
+
+
+def to_dt(d: pd.Timestamp, minutes: int) -> pd.Timestamp:
+    """Data + orario espresso in minuti dalla mezzanotte."""
+    return d + pd.Timedelta(minutes=minutes)
 
 
-def to_dt(d: pd.Timestamp, hhmm: str) -> pd.Timestamp:
-    hh, mm = map(int, hhmm.split(":"))
-    return d + pd.Timedelta(hours=hh, minutes=mm)
+_NS_PER_MIN = 60 * 1_000_000_000
+_NS_PER_DAY = 24 * 60 * _NS_PER_MIN
+_NIGHT_START_NS = 23 * 60 * _NS_PER_MIN    # 23:00
+_NIGHT_LEN_NS = 7 * 60 * _NS_PER_MIN       # fino alle 06:00 del giorno dopo
+
+
+def _night_minutes_ns(s: int, e: int) -> int:
+    """night_minutes su istanti interi in nanosecondi (Timestamp.value), senza oggetti Timedelta."""
+    if e <= s:
+        return 0
+
+    total = 0
+    day0 = s - s % _NS_PER_DAY  # mezzanotte del giorno di inizio
+    for k in (-1, 0, 1):  # prev, same, next
+        n_start = day0 + k * _NS_PER_DAY + _NIGHT_START_NS
+        n_end = n_start + _NIGHT_LEN_NS
+        overlap = min(e, n_end) - max(s, n_start)
+        if overlap > 0:
+            total += overlap // _NS_PER_MIN
+    return total
+
+
+def _extra_min_ns(atd_ns: int, end_ns: int, window_ns: int) -> int:
+    """Minuti della copertura [ATD, ATD + finestra] oltre la fine turno (istanti in ns)."""
+    fine_copertura = atd_ns + window_ns
+    if fine_copertura <= end_ns:
+        return 0
+    return (fine_copertura - end_ns) // _NS_PER_MIN
+
+
+if njit is not None:
+    # Kernel scalari su interi puri, chiamati una volta per blocco
+    _night_minutes_ns = njit(cache=True)(_night_minutes_ns)
+    _extra_min_ns = njit(cache=True)(_extra_min_ns)
 
 
 def night_minutes(interval_start: pd.Timestamp, interval_end: pd.Timestamp) -> int:
@@ -280,19 +387,20 @@ def night_minutes(interval_start: pd.Timestamp, interval_end: pd.Timestamp) -> i
     Minutes overlapping [23:00, 06:00) across relevant nights (Alpitour 2025).
     Including previous night window as needed.
     """
-    if interval_end <= interval_start:
-        return 0
-
-    total = 0
-    base = interval_start.normalize() - pd.Timedelta(days=1)
-    for k in range(0, 3):  # prev, same, next
-        day = base + pd.Timedelta(days=k)
-        n_start = day + pd.Timedelta(hours=23)
-        n_end = day + pd.Timedelta(days=1, hours=6)  # Alpitour: fino alle 06:00
-        s = max(interval_start, n_start)
-        e = min(interval_end, n_end)
-        if e > s:
-            total += int((e - s).total_seconds() // 60)
+    return int(_night_minutes_ns(interval_start.value, interval_end.value))
+
+
+def night_minutes_vec(starts_ns: np.ndarray, ends_ns: np.ndarray) -> np.ndarray:
+    """Versione vettoriale di _night_minutes_ns su array int64 di istanti in ns."""
+    s = np.asarray(starts_ns, dtype=np.int64)
+    e = np.asarray(ends_ns, dtype=np.int64)
+    day0 = s - s % _NS_PER_DAY
+    total = np.zeros(len(s), dtype=np.int64)
+    for k in (-1, 0, 1):  # prev, same, next
+        n_start = day0 + k * _NS_PER_DAY + _NIGHT_START_NS
+        overlap = np.minimum(e, n_start + _NIGHT_LEN_NS) - np.maximum(s, n_start)
+        # Intervalli vuoti (e <= s) hanno sovrapposizione <= 0 su ogni finestra
+        total += np.where(overlap > 0, overlap // _NS_PER_MIN, 0)
     return total
 
 
@@ -312,16 +420,21 @@ def parse_minutes_from_cell(x) -> Optional[int]:
             return int(x)
         return None
 
-    s = str(x).strip()
+    return _parse_minutes_text(str(x).strip())
+
+
+@lru_cache(maxsize=8192)
+def _parse_minutes_text(s: str) -> Optional[int]:
+    """Ramo testuale di parse_minutes_from_cell, memorizzato: EXTRA/NOTTURNO ripetono pochi testi."""
     if not s:
         return None
     s = s.replace(".", ":")
     # hh:mm:ss
-    m = re.match(r"^(\d{1,2}):(\d{2})(?::\d{2})?$", s)
+    m = _HMS_MIN_RE.match(s)
     if m:
         return int(m.group(1)) * 60 + int(m.group(2))
     # minutes integer
-    if re.match(r"^\d+$", s):
+    if _INT_RE.match(s):
         return int(s)
     return None
 
@@ -331,13 +444,18 @@ def parse_eur(x) -> Optional[float]:
         return None
     if isinstance(x, (int, float, np.floating)) and not isinstance(x, bool):
         return float(x)
-    s = str(x).strip()
+    return _parse_eur_text(str(x).strip())
+
+
+@lru_cache(maxsize=8192)
+def _parse_eur_text(s: str) -> Optional[float]:
+    """Ramo testuale di parse_eur, memorizzato: gli importi forniti si ripetono lungo il foglio."""
     if not s:
         return None
     s = s.replace("€", "").replace("EUR", "").strip()
     # Italian number formatting: 1.234,56
-    s = s.replace(".", "").replace(",", ".")
-    m = re.findall(r"[-+]?\d*\.?\d+", s)
+    s = s.translate(_EUR_NUM_TABLE)
+    m = _NUM_RE.findall(s)
     if not m:
         return None
     try:
@@ -346,11 +464,42 @@ def parse_eur(x) -> Optional[float]:
         return None
 
 
+def str_contains_mask(s: pd.Series, pat: str, regex: bool) -> np.ndarray:
+    """
+    str(x) contiene pat (case-insensitive) -> array bool.
+    Il test gira solo sui valori distinti della colonna (TOUR OPERATOR/APT ne hanno pochi).
+    """
+    codes, uniques = pd.factorize(s.astype(str))
+    hits = pd.Series(uniques, dtype=object).str.contains(pat, case=False, regex=regex, na=False)
+    return hits.to_numpy(dtype=bool)[codes]
+
+
+@lru_cache(maxsize=32)
+def apt_filter_regex(apts: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Codici APT a parola intera (case-insensitive), regex compilata una volta per lista di aeroporti."""
+    return re.compile(r"\b(?:" + "|".join(re.escape(a) for a in apts) + r")\b", re.IGNORECASE)
+
+
+def regex_search_mask(s: pd.Series, rx: "re.Pattern[str]") -> np.ndarray:
+    """rx.search(str(x)) -> array bool, valutata solo sui valori distinti della colonna."""
+    codes, uniques = pd.factorize(s.astype(str))
+    hits = np.fromiter((rx.search(u) is not None for u in uniques), dtype=bool, count=len(uniques))
+    return hits[codes]
+
+
+_FESTIVO_TRUE = frozenset(("1", "true", "t", "si", "sì", "yes", "y", "x"))
+
+
 def is_truthy_festivo(x) -> bool:
     if x is None or pd.isna(x):
         return False
     s = str(x).strip().lower()
-    return s in ("1", "true", "t", "si", "sì", "yes", "y", "x")
+    return s in _FESTIVO_TRUE
+
+
+def festivo_mask(s: pd.Series) -> pd.Series:
+    """is_truthy_festivo su tutta la colonna FESTIVO (bool, stesso indice)."""
+    return s.notna() & s.astype(str).str.strip().str.lower().isin(_FESTIVO_TRUE)
 
 
 # -----------------------------
@@ -408,7 +557,7 @@ def detect_columns(df: pd.DataFrame) -> Dict[str, Optional[str]]:
 # Core computation
 # -----------------------------
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SourceRowRef:
     file: str
     sheet: str
@@ -416,7 +565,7 @@ class SourceRowRef:
     original_order: int
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockAgg:
     date: pd.Timestamp
     apt: str
@@ -443,80 +592,96 @@ class BlockAgg:
     nota: Optional[str] = None    # Testo dalla colonna NOTE del file sorgente
 
 
-def validate_row_data(row: pd.Series, cols: Dict[str, Optional[str]], cfg: CalcConfig) -> Optional[str]:
+def _col_or_none(df: pd.DataFrame, c: Optional[str]):
+    """Valori della colonna c (iterabili per riga) oppure None per ogni riga se c manca."""
+    return df[c] if c and c in df.columns else [None] * len(df)
+
+
+def _map_distinct(s: pd.Series, fn) -> List:
+    """Applica fn una sola volta per valore distinto della colonna (chiave: tipo + testo)."""
+    cache: Dict[Tuple[type, str], object] = {}
+    out: List = []
+    for v in s.to_numpy(dtype=object):
+        key = (type(v), str(v))
+        if key not in cache:
+            cache[key] = fn(v)
+        out.append(cache[key])
+    return out
+
+
+def validate_rows(sdf: pd.DataFrame, cols: Dict[str, Optional[str]], cfg: CalcConfig) -> pd.Series:
     """
-    Valida i dati di una riga e restituisce un messaggio di errore se ci sono problemi.
-    Restituisce None se i dati sono validi.
+    Valida tutte le righe del foglio con controlli per colonna (stessi messaggi per riga).
+    Restituisce una Series allineata a sdf: messaggio di errore ("; " tra i problemi) o None.
     """
-    errori = []
-    
+    n = len(sdf)
+    parti: List[List[Optional[str]]] = []
+
     # Controllo DATA
+    def _check_data(v) -> Optional[str]:
+        if pd.isna(v) or v == "":
+            return "DATA mancante o vuota"
+        if parse_excel_date(v) is None:
+            return f"DATA non valida: {v}"
+        return None
+
     if not cols["data"]:
-        errori.append("Colonna DATA mancante")
+        parti.append(["Colonna DATA mancante"] * n)
     else:
-        data_val = row.get(cols["data"])
-        if pd.isna(data_val) or data_val == "":
-            errori.append("DATA mancante o vuota")
-        else:
-            parsed_date = parse_excel_date(data_val)
-            if parsed_date is None:
-                errori.append(f"DATA non valida: {data_val}")
-    
+        parti.append(_map_distinct(sdf[cols["data"]], _check_data))
+
     # Controllo APT
+    # Verifica che APT sia uno dei valori attesi (BGY, VRN, ecc.)
+    apt_attesi = {a.upper() for a in cfg.apt_filter} if cfg.apt_filter else None
+
+    def _check_apt(v) -> Optional[str]:
+        apt_val = str(v).strip()
+        if not apt_val or apt_val.lower() == "nan":
+            return "APT mancante o vuoto"
+        if apt_attesi is not None and apt_val.upper() not in apt_attesi:
+            return f"APT non riconosciuto: {apt_val} (attesi: {', '.join(cfg.apt_filter)})"
+        return None
+
     if not cols["apt"]:
-        errori.append("Colonna APT mancante")
+        parti.append(["Colonna APT mancante"] * n)
     else:
-        apt_val = str(row.get(cols["apt"], "")).strip()
-        if not apt_val or apt_val == "" or apt_val.lower() == "nan":
-            errori.append("APT mancante o vuoto")
-        else:
-            # Verifica che APT sia uno dei valori attesi (BGY, VRN, ecc.)
-            apt_upper = apt_val.upper()
-            if cfg.apt_filter:
-                if apt_upper not in [a.upper() for a in cfg.apt_filter]:
-                    errori.append(f"APT non riconosciuto: {apt_val} (attesi: {', '.join(cfg.apt_filter)})")
-    
+        parti.append(_map_distinct(sdf[cols["apt"]], _check_apt))
+
     # Controllo TURNO
+    def _check_turno(v) -> Optional[str]:
+        if pd.isna(v) or str(v).strip() == "":
+            # TURNO può essere vuoto se viene forward-filled, quindi non è un errore critico qui
+            return None
+        turno_str = str(v).strip()
+        parsed = parse_turno(turno_str)
+        if parsed[0] is None or parsed[1] is None:
+            return f"TURNO non riconoscibile: {turno_str}"
+        return None
+
     if not cols["turno"]:
-        errori.append("Colonna TURNO mancante")
+        parti.append(["Colonna TURNO mancante"] * n)
     else:
-        turno_val = row.get(cols["turno"])
-        if pd.isna(turno_val) or str(turno_val).strip() == "":
-            # TURNO può essere vuoto se viene forward-filled, quindi non è un errore critico qui
-            pass
-        else:
-            turno_str = str(turno_val).strip()
-            parsed = parse_turno(turno_str)
-            if parsed[0] is None or parsed[1] is None:
-                errori.append(f"TURNO non riconoscibile: {turno_str}")
-    
+        parti.append(_map_distinct(sdf[cols["turno"]], _check_turno))
+
     # Controllo TOUR OPERATOR (se presente)
+    to_kw = cfg.to_keyword.lower()
+
+    def _check_to(v) -> Optional[str]:
+        to_val = str(v).strip()
+        if to_val and to_val.lower() != "nan" and to_kw not in to_val.lower():
+            return f"TOUR OPERATOR non corrisponde: {to_val} (atteso: {cfg.to_keyword})"
+        return None
+
     if cols["tour_operator"]:
-        to_val = str(row.get(cols["tour_operator"], "")).strip()
-        if to_val and to_val.lower() != "nan":
-            if cfg.to_keyword.lower() not in to_val.lower():
-                errori.append(f"TOUR OPERATOR non corrisponde: {to_val} (atteso: {cfg.to_keyword})")
-    
-    # Controllo ATD/STD (formato orario se presente)
-    if cols["atd"]:
-        atd_val = row.get(cols["atd"])
-        if pd.notna(atd_val) and str(atd_val).strip() != "":
-            atd_candidates = extract_atd_candidates(atd_val)
-            if not atd_candidates:
-                # Non è un errore critico, ma può essere un warning
-                pass
-    
-    if cols["std"]:
-        std_val = row.get(cols["std"])
-        if pd.notna(std_val) and str(std_val).strip() != "":
-            std_candidates = extract_atd_candidates(std_val)
-            if not std_candidates:
-                # Non è un errore critico, ma può essere un warning
-                pass
-    
-    if errori:
-        return "; ".join(errori)
-    return None
+        parti.append(_map_distinct(sdf[cols["tour_operator"]], _check_to))
+
+    # ATD/STD non formattabili non sono errori critici: nessun controllo qui
+
+    errori = [
+        "; ".join(e for e in riga if e) or None
+        for riga in zip(*parti)
+    ]
+    return pd.Series(errori, index=sdf.index, dtype=object)
 
 
 def extract_atd_candidates(val) -> List[Tuple[int, int]]:
@@ -535,7 +700,7 @@ def extract_atd_candidates(val) -> List[Tuple[int, int]]:
         return []
     s = s.replace(".", ":")
     # find all tokens like 8, 8:10, 08:10
-    tokens = re.findall(r"\b(\d{1,2})(?::(\d{1,2}))?\b", s)
+    tokens = _TOKEN_RE.findall(s)
     out = []
     for hh, mm in tokens:
         h = int(hh)
@@ -545,6 +710,53 @@ def extract_atd_candidates(val) -> List[Tuple[int, int]]:
     return out
 
 
+def extract_atd_candidates_series(s: pd.Series) -> List[List[Tuple[int, int]]]:
+    """
+    extract_atd_candidates su un'intera colonna ATD/STD (una lista per riga).
+    Ogni valore distinto è risolto una volta; i testi con più orari passano
+    in blocco da str.extractall con lo stesso pattern dei token.
+    Righe con lo stesso valore condividono la lista: non modificarla.
+    """
+    vals = s.to_numpy(dtype=object)
+    pos: Dict[Tuple[type, str], int] = {}
+    codes = np.empty(len(vals), dtype=np.int64)
+    distinti: List = []
+    for i, v in enumerate(vals):
+        key = (type(v), str(v))
+        j = pos.get(key)
+        if j is None:
+            j = pos[key] = len(distinti)
+            distinti.append(v)
+        codes[i] = j
+
+    res: List[List[Tuple[int, int]]] = [[] for _ in distinti]
+    testi, testi_j = [], []
+    for j, v in enumerate(distinti):
+        if v is None or pd.isna(v):
+            continue
+        # If it's time-like
+        tv = parse_time_value(v)
+        if tv:
+            res[j] = [tv]
+            continue
+        t = str(v).strip()
+        if t:
+            testi.append(t)
+            testi_j.append(j)
+
+    if testi:
+        # find all tokens like 8, 8:10, 08:10
+        m = pd.Series(testi, dtype=object).str.replace(".", ":", regex=False).str.extractall(_TOKEN_RE)
+        if not m.empty:
+            hh = m[0].map(int)
+            mm = m[1].map(lambda x: int(x) if isinstance(x, str) and x else 0)
+            ok = (hh <= 47) & (mm <= 59)
+            for (r, _), h, mi in zip(m.index[ok], hh[ok], mm[ok]):
+                res[testi_j[r]].append((h % 24, mi))
+
+    return [res[c] for c in codes]
+
+
 def _build_errore(errore: Optional[str], nota: Optional[str]) -> str:
     """Compone il campo ERRORE unendo eventuale errore di calcolo e nota dal file sorgente."""
     parts = []
@@ -577,6 +789,23 @@ def compute_turno_eur(durata_min: int, apt: str, cfg: CalcConfig) -> float:
         return base_3h + ore_oltre_3h * cfg.over_3h_rate_per_h
 
 
+def compute_turno_eur_vec(durata_min: np.ndarray, apts: List[str], cfg: CalcConfig) -> np.ndarray:
+    """Versione vettoriale di compute_turno_eur: una riga di tariffe per APT, stessa regola."""
+    durata_h = np.asarray(durata_min) / 60.0
+    rates = _TURNO_RATES[[_TURNO_RATES_ROW.get(a.upper(), 0) for a in apts]].reshape(len(durata_h), len(TURNO_ORE))
+    base_3h = rates[:, 0]
+
+    # Se la durata è esattamente una delle tariffe fisse, usa quella
+    durata_h_int = np.round(durata_h).astype(np.int64)
+    fissa = (durata_h_int >= TURNO_ORE[0]) & (durata_h_int <= TURNO_ORE[-1]) & (np.abs(durata_h - durata_h_int) < 0.01)
+    col = np.clip(durata_h_int - TURNO_ORE[0], 0, len(TURNO_ORE) - 1)
+    tariffa_fissa = rates[np.arange(len(durata_h)), col]
+
+    # Altrimenti pro-rata: base 3h + ore oltre 3h
+    pro_rata = np.where(durata_h <= 3.0, base_3h, base_3h + (durata_h - 3.0) * cfg.over_3h_rate_per_h)
+    return np.where(fissa, tariffa_fissa, pro_rata)
+
+
 def compute_extra_min(atd_sel: Optional[pd.Timestamp], end_dt: pd.Timestamp, no_dec: bool, cfg: CalcConfig) -> int:
     """
     Calcola i minuti extra secondo Alpitour 2025.
@@ -590,22 +819,10 @@ def compute_extra_min(atd_sel: Optional[pd.Timestamp], end_dt: pd.Timestamp, no_
     if no_dec or atd_sel is None:
         return 0
     
-    # Alpitour: fine copertura = ATD + 30 minuti
-    fine_copertura = atd_sel + pd.Timedelta(minutes=cfg.extra_window_minutes)
-    
-    # Se ATD è DOPO fine turno: calcolo normale
-    if atd_sel > end_dt:
-        return int((fine_copertura - end_dt).total_seconds() // 60)
-    
-    # Se ATD è PRIMA o UGUALE a fine turno: dei 30 minuti post-ATD, solo la parte FUORI conta
-    # I 30 minuti vanno da ATD a (ATD + 30 min)
-    # Solo la parte dopo fine_turno conta come extra
-    if fine_copertura <= end_dt:
-        # Tutti i 30 minuti sono dentro il turno
-        return 0
-    
-    # Parte dei 30 minuti è fuori: calcola solo quella parte
-    return int((fine_copertura - end_dt).total_seconds() // 60)
+    # Se ATD è DOPO fine turno: (ATD + 30 min) - fine turno.
+    # Se ATD è PRIMA o UGUALE a fine turno: dei 30 minuti post-ATD conta solo la parte dopo
+    # fine turno (0 se tutti dentro). In entrambi i casi è la parte di copertura oltre fine turno.
+    return int(_extra_min_ns(atd_sel.value, end_dt.value, cfg.extra_window_minutes * _NS_PER_MIN))
 
 
 def compute_night_eur(night_min: int, cfg: CalcConfig, apt: str = None) -> float:
@@ -633,33 +850,250 @@ def compute_night_eur(night_min: int, cfg: CalcConfig, apt: str = None) -> float
         return base_eur
 
 
-def _add_italian_holidays_for_year(holidays: set, year: int) -> None:
-    """Aggiunge i festivi italiani per un dato anno (fissi + Pasqua/Pasquetta)."""
-    from datetime import timedelta
-    holidays.add(date(year, 1, 1))   # Capodanno
-    holidays.add(date(year, 1, 6))   # Epifania
-    holidays.add(date(year, 4, 25))  # Liberazione
-    holidays.add(date(year, 5, 1))   # Festa del Lavoro
-    holidays.add(date(year, 6, 2))   # Festa della Repubblica
-    holidays.add(date(year, 11, 1))  # Ognissanti
-    holidays.add(date(year, 8, 15))  # Ferragosto
-    holidays.add(date(year, 12, 8))  # Immacolata
-    holidays.add(date(year, 12, 25)) # Natale
-    holidays.add(date(year, 12, 26)) # Santo Stefano
-    e = easter(year)
-    holidays.add(e)
-    holidays.add(e + timedelta(days=1))  # Pasquetta
+def select_decollo(b: BlockAgg) -> Optional[pd.Timestamp]:
+    """
+    Alpitour: decollo di riferimento del blocco.
+    Preferisce l'ultimo ATD dopo fine turno, altrimenti l'ultimo ATD disponibile (anche se prima);
+    se non c'è nessun ATD usa STD con la stessa regola.
+    """
+    for cand in (b.atd_list, b.std_list):
+        after = [x for x in cand if x > b.end_dt]
+        if after:
+            return max(after)
+        if cand:
+            return max(cand)
+    return None
+
+
+# Sopra questa soglia (e con numba installato) i valori dei blocchi passano al kernel compilato:
+# su pochi blocchi il costo di compilazione/avvio non si ripaga
+NUMBA_MIN_ROWS = 100_000
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _block_values_kernel(start_ns, end_ns, atd_ns, has_atd, no_dec, festivo, rate_row, is_vrn, rates,
+                             window_ns, rate_extra_per_h, over_3h_rate_per_h, night_eur_per_min,
+                             vrn_night_per_min, festivo_multiplier,
+                             out_durata, out_turno, out_extra_min, out_extra_eur,
+                             out_night_min, out_night_eur, out_totale):
+        """Stesso calcolo di compute_blocks_frame in un solo passaggio per blocco su array piatti"""
+        for i in prange(len(start_ns)):
+            s = start_ns[i]
+            e = end_ns[i]
+            durata = (e - s) // _NS_PER_MIN
+
+            durata_h = durata / 60.0
+            h_int = round(durata_h)
+            base_3h = rates[rate_row[i], 0]
+            if 3 <= h_int <= 8 and abs(durata_h - h_int) < 0.01:
+                turno = rates[rate_row[i], h_int - 3]
+            elif durata_h <= 3.0:
+                turno = base_3h
+            else:
+                turno = base_3h + (durata_h - 3.0) * over_3h_rate_per_h
+
+            extra = 0
+            if not no_dec[i] and has_atd[i]:
+                extra = _extra_min_ns(atd_ns[i], e, window_ns)
+            extra_eur = (extra / 60.0) * rate_extra_per_h
 
+            night = _night_minutes_ns(s, e) + _night_minutes_ns(e, e + extra * _NS_PER_MIN)
+            if is_vrn[i]:
+                night_eur = night * vrn_night_per_min
+            else:
+                night_eur = night * night_eur_per_min
+
+            subtotal = turno + extra_eur + night_eur
+            out_durata[i] = durata
+            out_turno[i] = turno
+            out_extra_min[i] = extra
+            out_extra_eur[i] = extra_eur
+            out_night_min[i] = night
+            out_night_eur[i] = night_eur
+            out_totale[i] = subtotal * festivo_multiplier if festivo[i] else subtotal
+
+    @njit(cache=True)
+    def _pick_decollo_one(vals, a, b, e):
+        """Ultimo valore > e in vals[a:b], altrimenti l'ultimo in assoluto; (trovato, ns)"""
+        if a == b:
+            return False, 0
+        best = vals[a]
+        best_after = 0
+        after = False
+        for j in range(a, b):
+            v = vals[j]
+            if v > best:
+                best = v
+            if v > e and (not after or v > best_after):
+                best_after = v
+                after = True
+        return True, best_after if after else best
+
+    @njit(parallel=True, cache=True)
+    def _select_decollo_kernel(atd_vals, atd_off, std_vals, std_off, end_ns, out_ns, out_ok):
+        """select_decollo su array CSR (valori ns piatti + offset): ATD, altrimenti STD"""
+        for i in prange(len(end_ns)):
+            ok, v = _pick_decollo_one(atd_vals, atd_off[i], atd_off[i + 1], end_ns[i])
+            if not ok:
+                ok, v = _pick_decollo_one(std_vals, std_off[i], std_off[i + 1], end_ns[i])
+            out_ok[i] = ok
+            out_ns[i] = v
+else:
+    _block_values_kernel = None
+    _select_decollo_kernel = None
+
+
+def _csr_ns(lists: List[List[pd.Timestamp]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Liste di Timestamp -> (valori ns piatti, offset CSR lunghi len(lists) + 1)."""
+    off = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(l) for l in lists), dtype=np.int64, count=len(lists)), out=off[1:])
+    vals = np.fromiter((t.value for l in lists for t in l), dtype=np.int64, count=int(off[-1]))
+    return vals, off
+
+
+def _pick_decollo_ns(vals: np.ndarray, off: np.ndarray, end_ns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per blocco: massimo dei valori dopo end_ns, altrimenti massimo di tutti -> (trovato, ns)."""
+    n = len(end_ns)
+    owner = np.repeat(np.arange(n), np.diff(off))
+    best = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(best, owner, vals)
+    after = vals > end_ns[owner]
+    best_after = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(best_after, owner[after], vals[after])
+    has_after = np.zeros(n, dtype=bool)
+    has_after[owner[after]] = True
+    return np.diff(off) > 0, np.where(has_after, best_after, best)
+
+
+def select_decollo_all(blocks: List[BlockAgg]) -> List[Optional[pd.Timestamp]]:
+    """select_decollo per tutti i blocchi, su ATD/STD impacchettati in array CSR di ns."""
+    n = len(blocks)
+    end_ns = np.fromiter((b.end_dt.value for b in blocks), dtype=np.int64, count=n)
+    atd_vals, atd_off = _csr_ns([b.atd_list for b in blocks])
+    std_vals, std_off = _csr_ns([b.std_list for b in blocks])
+    if _select_decollo_kernel is not None and n >= NUMBA_MIN_ROWS:
+        sel_ns = np.empty(n, dtype=np.int64)
+        ok = np.empty(n, dtype=bool)
+        _select_decollo_kernel(atd_vals, atd_off, std_vals, std_off, end_ns, sel_ns, ok)
+    else:
+        atd_ok, atd_ns = _pick_decollo_ns(atd_vals, atd_off, end_ns)
+        std_ok, std_ns = _pick_decollo_ns(std_vals, std_off, end_ns)
+        ok = atd_ok | std_ok
+        sel_ns = np.where(atd_ok, atd_ns, std_ns)
+    return [pd.Timestamp(v) if k else None for v, k in zip(sel_ns.tolist(), ok.tolist())]
 
-def get_italian_holidays_2025() -> set[date]:
+
+_BLOCK_CALC_FIELDS = attrgetter("start_dt", "end_dt", "no_dec", "festivo_flag", "apt")
+
+
+def blocks_to_columns(blocks: List[BlockAgg], atd_sel: List[Optional[pd.Timestamp]]) -> Dict[str, np.ndarray]:
+    """
+    Vista colonnare (SoA) dei campi di calcolo dei blocchi: un array per campo,
+    stesso ordine di blocks. La trasposizione avviene in un solo passaggio
+    (attrgetter + zip) invece di una scansione dei blocchi per ogni campo.
     """
-    Calcola i festivi italiani per il 2025 (e 2026, 2027) secondo le linee guida Alpitour.
+    n = len(blocks)
+    starts, ends, no_dec, festivo, apts = zip(*map(_BLOCK_CALC_FIELDS, blocks)) if n else ((),) * 5
+    return {
+        "start_ns": np.fromiter((t.value for t in starts), dtype=np.int64, count=n),
+        "end_ns": np.fromiter((t.value for t in ends), dtype=np.int64, count=n),
+        "no_dec": np.fromiter(no_dec, dtype=bool, count=n),
+        "festivo": np.fromiter(festivo, dtype=bool, count=n),
+        "apt": np.array(apts, dtype=object),
+        "has_atd": np.fromiter((a is not None for a in atd_sel), dtype=bool, count=n),
+        "atd_ns": np.fromiter((a.value if a is not None else 0 for a in atd_sel), dtype=np.int64, count=n),
+    }
+
+
+def compute_blocks_frame(blocks: List[BlockAgg], atd_sel: List[Optional[pd.Timestamp]], cfg: CalcConfig) -> pd.DataFrame:
+    """
+    Valori economici di tutti i blocchi (senza errori) in colonne: durata, turno €, extra,
+    notturno su turno + extra, festivo. Una riga per blocco, nello stesso ordine di blocks.
+    Nessun arrotondamento: round(…, 2) resta alla scrittura delle righe.
+    """
+    c = blocks_to_columns(blocks, atd_sel)
+    start_ns, end_ns, atd_ns, has_atd = c["start_ns"], c["end_ns"], c["atd_ns"], c["has_atd"]
+    no_dec, festivo, apts = c["no_dec"], c["festivo"], c["apt"]
+    is_vrn = np.fromiter((bool(a) and a.upper() == "VRN" for a in apts), dtype=bool, count=len(apts))
+    # Stesse tariffe di compute_night_eur
+    vrn_night_per_min = ((80.0 / 3.0) * 0.15) / 60.0
+
+    if _block_values_kernel is not None and len(blocks) >= NUMBA_MIN_ROWS:
+        n = len(blocks)
+        rate_row = np.fromiter((_TURNO_RATES_ROW.get(a.upper(), 0) for a in apts), dtype=np.int64, count=n)
+        out = {
+            "durata_min": np.empty(n, dtype=np.int64),
+            "turno_eur": np.empty(n, dtype=np.float64),
+            "extra_min": np.empty(n, dtype=np.int64),
+            "extra_eur": np.empty(n, dtype=np.float64),
+            "night_min": np.empty(n, dtype=np.int64),
+            "night_eur": np.empty(n, dtype=np.float64),
+            "totale": np.empty(n, dtype=np.float64),
+        }
+        _block_values_kernel(start_ns, end_ns, atd_ns, has_atd, no_dec, festivo, rate_row, is_vrn, _TURNO_RATES,
+                             cfg.extra_window_minutes * _NS_PER_MIN, cfg.rate_extra_per_h, cfg.over_3h_rate_per_h,
+                             cfg.night_eur_per_min, vrn_night_per_min, cfg.festivo_multiplier, *out.values())
+        return pd.DataFrame(out)
+
+    durata_min = (end_ns - start_ns) // _NS_PER_MIN
+    turno_eur = compute_turno_eur_vec(durata_min, apts, cfg)
+
+    # Extra: parte della copertura [ATD, ATD + 30 min] oltre fine turno (0 con NO DEC o senza decollo)
+    coperto = np.maximum(atd_ns + cfg.extra_window_minutes * _NS_PER_MIN - end_ns, 0) // _NS_PER_MIN
+    extra_min = np.where(no_dec | ~has_atd, 0, coperto)
+    extra_eur = (extra_min / 60.0) * cfg.rate_extra_per_h
+
+    # Notturno su turno + intervallo extra (vuoto se extra = 0)
+    night_min = night_minutes_vec(start_ns, end_ns) + night_minutes_vec(end_ns, end_ns + extra_min * _NS_PER_MIN)
+    night_eur = np.where(is_vrn, night_min * vrn_night_per_min, night_min * cfg.night_eur_per_min)
+
+    # Alpitour 2025: festivi +20% su turno, extra E notturno
+    subtotal = turno_eur + extra_eur + night_eur
+    totale = np.where(festivo, subtotal * cfg.festivo_multiplier, subtotal)
+
+    return pd.DataFrame({
+        "durata_min": durata_min,
+        "turno_eur": turno_eur,
+        "extra_min": extra_min,
+        "extra_eur": extra_eur,
+        "night_min": night_min,
+        "night_eur": night_eur,
+        "totale": totale,
+    })
+
+
+@lru_cache(maxsize=None)
+def _italian_holidays_for_year(year: int) -> frozenset[date]:
+    """Festivi italiani per un dato anno (fissi + Pasqua/Pasquetta)."""
+    e = easter(year)
+    return frozenset((
+        date(year, 1, 1),    # Capodanno
+        date(year, 1, 6),    # Epifania
+        date(year, 4, 25),   # Liberazione
+        date(year, 5, 1),    # Festa del Lavoro
+        date(year, 6, 2),    # Festa della Repubblica
+        date(year, 11, 1),   # Ognissanti
+        date(year, 8, 15),   # Ferragosto
+        date(year, 12, 8),   # Immacolata
+        date(year, 12, 25),  # Natale
+        date(year, 12, 26),  # Santo Stefano
+        e,
+        e + timedelta(days=1),  # Pasquetta
+    ))
+
+
+# Festivi 2025 (e 2026, 2027), costruiti una volta all'import
+_ITALIAN_HOLIDAYS_2025 = frozenset().union(*(_italian_holidays_for_year(y) for y in (2025, 2026, 2027)))
+# Stessi festivi come array datetime64[D] ordinato, per np.isin su colonne di date
+_ITALIAN_HOLIDAYS_2025_D = np.array(sorted(_ITALIAN_HOLIDAYS_2025), dtype="datetime64[D]")
+
+
+def get_italian_holidays_2025() -> frozenset[date]:
+    """
+    Festivi italiani per il 2025 (e 2026, 2027) secondo le linee guida Alpitour.
     Include più anni per supportare piani lavoro 2026+ (es. 1 gennaio 2026 = Capodanno).
     """
-    holidays = set()
-    for y in (2025, 2026, 2027):
-        _add_italian_holidays_for_year(holidays, y)
-    return holidays
+    return _ITALIAN_HOLIDAYS_2025
 
 
 def load_holiday_list(path: str) -> set[date]:
@@ -757,10 +1191,10 @@ def validate_file_complete(file_path: str, to_keyword: str = "alpitour", apt_fil
             
             # Filtra per TO se presente
             if cols["tour_operator"]:
-                mask_to = sdf[cols["tour_operator"]].astype(str).str.contains(to_keyword, case=False, na=False)
-                sdf_filtered = sdf[mask_to].copy()
+                mask_to = str_contains_mask(sdf[cols["tour_operator"]], to_keyword, regex=False)
+                sdf_filtered = sdf[mask_to]
             else:
-                sdf_filtered = sdf.copy()
+                sdf_filtered = sdf  # solo lettura: nessuna copia
             
             # Crea una config temporanea per la validazione
             # Non usiamo dataclass qui per evitare problemi con default mutabili
@@ -771,26 +1205,24 @@ def validate_file_complete(file_path: str, to_keyword: str = "alpitour", apt_fil
             
             temp_cfg = TempConfig(to_keyword=to_keyword, apt_filter=apt_filter)
             
-            # Valida ogni riga
+            # Valida tutte le righe per colonna, poi costruisce i record solo per quelle con errori
             errori_foglio = []
-            for idx, row in sdf_filtered.iterrows():
-                errore = validate_row_data(row, cols, temp_cfg)
-                if errore:
-                    # Parse date per vedere se è valida
-                    data_val = None
-                    if cols["data"]:
-                        data_val = row.get(cols["data"])
-                        parsed_date = parse_excel_date(data_val) if pd.notna(data_val) else None
-                        if parsed_date:
-                            result["date_trovate"].add(parsed_date.date())
-                    
-                    errori_foglio.append({
-                        "foglio": sheet_name,
-                        "riga": int(idx) + 2,  # +2 perché Excel inizia da 1 e c'è l'header
-                        "data": str(data_val) if data_val is not None else "N/A",
-                        "apt": str(row.get(cols["apt"], "")) if cols["apt"] else "N/A",
-                        "errore": errore
-                    })
+            esiti = validate_rows(sdf_filtered, cols, temp_cfg)
+            esiti = esiti[esiti.notna()]
+            if cols["data"] and len(esiti):
+                # Date valide delle righe con errori, parse in blocco
+                date_err = parse_excel_date_series(sdf_filtered.loc[esiti.index, cols["data"]])
+                result["date_trovate"].update(date_err.dropna().dt.date)
+            for idx, errore in esiti.items():
+                data_val = sdf_filtered.at[idx, cols["data"]] if cols["data"] else None
+
+                errori_foglio.append({
+                    "foglio": sheet_name,
+                    "riga": int(idx) + 2,  # +2 perché Excel inizia da 1 e c'è l'header
+                    "data": str(data_val) if data_val is not None else "N/A",
+                    "apt": str(sdf_filtered.at[idx, cols["apt"]]) if cols["apt"] else "N/A",
+                    "errore": errore
+                })
             
             if errori_foglio:
                 result["righe_con_errori"].extend(errori_foglio)
@@ -815,20 +1247,25 @@ def validate_file_complete(file_path: str, to_keyword: str = "alpitour", apt_fil
 
 def iter_excel_sheets(file_path: str) -> Iterable[Tuple[str, pd.DataFrame]]:
     """Itera sui fogli del file Excel. Legge solo 'PIANO VOLI' se presente, altrimenti tutti i fogli (retrocompatibilità)"""
-    xls = pd.ExcelFile(file_path)
-    # Cerca il foglio "PIANO VOLI" (nuovo formato)
-    target_sheet = None
-    for sheet in xls.sheet_names:
-        if sheet.upper().strip() == "PIANO VOLI":
-            target_sheet = sheet
-            break
-    
-    # Se trova "PIANO VOLI", leggi solo quello, altrimenti tutti (retrocompatibilità)
-    sheets_to_process = [target_sheet] if target_sheet else xls.sheet_names
-    
-    for sheet in sheets_to_process:
-        df = pd.read_excel(file_path, sheet_name=sheet)
-        yield sheet, df
+    from openpyxl import load_workbook
+
+    # Workbook aperto una sola volta in sola lettura (righe lette in streaming, solo valori);
+    # pandas legge i fogli da questo workbook con la sua stessa conversione delle celle
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    with pd.ExcelFile(wb, engine="openpyxl") as xls:
+        # Cerca il foglio "PIANO VOLI" (nuovo formato)
+        target_sheet = None
+        for sheet in xls.sheet_names:
+            if sheet.upper().strip() == "PIANO VOLI":
+                target_sheet = sheet
+                break
+
+        # Se trova "PIANO VOLI", leggi solo quello, altrimenti tutti (retrocompatibilità)
+        sheets_to_process = [target_sheet] if target_sheet else xls.sheet_names
+
+        for sheet in sheets_to_process:
+            df = pd.read_excel(xls, sheet_name=sheet)
+            yield sheet, df
 
 
 def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
@@ -851,26 +1288,21 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             if not cols["data"] or not cols["apt"] or not has_orario_pf:
                 continue
 
-            # Filter TO if present
+            # Filter TO if present, APT if requested: una sola maschera, test sui valori distinti
+            mask = np.ones(len(sdf), dtype=bool)
             if cols["tour_operator"]:
-                mask_to = sdf[cols["tour_operator"]].astype(str).str.contains(cfg.to_keyword, case=False, na=False)
-                sdf = sdf[mask_to].copy()
-                if sdf.empty:
-                    continue
-
-            # Filter APT if requested
+                mask &= str_contains_mask(sdf[cols["tour_operator"]], cfg.to_keyword, regex=False)
             if cfg.apt_filter and cols["apt"]:
-                apt_pat = "|".join([re.escape(a) for a in cfg.apt_filter])
-                mask_apt = sdf[cols["apt"]].astype(str).str.contains(rf"\b({apt_pat})\b", case=False, na=False)
-                sdf = sdf[mask_apt].copy()
-                if sdf.empty:
-                    continue
-
-            # Parse date
-            sdf["__date"] = sdf[cols["data"]].apply(parse_excel_date)
-            sdf = sdf[sdf["__date"].notna()].copy()
+                mask &= regex_search_mask(sdf[cols["apt"]], apt_filter_regex(tuple(cfg.apt_filter)))
+
+            # Parse date (solo righe filtrate) e scarta quelle senza data valida.
+            # take() crea già un frame nuovo: nessuna .copy() aggiuntiva per filtro
+            dates = parse_excel_date_series(sdf[cols["data"]][mask])
+            valid = dates.notna().to_numpy()
+            sdf = sdf.take(np.flatnonzero(mask)[valid])
             if sdf.empty:
                 continue
+            sdf["__date"] = dates.to_numpy()[valid]
 
             # Preserve order within this sheet chunk
             sdf["__sheet_row_order"] = np.arange(len(sdf), dtype=int)
@@ -898,8 +1330,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                 # ── SOLUZIONE ORDER-BASED (identica a Veratour) ───────────────────
                 # Scan sequenziale: propaga assistente/inizio/fine dalla master alle slave.
                 # La chiave include INIZIO TURNO per distinguere turni diversi stesso giorno.
-                def _is_m(row):
-                    v = row[_inizio_c]
+                def _is_m(v):
                     try:
                         if pd.isna(v): return False
                     except Exception:
@@ -908,32 +1339,36 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
 
                 _last_m = {}  # grp_base → {ass, ini, fin}
                 _ini_v, _fin_v, _ass_v = [], [], []
-                for _, _row in sdf.iterrows():
-                    _gb = str(_row["__date"]) + "|" + _row["__to_s"] + "|" + _row["__apt_s"]
-                    if _is_m(_row):
-                        _last_m[_gb] = {"ass": _row["__as_s"], "ini": _row[_inizio_c], "fin": _row[_fine_c]}
-                        _ini_v.append(_row[_inizio_c]); _fin_v.append(_row[_fine_c]); _ass_v.append(_row["__as_s"])
+                # Colonne lette per riga: iterazione diretta sulle Series (niente Series per riga)
+                _has_std = bool(_std_c and _std_c in sdf.columns)
+                for _d0, _to0, _apt0, _as0, _ini0, _fin0, _std0 in zip(
+                        sdf["__date"], sdf["__to_s"], sdf["__apt_s"], sdf["__as_s"],
+                        sdf[_inizio_c], sdf[_fine_c], _col_or_none(sdf, _std_c)):
+                    _gb = str(_d0) + "|" + _to0 + "|" + _apt0
+                    if _is_m(_ini0):
+                        _last_m[_gb] = {"ass": _as0, "ini": _ini0, "fin": _fin0}
+                        _ini_v.append(_ini0); _fin_v.append(_fin0); _ass_v.append(_as0)
                     else:
                         _m = _last_m.get(_gb)
                         if _m:
                             _ini_v.append(_m["ini"]); _fin_v.append(_m["fin"])
-                            _ass_v.append(_m["ass"] if _m["ass"] else _row["__as_s"])
+                            _ass_v.append(_m["ass"] if _m["ass"] else _as0)
                         else:
                             # Fallback STD-2h30 per righe orfane
                             _fb_ini, _fb_fin = np.nan, np.nan
-                            if _std_c and _std_c in _row.index:
+                            if _has_std:
                                 import datetime as _dt2
-                                _sp = parse_time_value(_row[_std_c])
+                                _sp = parse_time_value(_std0)
                                 if _sp:
                                     _sm2 = (_sp[0]*60+_sp[1]-150) % 1440
                                     _fb_ini = _dt2.time(_sm2//60, _sm2%60)
                                     _fb_fin = _dt2.time(_sp[0], _sp[1])
-                            _ini_v.append(_fb_ini); _fin_v.append(_fb_fin); _ass_v.append(_row["__as_s"])
+                            _ini_v.append(_fb_ini); _fin_v.append(_fb_fin); _ass_v.append(_as0)
 
                 sdf["__ini_f"] = _ini_v
                 sdf["__fin_f"] = _fin_v
                 sdf["__as_s"]  = _ass_v
-                sdf = sdf[sdf["__ini_f"].notna() & sdf["__fin_f"].notna()].copy()
+                sdf = sdf.take(np.flatnonzero(sdf["__ini_f"].notna() & sdf["__fin_f"].notna()))
 
                 if not sdf.empty:
                     def _ptc(v):
@@ -947,81 +1382,102 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
 
                     sdf["__shm"] = sdf["__ini_f"].apply(_ptc)
                     sdf["__ehm"] = sdf["__fin_f"].apply(_ptc)
-                    sdf = sdf[sdf["__shm"].notna() & sdf["__ehm"].notna()].copy()
+                    sdf = sdf.take(np.flatnonzero(sdf["__shm"].notna() & sdf["__ehm"].notna()))
 
                     if not sdf.empty:
-                        sdf["__start_dt"] = sdf.apply(lambda r: to_dt(r["__date"],f"{r['__shm'][0]:02d}:{r['__shm'][1]:02d}"),axis=1)
-                        sdf["__end_dt"]   = sdf.apply(lambda r: to_dt(r["__date"],f"{r['__ehm'][0]:02d}:{r['__ehm'][1]:02d}"),axis=1)
+                        _ini_min = [h * 60 + m for h, m in sdf["__shm"]]
+                        _fin_min = [h * 60 + m for h, m in sdf["__ehm"]]
+                        sdf["__start_dt"] = sdf["__date"] + pd.to_timedelta(_ini_min, unit="m")
+                        sdf["__end_dt"]   = sdf["__date"] + pd.to_timedelta(_fin_min, unit="m")
                         ov = sdf["__end_dt"] < sdf["__start_dt"]
                         sdf.loc[ov,"__end_dt"] += pd.Timedelta(days=1)
 
                         _fv_c = cols.get("festivo")
-                        sdf["__festivo"] = sdf[_fv_c].apply(is_truthy_festivo) if _fv_c else False
+                        sdf["__festivo"] = festivo_mask(sdf[_fv_c]) if _fv_c else False
                         _pi_c = cols.get("importo"); _pe_c = cols.get("ore_extra"); _pn_c = cols.get("notturno")
 
-                        for _i, _r in sdf.iterrows():
-                            _d   = _r["__date"]
-                            _apt = _ss(_r[cols["apt"]])
-                            _to  = _ss(_r[_to_c]) if _to_c else ""
-                            _as  = _r["__as_s"]  # già propagato
-                            _sh,_sm = _r["__shm"]; _eh,_em = _r["__ehm"]
-                            _tn  = f"{_sh:02d}:{_sm:02d}-{_eh:02d}:{_em:02d}"
+                        _atd_c = cols.get("atd")
+                        _vc = cols.get("volo") if cols.get("volo") in sdf.columns else None
+                        _dc = cols.get("destinazione") if cols.get("destinazione") in sdf.columns else None
+                        _nc = cols.get("note") if cols.get("note") in sdf.columns else None
+                        # ATD/STD ancorati per colonna: candidati estratti una volta per valore
+                        # distinto, aritmetica in ns su tutti i candidati appiattiti.
+                        # ATD < start => +1 giorno; ATD più di 2h prima dello STD scartato.
+                        _n = len(sdf)
+                        _d_ns = sdf["__date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+                        _s_ns = sdf["__start_dt"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+                        _std_min = np.full(_n, -1, dtype=np.int64)
+                        if _has_std:
+                            for _k, _sp in enumerate(_map_distinct(sdf[_std_c], parse_time_value)):
+                                if _sp:
+                                    _std_min[_k] = _sp[0] * 60 + _sp[1]
+                        _con_std = _std_min >= 0
+                        _st_ns = _d_ns + _std_min * _NS_PER_MIN
+                        _st_ns += np.where(_st_ns < _s_ns, _NS_PER_DAY, 0)
+                        _std_dt_l = [[pd.Timestamp(v)] if ok else [] for v, ok in zip(_st_ns.tolist(), _con_std)]
+
+                        _cand = extract_atd_candidates_series(sdf[_atd_c]) if _atd_c else [[]] * _n
+                        _lens = np.fromiter((len(c) for c in _cand), dtype=np.int64, count=_n)
+                        _rig = np.repeat(np.arange(_n), _lens)
+                        _c_min = np.fromiter((hh * 60 + mm for c in _cand for hh, mm in c),
+                                             dtype=np.int64, count=int(_lens.sum()))
+                        _t_ns = _d_ns[_rig] + _c_min * _NS_PER_MIN
+                        _t_ns += np.where(_t_ns < _s_ns[_rig], _NS_PER_DAY, 0)
+                        _tiene = ~_con_std[_rig] | (_t_ns >= _st_ns[_rig] - 120 * _NS_PER_MIN)
+                        _t_ts = [pd.Timestamp(v) for v in _t_ns[_tiene].tolist()]
+                        _fine = np.cumsum(np.bincount(_rig[_tiene], minlength=_n)).tolist()
+                        _atd_dt_l = [_t_ts[a:b] for a, b in zip([0] + _fine[:-1], _fine)]
+
+                        _righe = zip(
+                            sdf["__date"], sdf["__apt_s"], sdf["__to_s"], sdf["__as_s"],
+                            sdf["__shm"], sdf["__ehm"], sdf["__start_dt"], sdf["__end_dt"],
+                            sdf["__festivo"], sdf["__sheet_row_order"], sdf["__global_order"],
+                            _col_or_none(sdf, _atd_c), _atd_dt_l, _std_dt_l,
+                            _col_or_none(sdf, _vc), _col_or_none(sdf, _dc), _col_or_none(sdf, _nc),
+                            _col_or_none(sdf, _pi_c), _col_or_none(sdf, _pe_c), _col_or_none(sdf, _pn_c),
+                        )
+                        for (_d, _apt, _to, _as, (_sh, _sm), (_eh, _em), _start, _end, _fest,
+                             _sro, _gro, _atd0, _atdt, _stdt, _vol0, _dst0, _not0,
+                             _imp0, _ext0, _ntt0) in _righe:
+                            # _apt/_to già normalizzati con _ss; _as già propagato
+                            _ini_hm = format_hhmm(_sh, _sm)
+                            _tn  = _ini_hm + "-" + format_hhmm(_eh, _em)
                             # Chiave con INIZIO per distinguere turni diversi stesso giorno
-                            _key = (_d, _to, _apt, _as, f"{_sh:02d}:{_sm:02d}")
+                            _key = (_d, _to, _apt, _as, _ini_hm)
 
                             atd_raw_val = ""
-                            if cols.get("atd") and pd.notna(_r[cols["atd"]]):
-                                _s = str(_r[cols["atd"]]).strip()
+                            if _atd_c and pd.notna(_atd0):
+                                _s = str(_atd0).strip()
                                 if _s.lower() not in ("nan", "none"):
                                     atd_raw_val = _s
 
-                            _atdt = []
-                            _stdt = []  # STD separato da ATD
-                            if cols.get("atd"):
-                                for _hh,_mm in extract_atd_candidates(_r[cols["atd"]]):
-                                    _tdt = _d + pd.Timedelta(hours=_hh, minutes=_mm)
-                                    if _tdt < _r["__start_dt"]: _tdt += pd.Timedelta(days=1)
-                                    if _std_c and _std_c in _r.index:
-                                        _sp = parse_time_value(_r[_std_c])
-                                        if _sp:
-                                            _st = _d + pd.Timedelta(hours=_sp[0], minutes=_sp[1])
-                                            if _st < _r["__start_dt"]: _st += pd.Timedelta(days=1)
-                                            if _tdt < _st - pd.Timedelta(hours=2): continue
-                                    _atdt.append(_tdt)
-                            if _std_c and _std_c in _r.index:
-                                _sp = parse_time_value(_r[_std_c])
-                                if _sp:
-                                    _tdt = _d + pd.Timedelta(hours=_sp[0], minutes=_sp[1])
-                                    if _tdt < _r["__start_dt"]: _tdt += pd.Timedelta(days=1)
-                                    _stdt.append(_tdt)  # STD in lista separata
-
                             _src = SourceRowRef(file=file_path, sheet=sheet_name,
-                                                row_index=int(_r["__sheet_row_order"]),
-                                                original_order=int(_r["__global_order"]))
+                                                row_index=int(_sro),
+                                                original_order=int(_gro))
 
                             if _key not in blocks:
-                                _vc = cols.get("volo"); _vv = _ss(_r[_vc]) if _vc and _vc in _r.index else None
-                                _dc = cols.get("destinazione"); _dv = _ss(_r[_dc]) if _dc and _dc in _r.index else None
-                                _nc = cols.get("note"); _nv = _ss(_r[_nc]) if _nc and _nc in _r.index else None
+                                _vv = _ss(_vol0) if _vc else None
+                                _dv = _ss(_dst0) if _dc else None
+                                _nv = _ss(_not0) if _nc else None
                                 if _nv and _nv.lower() in ('nan','none',''): _nv = None
                                 if _vv and _vv.lower() in ('nan','none',''): _vv = None
                                 if _dv and _dv.lower() in ('nan','none',''): _dv = None
                                 blocks[_key] = BlockAgg(
                                     date=_d, apt=_apt,
                                     turno_raw_ffill=_tn, turno_norm=_tn,
-                                    start_dt=_r["__start_dt"], end_dt=_r["__end_dt"],
+                                    start_dt=_start, end_dt=_end,
                                     no_dec=False, atd_list=_atdt.copy(),
                                     std_list=_stdt.copy(),
                                     atd_raw_list=[atd_raw_val] if atd_raw_val else [],
-                                    festivo_flag=bool(_r["__festivo"]), first_source=_src,
+                                    festivo_flag=bool(_fest), first_source=_src,
                                     assistente=_as or None,
                                     volo=_vv or None,
                                     volo_list=[_vv] if _vv else [],
                                     destinazione=_dv or None,
                                     dest_list=[_dv] if _dv else [],
-                                    provided_importo=parse_eur(_r[_pi_c]) if _pi_c else None,
-                                    provided_extra_min=parse_minutes_from_cell(_r[_pe_c]) if _pe_c else None,
-                                    provided_night_min=parse_minutes_from_cell(_r[_pn_c]) if _pn_c else None,
+                                    provided_importo=parse_eur(_imp0) if _pi_c else None,
+                                    provided_extra_min=parse_minutes_from_cell(_ext0) if _pe_c else None,
+                                    provided_night_min=parse_minutes_from_cell(_ntt0) if _pn_c else None,
                                     nota=_nv or None,
                                 )
                             else:
@@ -1030,14 +1486,14 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                                     _b.atd_raw_list.append(atd_raw_val)
                                 _b.atd_list.extend(_atdt)
                                 _b.std_list.extend(_stdt)
-                                _b.festivo_flag = _b.festivo_flag or bool(_r["__festivo"])
+                                _b.festivo_flag = _b.festivo_flag or bool(_fest)
                                 if _src.original_order < _b.first_source.original_order:
                                     _b.first_source = _src
                                 # Accumula volo e destinazione (evita duplicati)
-                                _vc2 = cols.get("volo"); _vv2 = _ss(_r[_vc2]) if _vc2 and _vc2 in _r.index else None
+                                _vv2 = _ss(_vol0) if _vc else None
                                 if _vv2 and _vv2.lower() not in ('nan','none','') and _vv2 not in _b.volo_list:
                                     _b.volo_list.append(_vv2)
-                                _dc2 = cols.get("destinazione"); _dv2 = _ss(_r[_dc2]) if _dc2 and _dc2 in _r.index else None
+                                _dv2 = _ss(_dst0) if _dc else None
                                 if _dv2 and _dv2.lower() not in ('nan','none','') and _dv2 not in _b.dest_list:
                                     _b.dest_list.append(_dv2)
 
@@ -1047,32 +1503,38 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
 
 
             # Forward-fill TURNO per DATA within the sheet chunk order (already in original read order)
-            turno_col = cols["turno"]
-            sdf["__turno_raw"] = sdf[turno_col].astype(str)
-            ffill_src = sdf[turno_col].replace("", np.nan)
-            sdf["__turno_ffill_raw"] = ffill_src.groupby(sdf["__date"]).ffill()
+            # (celle "" trattate come vuote, senza replace né colonna __turno_raw di appoggio)
+            turno = sdf[cols["turno"]]
+            vuote = turno.eq("")
+            ffill_src = turno.mask(vuote)
+            if vuote.any():
+                ffill_src = ffill_src.infer_objects()  # stesso dtype che dava replace("", nan)
+            sdf["__turno_ffill_raw"] = ffill_src.groupby(sdf["__date"].to_numpy(), sort=False).ffill()
 
             # Parse turno
-            parsed = sdf["__turno_ffill_raw"].apply(parse_turno)
-            sdf["__start_str"] = parsed.apply(lambda x: x[0])
-            sdf["__end_str"] = parsed.apply(lambda x: x[1])
-            sdf["__no_dec"] = parsed.apply(lambda x: x[2])
-            sdf["__turno_norm"] = parsed.apply(lambda x: x[3])
+            # Parse turno: una volta per valore distinto, tuple scompattate in colonne in un solo passaggio
+            parsed = pd.DataFrame(
+                _map_distinct(sdf["__turno_ffill_raw"], parse_turno),
+                index=sdf.index,
+                columns=["__start_min", "__end_min", "__no_dec", "__turno_norm"],
+            )
+            for c in parsed.columns:
+                sdf[c] = parsed[c]
 
             # Exclude non-interpretable TURNO blocks
-            sdf = sdf[sdf["__start_str"].notna() & sdf["__end_str"].notna()].copy()
+            sdf = sdf.take(np.flatnonzero(sdf["__start_min"].notna() & sdf["__end_min"].notna()))
             if sdf.empty:
                 continue
 
             # Build start/end datetime
-            sdf["__start_dt"] = sdf.apply(lambda r: to_dt(r["__date"], r["__start_str"]), axis=1)
-            sdf["__end_dt"] = sdf.apply(lambda r: to_dt(r["__date"], r["__end_str"]), axis=1)
+            sdf["__start_dt"] = sdf["__date"] + pd.to_timedelta(sdf["__start_min"].astype(np.int64), unit="m")
+            sdf["__end_dt"] = sdf["__date"] + pd.to_timedelta(sdf["__end_min"].astype(np.int64), unit="m")
             overnight = sdf["__end_dt"] < sdf["__start_dt"]
             sdf.loc[overnight, "__end_dt"] = sdf.loc[overnight, "__end_dt"] + pd.Timedelta(days=1)
 
             # Festivo by column if present
             if cols["festivo"]:
-                sdf["__festivo"] = sdf[cols["festivo"]].apply(is_truthy_festivo)
+                sdf["__festivo"] = festivo_mask(sdf[cols["festivo"]])
             else:
                 sdf["__festivo"] = False
 
@@ -1082,106 +1544,123 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             prov_night_col = cols["notturno"]
             assistente_col = cols["assistente"]
 
-            # Iterate rows and aggregate by block
-            for idx, r in sdf.iterrows():
-                # Validazione dati riga
-                errore_riga = validate_row_data(r, cols, cfg)
-                
-                d = r["__date"]
-                apt = str(r[cols["apt"]]).strip() if cols["apt"] else ""
-                turno_norm = str(r["__turno_norm"]).strip() if pd.notna(r.get("__turno_norm")) else ""
-                turno_ffill_raw = str(r["__turno_ffill_raw"]).strip() if pd.notna(r.get("__turno_ffill_raw")) else ""
-                assistente_val = str(r[assistente_col]).strip() if assistente_col and assistente_col in r.index and pd.notna(r[assistente_col]) else ""
-
-                # Se turno_norm è vuoto, usa un placeholder per la chiave
-                if not turno_norm:
-                    turno_norm = f"ERRORE_{idx}"
-
-                key = (d, apt, turno_norm)
-
-                # Extract ATD candidates from row
-                atd_times: List[Tuple[int, int]] = []
-                if cols["atd"]:
-                    atd_times.extend(extract_atd_candidates(r[cols["atd"]]))
-
-                # Extract STD candidates from row (Alpitour: fallback se ATD non disponibile)
-                std_times: List[Tuple[int, int]] = []
-                if cols["std"]:
-                    std_times.extend(extract_atd_candidates(r[cols["std"]]))
-
-                # Anchor ATDs to date; if ATD < start_dt => +1 day
-                atd_dt_list: List[pd.Timestamp] = []
-                for hh, mm in atd_times:
-                    tdt = d + pd.Timedelta(hours=hh, minutes=mm)
-                    if tdt < r["__start_dt"]:
-                        tdt = tdt + pd.Timedelta(days=1)
-                    atd_dt_list.append(tdt)
+            # Validazione dati righe (una volta per foglio, per colonna)
+            errori_righe = validate_rows(sdf, cols, cfg)
 
-                # Anchor STDs to date; if STD < start_dt => +1 day
-                std_dt_list: List[pd.Timestamp] = []
-                for hh, mm in std_times:
+            # Chiave blocco per riga: (DATA, APT, TURNO normalizzato)
+            sdf["__apt_k"] = sdf[cols["apt"]].astype(str).str.strip()
+            sdf["__turno_k"] = [
+                str(v).strip() if pd.notna(v) else "" for v in sdf["__turno_norm"]
+            ]
+            # Se turno_norm è vuoto, usa un placeholder per la chiave
+            vuoti = sdf["__turno_k"] == ""
+            if vuoti.any():
+                sdf.loc[vuoti, "__turno_k"] = [f"ERRORE_{idx}" for idx in sdf.index[vuoti]]
+            key_cols = ["__date", "__apt_k", "__turno_k"]
+
+            # ATD/STD per riga ancorati alla data; se < start_dt => +1 giorno
+            # (Alpitour: STD come fallback se ATD non disponibile)
+            def _anchor(d, start_dt, candidati) -> List[pd.Timestamp]:
+                out = []
+                for hh, mm in candidati:
                     tdt = d + pd.Timedelta(hours=hh, minutes=mm)
-                    if tdt < r["__start_dt"]:
+                    if tdt < start_dt:
                         tdt = tdt + pd.Timedelta(days=1)
-                    std_dt_list.append(tdt)
+                    out.append(tdt)
+                return out
+
+            dates = sdf["__date"].tolist()
+            starts = sdf["__start_dt"].tolist()
+            sdf["__atd_dt"] = [
+                _anchor(d, st, c) for d, st, c in zip(dates, starts, extract_atd_candidates_series(sdf[cols["atd"]]))
+            ] if cols["atd"] else [[] for _ in dates]
+            sdf["__std_dt"] = [
+                _anchor(d, st, c) for d, st, c in zip(dates, starts, extract_atd_candidates_series(sdf[cols["std"]]))
+            ] if cols["std"] else [[] for _ in dates]
+
+            # Volo/destinazione: valore della prima riga del blocco e valori da accumulare (senza duplicati)
+            def _primo_val(v) -> Optional[str]:
+                val = str(v).strip() if pd.notna(v) else None
+                return None if val == "" or val == "nan" else val
+
+            def _accum_val(v) -> Optional[str]:
+                if pd.isna(v):
+                    return None
+                val = str(v).strip()
+                return val if val and val.lower() not in ('nan', 'none', '') else None
+
+            for nome, col in (("volo", cols.get("volo")), ("dest", cols.get("destinazione"))):
+                present = bool(col) and col in sdf.columns
+                sdf[f"__{nome}_primo"] = sdf[col].map(_primo_val) if present else None
+                sdf[f"__{nome}_acc"] = sdf[col].map(_accum_val) if present else None
+
+            # Identità del blocco = prima riga per chiave; ATD/STD, festivo e voli aggregati per chiave
+            firsts = sdf.drop_duplicates(key_cols, keep="first")
+            aggregati = sdf.groupby(key_cols, sort=False, dropna=False)[
+                ["__atd_dt", "__std_dt", "__festivo", "__volo_acc", "__dest_acc"]
+            ].agg(list)
+
+            # Colonne della prima riga di ogni blocco, risolte una volta per foglio
+            note_col = cols.get("note")
+            prima = zip(
+                firsts.index, firsts["__date"], firsts["__apt_k"], firsts["__turno_k"],
+                firsts["__sheet_row_order"], firsts["__global_order"], firsts["__turno_ffill_raw"],
+                firsts["__start_dt"], firsts["__end_dt"], firsts["__no_dec"],
+                firsts["__volo_primo"], firsts["__dest_primo"],
+                _col_or_none(firsts, assistente_col), _col_or_none(firsts, note_col),
+                _col_or_none(firsts, prov_importo_col), _col_or_none(firsts, prov_extra_col),
+                _col_or_none(firsts, prov_night_col),
+            )
+            for ((idx, r_date, r_apt, r_turno, r_sro, r_gro, r_ffill, r_start, r_end, r_no_dec,
+                  volo_val, dest_val, r_ass, r_nota, r_imp, r_extra, r_night),
+                 (g_atd, g_std, g_fest, g_voli, g_dest)) in zip(prima, aggregati.itertuples(index=False, name=None)):
+                key = (r_date, r_apt, r_turno)
+                atd_dt_list = [t for lst in g_atd for t in lst]
+                std_dt_list = [t for lst in g_std for t in lst]
+                # If any row in block says festivo -> festivo
+                festivo_any = any(bool(f) for f in g_fest)
 
                 # Determine first-source reference (first appearance of the block)
-                src = SourceRowRef(file=file_path, sheet=sheet_name, row_index=int(r["__sheet_row_order"]), original_order=int(r["__global_order"]))
+                src = SourceRowRef(file=file_path, sheet=sheet_name, row_index=int(r_sro), original_order=int(r_gro))
 
                 if key not in blocks:
-                    # Save "provided" values from this first row (for discrepancy sheet)
-                    prov_importo = parse_eur(r[prov_importo_col]) if prov_importo_col else None
-                    prov_extra_min = parse_minutes_from_cell(r[prov_extra_col]) if prov_extra_col else None
-                    prov_night_min = parse_minutes_from_cell(r[prov_night_col]) if prov_night_col else None
-
-                    # Extract volo from first row
-                    volo_col = cols.get("volo")
-                    volo_val = None
-                    if volo_col and volo_col in r.index:
-                        volo_val = str(r[volo_col]).strip() if pd.notna(r[volo_col]) else None
-                        if volo_val == "" or volo_val == "nan":
-                            volo_val = None
-
-                    # Extract destinazione from first row
-                    dest_col = cols.get("destinazione")
-                    dest_val = None
-                    if dest_col and dest_col in r.index:
-                        dest_val = str(r[dest_col]).strip() if pd.notna(r[dest_col]) else None
-                        if dest_val == "" or dest_val == "nan":
-                            dest_val = None
+                    turno_ffill_raw = str(r_ffill).strip() if pd.notna(r_ffill) else ""
+                    assistente_val = str(r_ass).strip() if pd.notna(r_ass) else ""
 
                     # Extract nota from first row (point of attention from source file)
-                    note_col = cols.get("note")
                     nota_val = None
-                    if note_col and note_col in r.index and pd.notna(r[note_col]):
-                        nv = str(r[note_col]).strip()
+                    if pd.notna(r_nota):
+                        nv = str(r_nota).strip()
                         if nv and nv.lower() not in ('nan', 'none', ''):
                             nota_val = nv
 
-                    blocks[key] = BlockAgg(
-                        date=d,
-                        apt=apt,
+                    b = BlockAgg(
+                        date=r_date,
+                        apt=r_apt,
                         turno_raw_ffill=turno_ffill_raw,
-                        turno_norm=turno_norm,
-                        start_dt=r["__start_dt"],
-                        end_dt=r["__end_dt"],
-                        no_dec=bool(r["__no_dec"]),
-                        atd_list=atd_dt_list.copy(),
-                        std_list=std_dt_list.copy(),
-                        festivo_flag=bool(r["__festivo"]),
+                        turno_norm=r_turno,
+                        start_dt=r_start,
+                        end_dt=r_end,
+                        no_dec=bool(r_no_dec),
+                        atd_list=atd_dt_list,
+                        std_list=std_dt_list,
+                        festivo_flag=festivo_any,
                         first_source=src,
                         assistente=assistente_val if assistente_val else None,
                         volo=volo_val,
                         volo_list=[volo_val] if volo_val else [],
                         destinazione=dest_val,
                         dest_list=[dest_val] if dest_val else [],
-                            atd_raw_list=[atd_raw_val] if atd_raw_val else [],
-                        provided_importo=prov_importo,
-                        provided_extra_min=prov_extra_min,
-                        provided_night_min=prov_night_min,
-                        errore=errore_riga,
+                        atd_raw_list=[atd_raw_val] if atd_raw_val else [],
+                        # Save "provided" values from this first row (for discrepancy sheet)
+                        provided_importo=parse_eur(r_imp) if prov_importo_col else None,
+                        provided_extra_min=parse_minutes_from_cell(r_extra) if prov_extra_col else None,
+                        provided_night_min=parse_minutes_from_cell(r_night) if prov_night_col else None,
+                        errore=errori_righe.at[idx],
                         nota=nota_val,
                     )
+                    blocks[key] = b
+                    voli_acc, dest_acc = g_voli[1:], g_dest[1:]
                 else:
                     # merge
                     b = blocks[key]
@@ -1189,43 +1668,56 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                         b.atd_raw_list.append(atd_raw_val)
                     b.atd_list.extend(atd_dt_list)
                     b.std_list.extend(std_dt_list)
-                    # If any row in block says festivo -> festivo
-                    b.festivo_flag = b.festivo_flag or bool(r["__festivo"])
+                    b.festivo_flag = b.festivo_flag or festivo_any
                     # Keep earliest source by global order
                     if src.original_order < b.first_source.original_order:
                         b.first_source = src
                         # update provided values to align with "first row of block"
-                        b.provided_importo = parse_eur(r[prov_importo_col]) if prov_importo_col else b.provided_importo
-                        b.provided_extra_min = parse_minutes_from_cell(r[prov_extra_col]) if prov_extra_col else b.provided_extra_min
-                        b.provided_night_min = parse_minutes_from_cell(r[prov_night_col]) if prov_night_col else b.provided_night_min
-                    # Accumula volo e destinazione (evita duplicati)
-                    volo_col2 = cols.get("volo")
-                    if volo_col2 and volo_col2 in r.index and pd.notna(r[volo_col2]):
-                        vv2 = str(r[volo_col2]).strip()
-                        if vv2 and vv2.lower() not in ('nan', 'none', '') and vv2 not in b.volo_list:
-                            b.volo_list.append(vv2)
-                    dest_col2 = cols.get("destinazione")
-                    if dest_col2 and dest_col2 in r.index and pd.notna(r[dest_col2]):
-                        dv2 = str(r[dest_col2]).strip()
-                        if dv2 and dv2.lower() not in ('nan', 'none', '') and dv2 not in b.dest_list:
-                            b.dest_list.append(dv2)
+                        b.provided_importo = parse_eur(r_imp) if prov_importo_col else b.provided_importo
+                        b.provided_extra_min = parse_minutes_from_cell(r_extra) if prov_extra_col else b.provided_extra_min
+                        b.provided_night_min = parse_minutes_from_cell(r_night) if prov_night_col else b.provided_night_min
+                    voli_acc, dest_acc = g_voli, g_dest
+
+                # Accumula volo e destinazione (evita duplicati)
+                for vv2 in voli_acc:
+                    if vv2 and vv2 not in b.volo_list:
+                        b.volo_list.append(vv2)
+                for dv2 in dest_acc:
+                    if dv2 and dv2 not in b.dest_list:
+                        b.dest_list.append(dv2)
 
     # Apply holiday dates: first try external list, otherwise use Italian holidays 2025
-    holiday_dates_to_use = cfg.holiday_dates
-    if holiday_dates_to_use is None:
+    if cfg.holiday_dates is None:
         # Usa automaticamente i festivi italiani 2025
-        holiday_dates_to_use = get_italian_holidays_2025()
+        festivi_d = _ITALIAN_HOLIDAYS_2025_D
+    else:
+        festivi_d = np.array(sorted(cfg.holiday_dates), dtype="datetime64[D]")
     
-    # Apply holiday flags
-    for b in blocks.values():
-        if b.date.date() in holiday_dates_to_use:
-            b.festivo_flag = True
+    # Apply holiday flags: giorno di ogni blocco confrontato in blocco con np.isin
+    block_list = list(blocks.values())
+    giorni = np.fromiter((b.date.value for b in block_list), dtype=np.int64, count=len(block_list))
+    for i in np.flatnonzero(np.isin(giorni.view("datetime64[ns]").astype("datetime64[D]"), festivi_d)):
+        block_list[i].festivo_flag = True
 
     # Compute results per block
     rows_detail = []
     rows_discr = []
 
-    for key, b in sorted(blocks.items(), key=lambda kv: kv[1].first_source.original_order if kv[1].first_source else 0):
+    # Ordine di prima apparizione: argsort stabile in numpy (pari merito = ordine di inserimento)
+    first_order = np.fromiter((b.first_source.original_order if b.first_source else 0 for b in block_list),
+                              dtype=np.int64, count=len(block_list))
+    ordered = [block_list[i] for i in np.argsort(first_order, kind="stable").tolist()]
+
+    # Calcolo vettoriale dei valori economici su tutti i blocchi validi, poi una riga per volo
+    calc_blocks = [b for b in ordered if not b.errore]
+    calc_atd = select_decollo_all(calc_blocks)
+    calc_iter = zip(calc_atd, compute_blocks_frame(calc_blocks, calc_atd, cfg).itertuples(index=False))
+
+    # Format H:MM
+    def hmm(m: int) -> str:
+        return f"{m // 60}:{m % 60:02d}"
+
+    for b in ordered:
         # Se c'è un errore, metti tutti i valori a zero
         if b.errore:
             # Blocco con errore: una riga per ogni volo (solo primo ha errore, altri vuoti)
@@ -1236,6 +1728,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             for _vi, (_volo_e, _dest_e) in enumerate(zip(voli_err, dests_err)):
                 rows_detail.append({
                     "DATA": b.date.strftime("%d/%m/%Y"),
+                    "__day": b.date.day,
                     "APT": b.apt,
                     "TOUR OPERATOR": cfg.to_keyword.capitalize(),
                     "ASSISTENTE": b.assistente if b.assistente else "",
@@ -1267,57 +1760,14 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
                 })
             continue
         
-        durata_min = int((b.end_dt - b.start_dt).total_seconds() // 60)
-
-        # Turno €
-        turno_eur = compute_turno_eur(durata_min, b.apt, cfg)
-
-        # Alpitour: selezione decollo di riferimento (ultimo ATD disponibile, altrimenti STD)
-        # Cerca ATD disponibile (può essere prima o dopo fine turno per la nuova regola)
-        # Preferisci ATD dopo fine turno, altrimenti prendi l'ultimo ATD disponibile
-        atd_after = [x for x in b.atd_list if x > b.end_dt]
-        if atd_after:
-            atd_sel = max(atd_after)
-        else:
-            # Se non ci sono ATD dopo fine turno, prendi l'ultimo ATD disponibile (anche se prima)
-            atd_sel = max(b.atd_list) if b.atd_list else None
-        
-        # Se ATD non disponibile, usa STD come fallback
-        if atd_sel is None:
-            std_after = [x for x in b.std_list if x > b.end_dt]
-            if std_after:
-                atd_sel = max(std_after)
-            else:
-                atd_sel = max(b.std_list) if b.std_list else None
-
-        # Extra minutes (NO arrotondamento)
-        extra_min_raw = compute_extra_min(atd_sel, b.end_dt, b.no_dec, cfg)
-        extra_min = extra_min_raw  # Nessun arrotondamento
-
-        extra_eur = (extra_min / 60.0) * cfg.rate_extra_per_h
-
-        # Night minutes: on turno + (optional) extra interval
-        night_turno = night_minutes(b.start_dt, b.end_dt)
-
-        night_extra = 0
-        if extra_min_raw > 0 and (not b.no_dec) and extra_min > 0:
-            extra_end = b.end_dt + pd.Timedelta(minutes=extra_min)
-            night_extra = night_minutes(b.end_dt, extra_end)
-
-        night_min_raw = night_turno + night_extra
-        night_min = night_min_raw  # Nessun arrotondamento
-        night_eur = compute_night_eur(night_min, cfg, b.apt)
-
-        # Alpitour 2025: festivi +20% su turno, extra E notturno
-        if b.festivo_flag:
-            subtotal = (turno_eur + extra_eur + night_eur) * cfg.festivo_multiplier
-        else:
-            subtotal = turno_eur + extra_eur + night_eur
-        totale = subtotal
-
-        # Format H:MM
-        def hmm(m: int) -> str:
-            return f"{m // 60}:{m % 60:02d}"
+        atd_sel, v = next(calc_iter)
+        durata_min = v.durata_min
+        turno_eur = v.turno_eur
+        extra_min_raw = extra_min = v.extra_min  # Nessun arrotondamento
+        extra_eur = v.extra_eur
+        night_min_raw = night_min = v.night_min  # Nessun arrotondamento
+        night_eur = v.night_eur
+        totale = v.totale
 
         # ── Una riga per ogni volo del blocco ────────────────────────────────
         # Il primo volo porta tutti i valori economici.
@@ -1333,6 +1783,7 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             _primo = (_vi == 0)  # solo il primo volo porta i valori economici
             rows_detail.append({
                 "DATA": b.date.strftime("%d/%m/%Y"),
+                "__day": b.date.day,
                 "APT": b.apt,
                 "TOUR OPERATOR": cfg.to_keyword.capitalize(),
                 "ASSISTENTE": b.assistente if b.assistente else "",
@@ -1401,10 +1852,9 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
             "TOUR OPERATOR", "PERIODO", "TOT_TURNO_EUR", "TOT_EXTRA_MIN", "TOT_EXTRA_H:MM", "TOT_EXTRA_EUR",
             "TOT_NOTTE_MIN", "TOT_NOTTE_EUR", "TOT_TOTALE_EUR"
         ])
-        return detail_df, totals_df, discr_df
+        return detail_df.drop(columns=["__day"], errors="ignore"), totals_df, discr_df
 
-    detail_df["__DATE_TS"] = pd.to_datetime(detail_df["DATA"], dayfirst=True)
-    detail_df["PERIODO"] = np.where(detail_df["__DATE_TS"].dt.day <= 15, "1–15", "16–31")
+    detail_df["PERIODO"] = np.where(detail_df["__day"].to_numpy() <= 15, "1–15", "16–31")
 
     def sum_hmm(minutes: int) -> str:
         minutes = int(minutes)
@@ -1473,12 +1923,10 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
         else:
             month_row_dict = {"TOUR OPERATOR": tour_operator_val, **month_row_dict}
     
-    month_row = pd.DataFrame([month_row_dict])
-
-    totals_df = pd.concat([totals, month_row], ignore_index=True)
+    totals_df = _append_total_row(totals, month_row_dict)
 
     # cleanup helper col
-    detail_df = detail_df.drop(columns=["__DATE_TS"], errors="ignore")
+    detail_df = detail_df.drop(columns=["__day"], errors="ignore")
 
     return detail_df, totals_df, discr_df
 
@@ -1487,6 +1935,19 @@ def process_files(input_files: List[str], cfg: CalcConfig) -> Tuple[pd.DataFrame
 # Helper functions for output sheets
 # -----------------------------
 
+def _append_total_row(df: pd.DataFrame, row: Dict) -> pd.DataFrame:
+    """
+    Riga totale in coda, come pd.concat([df, pd.DataFrame([row])], ignore_index=True),
+    scritta con loc sull'indice riallineato senza costruire un DataFrame di una riga.
+    """
+    out = df.reset_index(drop=True)
+    for c in row:
+        if c not in out.columns:
+            out[c] = np.nan  # concat aggiungerebbe in coda le colonne nuove
+    out.loc[len(out)] = row
+    return out
+
+
 def format_minutes_to_hmm(minutes):
     """Convert minutes to H:MM format"""
     if pd.isna(minutes) or minutes == 0:
@@ -1496,6 +1957,14 @@ def format_minutes_to_hmm(minutes):
     return f"{h}:{m:02d}"
 
 
+def format_minutes_to_hmm_vec(s: pd.Series) -> pd.Series:
+    """format_minutes_to_hmm su un'intera colonna (aritmetica intera + concatenazione stringhe)."""
+    m = pd.to_numeric(s, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    h = pd.Series(np.floor_divide(m, 60).astype(np.int64), index=s.index).astype(str)
+    mm = pd.Series(np.mod(m, 60).astype(np.int64), index=s.index).astype(str).str.zfill(2)
+    return h.str.cat(mm, sep=":")
+
+
 def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
     """Create detailed sheet for an airport with totals per row"""
     if df_apt.empty:
@@ -1505,9 +1974,9 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
     df_apt = df_apt.sort_values('DATA').copy()
     
     # Format columns
-    df_apt['DURATA_H:MM'] = df_apt['DURATA_TURNO_MIN'].apply(format_minutes_to_hmm)
-    df_apt['EXTRA_H:MM'] = df_apt['EXTRA_MIN'].apply(format_minutes_to_hmm)
-    df_apt['NOTTE_H:MM'] = df_apt['NOTTE_MIN'].apply(format_minutes_to_hmm)
+    df_apt['DURATA_H:MM'] = format_minutes_to_hmm_vec(df_apt['DURATA_TURNO_MIN'])
+    df_apt['EXTRA_H:MM'] = format_minutes_to_hmm_vec(df_apt['EXTRA_MIN'])
+    df_apt['NOTTE_H:MM'] = format_minutes_to_hmm_vec(df_apt['NOTTE_MIN'])
     
     # Create output DataFrame
     output_cols = {
@@ -1570,12 +2039,20 @@ def create_apt_detail_sheet(df_apt: pd.DataFrame) -> pd.DataFrame:
                 new_total_dict[k] = v
         total_row_dict = new_total_dict
     
-    total_row = pd.DataFrame([total_row_dict])
-    
-    result_df = pd.concat([result_df, total_row], ignore_index=True)
+    result_df = _append_total_row(result_df, total_row_dict)
     return result_df
 
 
+def _category_keys(df: pd.DataFrame, cols: List[str]) -> List[pd.Series]:
+    """
+    Chiavi di groupby come category (stesso nome colonna): i gruppi sono
+    indicizzati per codice intero invece che per hash della stringa.
+    Le categorie sono ordinate, quindi l'ordine dei gruppi non cambia;
+    usare con observed=True per non generare combinazioni vuote.
+    """
+    return [df[c].astype("category") for c in cols]
+
+
 def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
     """Create total sheet grouped by airport and tour operator"""
     if detail_df.empty:
@@ -1591,16 +2068,16 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         else:
             groupby_cols = ['TOUR OPERATOR', 'APT']
     
-    totals_by_apt = detail_df.groupby(groupby_cols).agg({
-        'TURNO_EUR': 'sum',
-        'EXTRA_EUR': 'sum',
-        'EXTRA_MIN': 'sum',
-        'NOTTE_EUR': 'sum',
-        'NOTTE_MIN': 'sum',
-        'TOTALE_BLOCCO_EUR': 'sum'
-    }).round(2)
-    
-    block_counts = detail_df.groupby(groupby_cols).size()
+    # Somme e numero di blocchi in un'unica aggregazione
+    totals_by_apt = detail_df.groupby(_category_keys(detail_df, groupby_cols), observed=True).agg(
+        TURNO_EUR=('TURNO_EUR', 'sum'),
+        EXTRA_EUR=('EXTRA_EUR', 'sum'),
+        EXTRA_MIN=('EXTRA_MIN', 'sum'),
+        NOTTE_EUR=('NOTTE_EUR', 'sum'),
+        NOTTE_MIN=('NOTTE_MIN', 'sum'),
+        TOTALE_BLOCCO_EUR=('TOTALE_BLOCCO_EUR', 'sum'),
+        Blocchi=('APT', 'size'),
+    ).round(2)
     
     # Format function
     def format_eur(value):
@@ -1663,7 +2140,7 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         'Agenzia': agenzie,
         'Tour Operator': tour_operators,
         'Aeroporto': aeroporti,
-        'Blocchi': block_counts.values,
+        'Blocchi': totals_by_apt['Blocchi'].values,
         'Assistenze': totals_by_apt['TURNO_EUR'].values,
         'Extra_min': totals_by_apt['EXTRA_MIN'].values,
         'Extra_eur': totals_by_apt['EXTRA_EUR'].values,
@@ -1699,7 +2176,7 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
     output_df = output_df.sort_values(sort_cols).drop('sort_order', axis=1)
     
     # Add total row
-    total_row = pd.DataFrame([{
+    output_df = _append_total_row(output_df, {
         'Agenzia': '',
         'Tour Operator': '',
         'Aeroporto': 'TOTALE',
@@ -1708,9 +2185,7 @@ def create_total_by_apt_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         'Extra': f"{format_eur(result['Extra_eur'].sum())} ({min_to_hours_minutes_text(result['Extra_min'].sum())})",
         'Notturno': f"{format_eur(result['Notturno_eur'].sum())} ({min_to_hours_minutes_text(result['Notturno_min'].sum())})",
         'TOTALE': format_eur(result['TOTALE'].sum()),
-    }])
-    
-    output_df = pd.concat([output_df, total_row], ignore_index=True)
+    })
     return output_df
 
 
@@ -1784,9 +2259,7 @@ def create_assistenti_vrn_sheet(detail_df: pd.DataFrame) -> pd.DataFrame:
         }
         if 'TOUR OPERATOR' in result.columns:
             total_row_dict = {'TOUR OPERATOR': '', **total_row_dict}
-        total_row = pd.DataFrame([total_row_dict])
-        
-        result = pd.concat([result, total_row], ignore_index=True)
+        result = _append_total_row(result, total_row_dict)
         
         return result
         
@@ -1807,29 +2280,16 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
     # Festivi (stessa lista di get_italian_holidays_2025, include 2025-2027)
     festivi_2025 = get_italian_holidays_2025()
     
-    def calcola_turno_assistente(durata_min):
-        """Calcola turno assistente: 58€ base + 12€/h oltre 3h"""
-        durata_h = durata_min / 60.0
-        if durata_h <= 3:
-            return BASE_ASSISTENTE
-        else:
-            return BASE_ASSISTENTE + (durata_h - 3) * EXTRA_ASSISTENTE_PER_H
-    
-    def calcola_extra_assistente(extra_min):
-        """Calcola extra assistente: 12€/h"""
-        if extra_min <= 0:
-            return 0.0
-        return (extra_min / 60.0) * EXTRA_ASSISTENTE_PER_H
-    
-    def calcola_notturno_assistente(base, minuti_notturni):
-        """Calcola notturno proporzionale: (base/3h) * (ore_notturne) * 15%"""
-        if minuti_notturni <= 0:
-            return 0.0
-        valore_orario = base / 3.0  # €/h
-        ore_notturne = minuti_notturni / 60.0
-        valore_parte_notturna = valore_orario * ore_notturne
-        maggiorazione = valore_parte_notturna * MAGG_NOTTURNA_PERC
-        return maggiorazione
+    def minuti_int(col) -> np.ndarray:
+        """int(float(v)) per cella come nel calcolo per riga: vuoto o non numerico → 0"""
+        def conv(v):
+            try:
+                return int(float(v)) if pd.notna(v) else 0
+            except (ValueError, TypeError):
+                return 0
+        if col is None:
+            return np.zeros(len(df_vrn), dtype=np.int64)
+        return np.array(_map_distinct(col, conv), dtype=np.int64)
     
     def is_festivo(data_str):
         """Verifica se la data è festiva"""
@@ -1839,74 +2299,46 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
         except:
             return False
     
-    # Calcola per ogni riga
-    rows_assistenti = []
-    for _, row in df_vrn.iterrows():
-        assistente = row['ASSISTENTE']
-        # Gestione durata_min con controllo tipo
-        durata_val = row.get('DURATA_TURNO_MIN', 0)
-        try:
-            durata_min = int(float(durata_val)) if pd.notna(durata_val) else 0
-        except (ValueError, TypeError):
-            durata_min = 0
-        
-        # Gestione extra_min con controllo tipo
-        extra_min_val = row.get('EXTRA_MIN', 0)
-        try:
-            if pd.notna(extra_min_val):
-                extra_min = int(float(extra_min_val))
-            else:
-                extra_min = 0
-        except (ValueError, TypeError):
-            extra_min = 0
-        
-        # Usa RAW se disponibile, altrimenti NOTTE_MIN, gestendo NaN e tipo
-        notte_min_raw = row.get('NOTTE_MIN_RAW')
-        notte_min = row.get('NOTTE_MIN', 0)
-        try:
-            if pd.notna(notte_min_raw):
-                minuti_notturni = int(float(notte_min_raw))
-            elif pd.notna(notte_min):
-                minuti_notturni = int(float(notte_min))
-            else:
-                minuti_notturni = 0
-        except (ValueError, TypeError):
-            minuti_notturni = 0
-        
-        data_str = row['DATA']
-        
-        # Calcoli assistente
-        base = calcola_turno_assistente(durata_min)
-        extra = calcola_extra_assistente(extra_min)
-        notturno = calcola_notturno_assistente(base, minuti_notturni)
-        
-        # Festivo: +20% su (base + extra + notturno)
-        festivo = is_festivo(data_str)
-        subtotale = base + extra + notturno
-        totale = subtotale * (1 + MAGG_FESTIVO_PERC) if festivo else subtotale
-        
-        # Estrai TOUR OPERATOR se presente
-        tour_operator = row.get('TOUR OPERATOR', '') if 'TOUR OPERATOR' in row.index else ''
-        
-        rows_assistenti.append({
-            'TOUR OPERATOR': tour_operator,
-            'ASSISTENTE': assistente,
-            'BASE_EUR': base,
-            'EXTRA_EUR': extra,
-            'EXTRA_MIN': extra_min,
-            'NOTTE_MIN': minuti_notturni,
-            'NOTTE_EUR': notturno,
-            'TOTALE_EUR': totale,
-        })
+    # Festivo: una verifica per data distinta (le righe VRN ripetono poche date)
+    festivo = np.array(_map_distinct(df_vrn['DATA'], is_festivo), dtype=bool)
     
-    df_calc = pd.DataFrame(rows_assistenti)
+    # Minuti interi per colonna (NOTTE_MIN_RAW se valorizzato, altrimenti NOTTE_MIN)
+    durata_min = minuti_int(df_vrn.get('DURATA_TURNO_MIN'))
+    extra_min = minuti_int(df_vrn.get('EXTRA_MIN'))
+    notte_raw = df_vrn.get('NOTTE_MIN_RAW')
+    minuti_notturni = minuti_int(df_vrn.get('NOTTE_MIN'))
+    if notte_raw is not None:
+        minuti_notturni = np.where(notte_raw.notna().to_numpy(), minuti_int(notte_raw), minuti_notturni)
+    
+    # Turno assistente: 58€ base + 12€/h oltre 3h
+    durata_h = durata_min / 60.0
+    base = np.where(durata_h <= 3, BASE_ASSISTENTE, BASE_ASSISTENTE + (durata_h - 3) * EXTRA_ASSISTENTE_PER_H)
+    # Extra assistente: 12€/h
+    extra = np.where(extra_min <= 0, 0.0, (extra_min / 60.0) * EXTRA_ASSISTENTE_PER_H)
+    # Notturno proporzionale: (base/3h) * (ore_notturne) * 15%
+    notturno = np.where(minuti_notturni <= 0, 0.0, ((base / 3.0) * (minuti_notturni / 60.0)) * MAGG_NOTTURNA_PERC)
+    
+    # Festivo: +20% su (base + extra + notturno)
+    subtotale = base + extra + notturno
+    totale = np.where(festivo, subtotale * (1 + MAGG_FESTIVO_PERC), subtotale)
+    
+    df_calc = pd.DataFrame({
+        'TOUR OPERATOR': df_vrn['TOUR OPERATOR'].to_numpy() if 'TOUR OPERATOR' in df_vrn.columns else '',
+        'ASSISTENTE': df_vrn['ASSISTENTE'].to_numpy(),
+        'BASE_EUR': base,
+        'EXTRA_EUR': extra,
+        'EXTRA_MIN': extra_min,
+        'NOTTE_MIN': minuti_notturni,
+        'NOTTE_EUR': notturno,
+        'TOTALE_EUR': totale,
+    })
     
     # Raggruppa per TOUR OPERATOR e ASSISTENTE se TOUR OPERATOR è presente
     groupby_cols = ['ASSISTENTE']
     if 'TOUR OPERATOR' in df_calc.columns and df_calc['TOUR OPERATOR'].notna().any():
         groupby_cols = ['TOUR OPERATOR', 'ASSISTENTE']
     
-    assistenti_totals = df_calc.groupby(groupby_cols).agg({
+    assistenti_totals = df_calc.groupby(_category_keys(df_calc, groupby_cols), observed=True).agg({
         'BASE_EUR': 'sum',
         'EXTRA_EUR': 'sum',
         'EXTRA_MIN': 'sum',
@@ -1918,6 +2350,8 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
     
     assistenti_totals.columns = ['Turno (€)', 'Extra (€)', 'Extra (min)', 'Notturno (€)', 'Notturno (min)', 'TOTALE (€)', 'Blocchi']
     assistenti_totals = assistenti_totals.reset_index()
+    for c in groupby_cols:
+        assistenti_totals[c] = assistenti_totals[c].astype(object)
     
     # Estrai indici
     if isinstance(assistenti_totals.index, pd.MultiIndex) or len(groupby_cols) > 1:
@@ -1937,8 +2371,8 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
         m = int(minutes % 60)
         return f"{h}:{m:02d}"
     
-    assistenti_totals['Extra (h:mm)'] = assistenti_totals['Extra (min)'].apply(format_hmm)
-    assistenti_totals['Notturno (h:mm)'] = assistenti_totals['Notturno (min)'].apply(format_hmm)
+    assistenti_totals['Extra (h:mm)'] = format_minutes_to_hmm_vec(assistenti_totals['Extra (min)'])
+    assistenti_totals['Notturno (h:mm)'] = format_minutes_to_hmm_vec(assistenti_totals['Notturno (min)'])
     
     # Riordina colonne
     if 'TOUR OPERATOR' in assistenti_totals.columns:
@@ -1968,9 +2402,7 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
     }
     if 'TOUR OPERATOR' in result.columns:
         total_row_dict = {'TOUR OPERATOR': '', **total_row_dict}
-    total_row = pd.DataFrame([total_row_dict])
-    
-    result = pd.concat([result, total_row], ignore_index=True)
+    result = _append_total_row(result, total_row_dict)
     return result
 
 
@@ -1978,8 +2410,288 @@ def _create_assistenti_vrn_sheet_legacy(df_vrn: pd.DataFrame) -> pd.DataFrame:
 # Output writer
 # -----------------------------
 
-def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.DataFrame, discr_df: pd.DataFrame) -> None:
-    with pd.ExcelWriter(output_path, engine="openpyxl", datetime_format="YYYY-MM-DD HH:MM") as writer:
+def _excel_col_widths(df: pd.DataFrame) -> List[float]:
+    """
+    Larghezze colonna: intestazione + prime 499 righe, tra 10 e 55.
+    Lunghezze calcolate con str.len sulle colonne (str di ogni valore non nullo), senza leggere le celle scritte.
+    """
+    head = df.head(499)
+    widths = []
+    for j, c in enumerate(df.columns):
+        max_len = len(str(c))
+        s = head.iloc[:, j].dropna()
+        if len(s):
+            max_len = max(max_len, _max_str_len(s))
+        widths.append(min(max(10, max_len + 2), 55))
+    return widths
+
+
+def _max_str_len(s: pd.Series) -> int:
+    """max(len(str(v))) su valori non nulli, con il caso scelto una volta per dtype della colonna."""
+    kind = s.dtype.kind if isinstance(s.dtype, np.dtype) else "O"
+    if kind in "iu":
+        # Interi: la stringa più lunga è quella del minimo o del massimo
+        return max(len(str(s.min())), len(str(s.max())))
+    if kind == "M" and not (s.to_numpy(dtype="datetime64[ns]").astype(np.int64) % 1_000_000_000).any():
+        return 19  # str(Timestamp) senza frazioni di secondo: "YYYY-MM-DD HH:MM:SS"
+    # astype(object) prima di str: le date restano "YYYY-MM-DD HH:MM:SS" come str(Timestamp)
+    return int(s.astype(object).astype(str).str.len().max())
+
+
+# --- Scrittura diretta XML (opzione --fast): niente modello a celle, stringhe inline, zip a livello 1 ---
+
+_XLSX_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XLSX_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+# Stili: 0 normale, 1 intestazione (grassetto, bordo, centrata come pandas), 2 data-ora, 3 data
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<styleSheet xmlns="{_XLSX_NS}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="YYYY-MM-DD HH:MM"/>'
+    '<numFmt numFmtId="165" formatCode="YYYY-MM-DD"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_EPOCH = datetime(1899, 12, 30)
+_XLSX_EPOCH_NS = np.datetime64(_XLSX_EPOCH, "ns").astype(np.int64)
+# Caratteri di controllo non ammessi in XML 1.0 (openpyxl li rifiuta, qui si scartano)
+_XML_ILLEGAL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_str_cell(ref: str, s: str, style: str = "") -> str:
+    s = escape(_XML_ILLEGAL_RE.sub("", s))
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{s}</t></is></c>'
+
+
+def _xlsx_value_cell(ref: str, v) -> str:
+    """Una cella da un valore Python qualsiasi (colonne object); stringa vuota se il valore è nullo."""
+    if v is None or v is pd.NaT or (isinstance(v, float) and math.isnan(v)):
+        return ""
+    if isinstance(v, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(v)}</v></c>'
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        if math.isinf(v):
+            return _xlsx_str_cell(ref, "inf" if v > 0 else "-inf")
+        return f'<c r="{ref}"><v>{v!r}</v></c>' if isinstance(v, float) else f'<c r="{ref}"><v>{int(v)}</v></c>'
+    if isinstance(v, datetime):
+        serial = (v.replace(tzinfo=None) - _XLSX_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="2"><v>{serial!r}</v></c>'
+    if isinstance(v, date):
+        return f'<c r="{ref}" s="3"><v>{(v - _XLSX_EPOCH.date()).days}</v></c>'
+    s = str(v)
+    return _xlsx_str_cell(ref, s) if s else ""  # come openpyxl: nessuna cella per le stringhe vuote
+
+
+def _xlsx_column_cells(s: pd.Series, letter: str) -> List[str]:
+    """Celle XML di una colonna (righe da 2): date e numeri convertiti in blocco, il resto valore per valore."""
+    refs = [f"{letter}{i}" for i in range(2, len(s) + 2)]
+    if pd.api.types.is_datetime64_dtype(s.dtype):
+        ns = s.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        serial = ((ns - _XLSX_EPOCH_NS) / 86_400e9).tolist()
+        return ["" if na else f'<c r="{r}" s="2"><v>{x!r}</v></c>'
+                for r, x, na in zip(refs, serial, s.isna().to_numpy())]
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind == "f":
+        vals = s.to_numpy()
+        if not np.isinf(vals).any():
+            return ["" if x != x else f'<c r="{r}"><v>{x!r}</v></c>' for r, x in zip(refs, vals.tolist())]
+    elif isinstance(s.dtype, np.dtype) and s.dtype.kind in "iu":
+        return [f'<c r="{r}"><v>{x}</v></c>' for r, x in zip(refs, s.to_numpy().tolist())]
+    return [_xlsx_value_cell(r, v) for r, v in zip(refs, s.tolist())]
+
+
+def _xlsx_sheet_xml(df: pd.DataFrame) -> str:
+    letters = [get_column_letter(j + 1) for j in range(len(df.columns))]
+    parts = [f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{_XLSX_NS}">']
+    if len(df.columns):
+        parts.append("<cols>")
+        parts.extend(f'<col min="{j}" max="{j}" width="{w}" customWidth="1"/>'
+                     for j, w in enumerate(_excel_col_widths(df), start=1))
+        parts.append("</cols>")
+    parts.append("<sheetData>")
+    if len(df.columns):
+        header = "".join(_xlsx_str_cell(f"{l}1", str(c), ' s="1"') for l, c in zip(letters, df.columns))
+        parts.append(f'<row r="1">{header}</row>')
+        cols = [_xlsx_column_cells(df.iloc[:, j], l) for j, l in enumerate(letters)]
+        parts.extend(f'<row r="{i}">{"".join(cells)}</row>' for i, cells in enumerate(zip(*cols), start=2))
+    parts.append("</sheetData></worksheet>")
+    return "".join(parts)
+
+
+class _FastXlsxWriter:
+    """
+    Sostituto minimo di pd.ExcelWriter per _to_sheet: raccoglie i fogli e alla chiusura
+    scrive direttamente le parti XML dello xlsx (stringhe inline, niente sharedStrings).
+    """
+    engine = "fast"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.sheets: Dict[str, pd.DataFrame] = {}
+
+    def __enter__(self) -> "_FastXlsxWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    def close(self) -> None:
+        names = list(self.sheets)
+        ct_sheets = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(names) + 1))
+        wb_sheets = "".join(f'<sheet name="{q}" sheetId="{i}" r:id="rId{i}"/>'
+                            for i, q in enumerate((escape(n, {'"': "&quot;"}) for n in names), start=1))
+        wb_rels = "".join(
+            f'<Relationship Id="rId{i}" Type="{_XLSX_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(names) + 1))
+        head = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+            z.writestr("[Content_Types].xml", head +
+                       '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                       '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                       '<Default Extension="xml" ContentType="application/xml"/>'
+                       '<Override PartName="/xl/workbook.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                       '<Override PartName="/xl/styles.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                       f'{ct_sheets}</Types>')
+            z.writestr("_rels/.rels", head +
+                       f'<Relationships xmlns="{_XLSX_PKG_REL_NS}">'
+                       f'<Relationship Id="rId1" Type="{_XLSX_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+                       '</Relationships>')
+            z.writestr("xl/workbook.xml", head +
+                       f'<workbook xmlns="{_XLSX_NS}" xmlns:r="{_XLSX_REL_NS}"><sheets>{wb_sheets}</sheets></workbook>')
+            z.writestr("xl/_rels/workbook.xml.rels", head +
+                       f'<Relationships xmlns="{_XLSX_PKG_REL_NS}">{wb_rels}'
+                       f'<Relationship Id="rId{len(names) + 1}" Type="{_XLSX_REL_NS}/styles" Target="styles.xml"/>'
+                       '</Relationships>')
+            z.writestr("xl/styles.xml", _XLSX_STYLES)
+            for i, n in enumerate(names, start=1):
+                z.writestr(f"xl/worksheets/sheet{i}.xml", _xlsx_sheet_xml(self.sheets[n]))
+
+
+def _write_only_cells(s: pd.Series, ws, fmt_cell) -> List:
+    """
+    Valori di una colonna per WriteOnlyWorksheet.append, convertiti come pandas to_excel:
+    nulli -> "", inf -> "inf", numpy -> Python, date/timedelta in celle con formato, il resto str.
+    """
+    kind = s.dtype.kind if isinstance(s.dtype, np.dtype) else "O"
+    if kind in "iu":
+        return s.to_numpy().tolist()
+    if kind == "f":
+        vals = s.to_numpy()
+        if np.isfinite(vals[~np.isnan(vals)]).all():
+            return ["" if x != x else x for x in vals.tolist()]
+    out = []
+    for v in s.tolist():
+        if pd.api.types.is_scalar(v) and pd.isna(v):
+            out.append("")
+        elif isinstance(v, (bool, np.bool_)):
+            out.append(bool(v))
+        elif isinstance(v, (int, np.integer)):
+            out.append(int(v))
+        elif isinstance(v, (float, np.floating)):
+            out.append(float(v) if math.isfinite(v) else ("inf" if v > 0 else "-inf"))
+        elif isinstance(v, datetime):
+            if v.tzinfo is not None:
+                raise ValueError("Excel does not support datetimes with timezones.")
+            # Formato effettivo di pd.ExcelWriter(engine="openpyxl"), che non applica datetime_format
+            out.append(fmt_cell(v, "YYYY-MM-DD HH:MM:SS"))
+        elif isinstance(v, date):
+            out.append(fmt_cell(v, "YYYY-MM-DD"))
+        elif isinstance(v, timedelta):
+            out.append(fmt_cell(v.total_seconds() / 86400, "0"))
+        else:
+            out.append(str(v))
+    return out
+
+
+class _WriteOnlyXlsxWriter(_FastXlsxWriter):
+    """
+    Come _FastXlsxWriter ma con openpyxl in write_only: ogni foglio è aggiunto riga per riga
+    con WriteOnlyWorksheet.append, senza la griglia di Cell che costruisce to_excel.
+    Celle, formati e intestazione come pd.ExcelWriter(engine="openpyxl").
+    """
+    engine = "openpyxl"
+
+    def close(self) -> None:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        wb = Workbook(write_only=True)
+        thin = Side(style="thin")
+        header_font = Font(bold=True)
+        header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        header_align = Alignment(horizontal="center", vertical="top")
+        for name, df in self.sheets.items():
+            ws = wb.create_sheet(name)
+            # In write_only le larghezze vanno impostate prima della prima riga
+            for j, w in enumerate(_excel_col_widths(df), start=1):
+                ws.column_dimensions[get_column_letter(j)].width = w
+            if len(df.columns) == 0:
+                continue
+
+            def fmt_cell(v, fmt, ws=ws):
+                cell = WriteOnlyCell(ws, value=v)
+                cell.number_format = fmt
+                return cell
+
+            header = []
+            for c in df.columns:
+                cell = WriteOnlyCell(ws, value=str(c))
+                cell.font, cell.border, cell.alignment = header_font, header_border, header_align
+                header.append(cell)
+            ws.append(header)
+            cols = [_write_only_cells(df.iloc[:, j], ws, fmt_cell) for j in range(len(df.columns))]
+            for row in zip(*cols):
+                ws.append(row)
+        wb.save(self.path)
+
+
+def _to_sheet(writer: pd.ExcelWriter, df: pd.DataFrame, sheet_name: str) -> None:
+    """df.to_excel senza indice, poi larghezze colonna impostate dal DataFrame (una volta per colonna)."""
+    if sheet_name not in writer.sheets:
+        # Rinomina di openpyxl per nomi già usati con altre maiuscole (VRN, vrn -> vrn1):
+        # serve il nome effettivo per ritrovare il foglio, e con xlsxwriter lo stesso risultato
+        from openpyxl.workbook.child import avoid_duplicate_name
+        sheet_name = avoid_duplicate_name(list(writer.sheets), sheet_name)
+    if isinstance(writer, _FastXlsxWriter):
+        writer.sheets[sheet_name] = df  # scritto alla chiusura, larghezze comprese
+        return
+    df.to_excel(writer, sheet_name=sheet_name, index=False)
+    ws = writer.sheets[sheet_name]
+    for j, w in enumerate(_excel_col_widths(df)):
+        ws.set_column(j, j, w)
+
+
+def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.DataFrame, discr_df: pd.DataFrame,
+                       fast: bool = False) -> None:
+    # xlsxwriter (se installato) scrive i fogli in streaming senza tenere il modello a celle di openpyxl.
+    # Niente constant_memory: to_excel scrive per colonne, mentre quella modalità accetta solo righe in ordine.
+    # fast=True: stessi fogli scritti come XML diretto da _FastXlsxWriter (formato semplificato, senza pandas/openpyxl).
+    # Senza xlsxwriter: openpyxl in write_only (_WriteOnlyXlsxWriter), righe in streaming invece di to_excel.
+    if fast:
+        writer = _FastXlsxWriter(output_path)
+    elif _EXCEL_ENGINE == "openpyxl":
+        writer = _WriteOnlyXlsxWriter(output_path)
+    else:
+        writer = pd.ExcelWriter(output_path, engine="xlsxwriter", datetime_format="YYYY-MM-DD HH:MM",
+                                engine_kwargs={"options": {"strings_to_urls": False}})
+    with writer:
         # Order columns for readability
         if not detail_df.empty:
             cols = [
@@ -2002,14 +2714,14 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
             for col in ["DURATA_TURNO_MIN", "EXTRA_MIN_RAW", "EXTRA_MIN", "NOTTE_MIN_RAW", "NOTTE_MIN"]:
                 if col in write_df.columns:
                     write_df[col] = write_df[col].apply(min_to_hmm)
-            write_df.to_excel(writer, sheet_name="DettaglioBlocchi", index=False)
+            _to_sheet(writer, write_df, "DettaglioBlocchi")
         else:
-            pd.DataFrame().to_excel(writer, sheet_name="DettaglioBlocchi", index=False)
+            _to_sheet(writer, pd.DataFrame(), "DettaglioBlocchi")
 
-        totals_df.to_excel(writer, sheet_name="TotaliPeriodo", index=False)
+        _to_sheet(writer, totals_df, "TotaliPeriodo")
 
         if not discr_df.empty:
-            discr_df.to_excel(writer, sheet_name="Discrepanze", index=False)
+            _to_sheet(writer, discr_df, "Discrepanze")
         else:
             # Crea DataFrame vuoto con colonne corrette incluso TOUR OPERATOR
             empty_discr = pd.DataFrame(columns=[
@@ -2019,28 +2731,27 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
                 "TOTALE_CALC_EUR", "TOTALE_FILE_EUR", "DELTA_TOTALE_EUR",
                 "SRC_FILE", "SRC_SHEET", "SRC_ROW0"
             ])
-            empty_discr.to_excel(writer, sheet_name="Discrepanze", index=False)
+            _to_sheet(writer, empty_discr, "Discrepanze")
         
         # Create sheets for each airport
         if not detail_df.empty:
-            apts = sorted(detail_df['APT'].unique())
-            for apt in apts:
-                df_apt = detail_df[detail_df['APT'] == apt].copy()
+            # Un solo passaggio di groupby (categorie ordinate = ordine alfabetico degli APT)
+            for (apt,), df_apt in detail_df.groupby(_category_keys(detail_df, ['APT']), observed=True):
                 apt_sheet = create_apt_detail_sheet(df_apt)
                 if not apt_sheet.empty:
-                    apt_sheet.to_excel(writer, sheet_name=apt, index=False)
+                    _to_sheet(writer, apt_sheet, apt)
         
         # Create TOTALE sheet
         if not detail_df.empty:
             total_sheet = create_total_by_apt_sheet(detail_df)
             if not total_sheet.empty:
-                total_sheet.to_excel(writer, sheet_name="TOTALE", index=False)
+                _to_sheet(writer, total_sheet, "TOTALE")
         
         # Create Assistenti VRN sheet
         if not detail_df.empty:
             assistenti_sheet = create_assistenti_vrn_sheet(detail_df)
             if not assistenti_sheet.empty:
-                assistenti_sheet.to_excel(writer, sheet_name="Assistenti_VRN", index=False)
+                _to_sheet(writer, assistenti_sheet, "Assistenti_VRN")
         
         # Create Collaboratori sheet (tutti gli aeroporti)
         try:
@@ -2048,7 +2759,7 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
             festivi_2025 = get_italian_holidays_2025()
             collaboratori_sheet = create_collaboratori_sheet(detail_df, holiday_dates=festivi_2025)
             if not collaboratori_sheet.empty:
-                collaboratori_sheet.to_excel(writer, sheet_name="Collaboratori", index=False)
+                _to_sheet(writer, collaboratori_sheet, "Collaboratori")
             
             # Create complete sheets for each airport
             airport_sheets = create_airport_complete_sheets(detail_df, totals_df, discr_df, holiday_dates=festivi_2025)
@@ -2060,23 +2771,10 @@ def write_output_excel(output_path: str, detail_df: pd.DataFrame, totals_df: pd.
                         # Limita lunghezza nome foglio Excel (max 31 caratteri)
                         if len(excel_sheet_name) > 31:
                             excel_sheet_name = excel_sheet_name[:31]
-                        sheet_df.to_excel(writer, sheet_name=excel_sheet_name, index=False)
+                        _to_sheet(writer, sheet_df, excel_sheet_name)
         except ImportError:
             pass  # Modulo tariffe non disponibile, salta
 
-        # Basic column widths
-        for sheet in writer.book.worksheets:
-            for col_cells in sheet.columns:
-                # openpyxl cell objects
-                col_letter = col_cells[0].column_letter
-                max_len = 0
-                for cell in col_cells[:500]:  # limit scan
-                    v = cell.value
-                    if v is None:
-                        continue
-                    max_len = max(max_len, len(str(v)))
-                sheet.column_dimensions[col_letter].width = min(max(10, max_len + 2), 55)
-
 
 # -----------------------------
 # CLI
@@ -2093,12 +2791,18 @@ def parse_args() -> argparse.Namespace:
     # Alpitour usa sempre maggiorazione 15% = €0,0625/min, non serve night-mode
 
     # Rounding options
-    p.add_argument("--round-extra", choices=["NONE", "FLOOR", "CEIL", "NEAREST"], default="NONE")
+    p.add_argument("--round-extra", choices=list(_ROUNDING_MODES), default="NONE")
     p.add_argument("--round-extra-step", type=int, default=5)
-    p.add_argument("--round-night", choices=["NONE", "FLOOR", "CEIL", "NEAREST"], default="NONE")
+    p.add_argument("--round-night", choices=list(_ROUNDING_MODES), default="NONE")
     p.add_argument("--round-night-step", type=int, default=5)
+    p.add_argument("--fast", action="store_true",
+                   help="Scrive l'xlsx direttamente in XML (più veloce su output grandi, stili minimi).")
 
-    return p.parse_args()
+    args = p.parse_args()
+    # Politiche di arrotondamento costruite qui, una volta, insieme alla validazione degli argomenti
+    args.rounding_extra = RoundingPolicy(args.round_extra, args.round_extra_step)
+    args.rounding_night = RoundingPolicy(args.round_night, args.round_night_step)
+    return args
 
 
 def main() -> None:
@@ -2108,13 +2812,13 @@ def main() -> None:
 
     cfg = CalcConfig(
         apt_filter=args.apt if args.apt else None,
-        rounding_extra=RoundingPolicy(args.round_extra, args.round_extra_step),
-        rounding_night=RoundingPolicy(args.round_night, args.round_night_step),
+        rounding_extra=args.rounding_extra,
+        rounding_night=args.rounding_night,
         holiday_dates=holiday_dates,
     )
 
     detail_df, totals_df, discr_df = process_files(args.input, cfg)
-    write_output_excel(args.output, detail_df, totals_df, discr_df)
+    write_output_excel(args.output, detail_df, totals_df, discr_df, fast=args.fast)
 
     print(f"OK ✅ Output creato: {args.output}")
     print(f"Blocchi calcolati: {len(detail_df)}")